@@ -12,7 +12,24 @@ class BookingForm(FlaskForm):
     purpose = TextAreaField('预约目的', validators=[Length(0, 200)])
     submit = SubmitField('确认预约')
 
+    @staticmethod
+    def _check_slot(value):
+        """开始、结束时间需落在时间片边界上（座位按时间片占用）"""
+        from app.utils.seat_reservation import (
+            SlotAlignmentError,
+            is_aligned,
+            slot_minutes,
+        )
+
+        minutes = slot_minutes()
+        if not is_aligned(value, minutes):
+            raise ValidationError(str(SlotAlignmentError(minutes)))
+
+    def validate_start_time(self, field):
+        self._check_slot(field.data)
+
     def validate_end_time(self, field):
+        self._check_slot(field.data)
         if field.data <= self.start_time.data:
             raise ValidationError('结束时间必须晚于开始时间')
 
@@ -1,8 +1,14 @@
 # 导入所有模型
 from .admin import Admin
-from .booking import Announcement, Booking
+from .booking import Announcement, Booking, SeatReservation
+from .recurring_booking import RecurringBooking, RecurringOccurrence
 from .student import Student
 from .study_room import Seat, StudyRoom, TimeSlot
+from .usage_stats import RoomUsageStat
 from .user import User
+from .waitlist import WaitlistEntry
 
-__all__ = ['Admin', 'Announcement', 'Booking', 'Seat', 'Student', 'StudyRoom', 'TimeSlot', 'User']
+__all__ = ['Admin', 'Announcement', 'Booking', 'RecurringBooking', 'RecurringOccurrence', 'RoomUsageStat', 'Seat', 'SeatReservation', 'Student', 'StudyRoom', 'TimeSlot', 'User', 'WaitlistEntry']
+
+# 注册预约变更的统计与座位占用事件（需在模型全部导入后）
+from app.utils import seat_reservation, usage_rollup, waitlist  # noqa: F401
@@ -1,7 +1,6 @@
 from datetime import datetime
 
 from flask_login import UserMixin
-from werkzeug.security import check_password_hash, generate_password_hash
 
 from app import db
 
@@ -22,11 +21,19 @@ class Admin(db.Model, UserMixin):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    def get_id(self):
+        """会话中保存的身份标识，带上类型以便加载时直接定位到对应的表"""
+        return f'admin:{self.id}'
+
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        from app.utils.password_hashing import hash_password
+
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        from app.utils.password_hashing import verify_password
+
+        return verify_password(self, password)
 
     def update_last_login(self):
         self.last_login = datetime.utcnow()
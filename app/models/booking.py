@@ -5,6 +5,20 @@ from app import db
 
 class Booking(db.Model):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        # 座位可用性 / 占用统计：按座位、状态、时间区间查找
+        db.Index('ix_bookings_seat_status_time', 'seat_id', 'status', 'start_time', 'end_time'),
+        # 我的预约：按用户、状态、开始时间
+        db.Index('ix_bookings_user_status_start', 'user_id', 'status', 'start_time'),
+        # 过期清理与实时使用统计：按状态和时间范围
+        db.Index('ix_bookings_status_start', 'status', 'start_time'),
+        db.Index('ix_bookings_status_end', 'status', 'end_time'),
+        # 管理后台按创建时间的游标分页（可带状态筛选）
+        db.Index('ix_bookings_created_id', 'created_at', 'id'),
+        db.Index('ix_bookings_status_created_id', 'status', 'created_at', 'id'),
+    )
+
+    NO_SHOW_PENALTY = 10  # 未到场扣除的信用积分
 
     id = db.Column(db.Integer, primary_key=True)
     booking_number = db.Column(db.String(30), unique=True, nullable=False, index=True)  # 预约编号
@@ -23,6 +37,9 @@ class Booking(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # 预约的学生（user_id 对应 students.id），只读，供列表查询 JOIN 预加载
+    student = db.relationship('Student', primaryjoin='foreign(Booking.user_id) == Student.id', viewonly=True)
+
     def __init__(self, **kwargs):
         super(Booking, self).__init__(**kwargs)
         if not self.booking_number:
@@ -30,11 +47,10 @@ class Booking(db.Model):
 
     @staticmethod
     def generate_booking_number():
-        """生成预约编号"""
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        import random
-        random_num = random.randint(1000, 9999)
-        return f"CD{timestamp}{random_num}"
+        """生成预约编号（时间有序，同一秒内大量预约也不会冲突）"""
+        from app.utils.booking_number import booking_numbers
+
+        return booking_numbers.next()
 
     @property
     def duration_hours(self):
@@ -86,7 +102,7 @@ class Booking(db.Model):
             self.status = 'no_show'
             # 扣除信用积分
             if hasattr(self.user, 'update_credit_score'):
-                self.user.update_credit_score(-10, '未到场预约')
+                self.user.update_credit_score(-Booking.NO_SHOW_PENALTY, '未到场预约')
             if hasattr(self.user, 'violation_count'):
                 self.user.violation_count += 1
             return True
@@ -108,33 +124,27 @@ class Booking(db.Model):
         conflicting_booking = query.first()
         return conflicting_booking is None
 
+    @staticmethod
+    def for_user(user_id, statuses=None):
+        """用户的预约记录，按开始时间倒序"""
+        query = Booking.query.filter(Booking.user_id == user_id)
+        if statuses:
+            query = query.filter(Booking.status.in_(statuses))
+        return query.order_by(Booking.start_time.desc())
+
     @staticmethod
     def update_expired_bookings():
-        """更新过期的预约"""
-        # 使用本地时间而不是UTC时间进行比较
-        now = datetime.now()
-        expired_bookings = Booking.query.filter(
-            Booking.status == 'active',
-            Booking.end_time < now
-        ).all()
-
-        for booking in expired_bookings:
-            # 如果已经签到，则标记为已完成
-            if booking.check_in_time:
-                booking.status = 'completed'
-                booking.check_out_time = booking.end_time  # 使用预约结束时间作为签退时间
-            else:
-                # 如果没有签到，则标记为未到场
-                booking.status = 'no_show'
-
-        if expired_bookings:
-            try:
-                db.session.commit()
-            except Exception as e:
-                db.session.rollback()
-                raise e
-
-        return len(expired_bookings)
+        """更新过期的预约
+
+        后台清理线程运行时直接返回 0，页面请求不再承担清理开销；
+        否则执行一次分批的集合式清理，返回处理的预约数量。
+        """
+        from app.utils.expiry_sweeper import is_sweeper_running, sweep_expired_bookings
+
+        if is_sweeper_running():
+            return 0
+        result = sweep_expired_bookings()
+        return result['completed'] + result['no_show']
 
     @staticmethod
     def get_realtime_seat_usage():
@@ -143,17 +153,36 @@ class Booking(db.Model):
         now = datetime.now()
 
         # 获取当前时间段内的活跃预约对应的座位数
-        occupied_seats = db.session.query(Booking.seat_id).filter(
+        occupied_seats = db.session.query(db.func.count(db.func.distinct(Booking.seat_id))).filter(
             Booking.status == 'active',
             Booking.start_time <= now,
             Booking.end_time >= now
-        ).distinct().count()
+        ).scalar()
 
         return occupied_seats
 
     def __repr__(self):
         return f'<Booking {self.booking_number} - User {self.user_id}>'
 
+class SeatReservation(db.Model):
+    """座位时间片占用记录，(座位, 时间片) 唯一，由数据库保证同一座位同一时段只能被占用一次"""
+    __tablename__ = 'seat_reservations'
+    __table_args__ = (
+        db.UniqueConstraint('seat_id', 'slot_start', name='uq_seat_reservation_slot'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    seat_id = db.Column(db.Integer, db.ForeignKey('seats.id'), nullable=False)
+    slot_start = db.Column(db.DateTime, nullable=False)  # 时间片开始时间
+    booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id', ondelete='CASCADE'), index=True)  # 已确认的预约
+    held_by = db.Column(db.Integer)  # 临时保留该座位的用户ID
+    hold_token = db.Column(db.String(36), index=True)  # 临时保留凭证
+    expires_at = db.Column(db.DateTime)  # 临时保留过期时间
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SeatReservation seat={self.seat_id} {self.slot_start}>'
+
 class Announcement(db.Model):
     __tablename__ = 'announcements'
 
@@ -170,5 +199,18 @@ class Announcement(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    def record_view(self):
+        """浏览次数加一，由后台批量写回，不在请求内提交"""
+        from app.utils.counters import announcement_views
+
+        announcement_views.incr(self.id)
+
+    @property
+    def current_view_count(self):
+        """包含尚未写回数据库的浏览次数"""
+        from app.utils.counters import announcement_views
+
+        return announcement_views.value(self)
+
     def __repr__(self):
         return f'<Announcement {self.title}>'
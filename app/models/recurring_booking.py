@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+from app import db
+
+
+class RecurringBooking(db.Model):
+    """周期预约规则：同一学生每周固定几天在同一座位的同一时段学习
+
+    具体的 Booking 不会一次性全部生成，由后台任务按滚动窗口逐日生成（见 app/utils/recurring_bookings.py）
+    """
+    __tablename__ = 'recurring_bookings'
+    __table_args__ = (
+        # 后台任务查找需要继续生成的规则
+        db.Index('ix_recurring_bookings_status_until', 'status', 'materialized_until'),
+        db.Index('ix_recurring_bookings_seat_status', 'seat_id', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    seat_id = db.Column(db.Integer, db.ForeignKey('seats.id'), nullable=False)
+    weekdays = db.Column(db.Integer, nullable=False)  # 星期位图，第 0 位为周一
+    start_clock = db.Column(db.String(5), nullable=False)  # 每次开始时间 HH:MM
+    end_clock = db.Column(db.String(5), nullable=False)    # 每次结束时间 HH:MM
+    start_date = db.Column(db.Date, nullable=False)  # 首次日期
+    end_date = db.Column(db.Date, nullable=False)    # 最后日期
+    purpose = db.Column(db.String(200))
+    status = db.Column(db.String(20), default='active')  # active, ended, cancelled
+    materialized_until = db.Column(db.Date)  # 已生成预约的最后日期
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @staticmethod
+    def weekday_mask(weekdays):
+        """[1, 3, 5]（周一为 1）→ 星期位图"""
+        mask = 0
+        for weekday in weekdays:
+            mask |= 1 << (int(weekday) - 1)
+        return mask
+
+    @property
+    def weekday_list(self):
+        """规则包含的星期，周一为 1"""
+        return [day + 1 for day in range(7) if self.weekdays >> day & 1]
+
+    def occurs_on(self, day):
+        return self.start_date <= day <= self.end_date and bool(self.weekdays >> day.weekday() & 1)
+
+    def window_on(self, day):
+        """某一天的预约时段 (开始, 结束)"""
+        start = datetime.combine(day, datetime.strptime(self.start_clock, '%H:%M').time())
+        end = datetime.combine(day, datetime.strptime(self.end_clock, '%H:%M').time())
+        return start, end
+
+    def dates_between(self, first, last):
+        """[first, last] 内按规则需要预约的日期"""
+        day = max(first, self.start_date)
+        last = min(last, self.end_date)
+        dates = []
+        while day <= last:
+            if self.weekdays >> day.weekday() & 1:
+                dates.append(day)
+            day += timedelta(days=1)
+        return dates
+
+    def __repr__(self):
+        return f'<RecurringBooking {self.id} seat={self.seat_id} {self.start_clock}-{self.end_clock}>'
+
+
+class RecurringOccurrence(db.Model):
+    """周期预约已处理的日期：生成的预约，或因冲突跳过的原因
+
+    (规则, 日期) 唯一，多个进程同时生成同一规则时只有一个能写入
+    """
+    __tablename__ = 'recurring_occurrences'
+    __table_args__ = (
+        db.UniqueConstraint('rule_id', 'occurrence_date', name='uq_recurring_occurrence_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    rule_id = db.Column(db.Integer, db.ForeignKey('recurring_bookings.id', ondelete='CASCADE'), nullable=False)
+    occurrence_date = db.Column(db.Date, nullable=False)
+    booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id', ondelete='SET NULL'), index=True)
+    skipped_reason = db.Column(db.String(100))  # 未生成预约时的原因
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    booking = db.relationship('Booking')
+
+    def __repr__(self):
+        return f'<RecurringOccurrence rule={self.rule_id} {self.occurrence_date}>'
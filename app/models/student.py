@@ -1,13 +1,16 @@
 from datetime import datetime
 
 from flask_login import UserMixin
-from werkzeug.security import check_password_hash, generate_password_hash
 
 from app import db
 
 
 class Student(db.Model, UserMixin):
     __tablename__ = 'students'
+    __table_args__ = (
+        # 管理后台按创建时间的游标分页
+        db.Index('ix_students_created_id', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.String(20), unique=True, nullable=False, index=True)  # 学号
@@ -30,11 +33,19 @@ class Student(db.Model, UserMixin):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+    def get_id(self):
+        """会话中保存的身份标识，带上类型以便加载时直接定位到对应的表"""
+        return f'student:{self.id}'
+
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        from app.utils.password_hashing import hash_password
+
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        from app.utils.password_hashing import verify_password
+
+        return verify_password(self, password)
 
     def update_last_login(self):
         self.last_login = datetime.utcnow()
@@ -46,6 +57,12 @@ class Student(db.Model, UserMixin):
                 self.is_active and
                 self.credit_score >= 80)
 
+    def record_booking(self):
+        """累计预约次数加一，由后台批量写回"""
+        from app.utils.counters import student_total_bookings
+
+        student_total_bookings.incr(self.id)
+
     def update_credit_score(self, change, reason=None):
         """更新信用积分"""
         self.credit_score += change
@@ -33,48 +33,78 @@ class StudyRoom(db.Model):
     # 关系
     seats = db.relationship('Seat', backref='study_room', lazy='dynamic')
 
-    @property
-    def available_seats_count(self):
-        """可用座位数量（基于实时预约数据）"""
-        from datetime import datetime
-        from app import db
-        from app.models.booking import Booking
+    @classmethod
+    def occupancy_for(cls, room_ids, at=None):
+        """批量统计多个自习室的座位占用情况（一次分组 JOIN 查询）
 
-        # 获取当前时间
-        now = datetime.now()
+        返回 {room_id: {'total': 总座位, 'occupied': 占用, 'available': 可用}}
+        """
+        from sqlalchemy import and_, func
 
-        # 查询该房间当前被占用的座位
-        occupied_seat_ids = db.session.query(Booking.seat_id).filter(
-            Booking.seat_id.in_([s.id for s in self.seats]),
-            Booking.status == 'active',
-            Booking.start_time <= now,
-            Booking.end_time >= now
-        ).distinct().all()
+        from app.models.booking import Booking
 
-        occupied_seat_ids = [s[0] for s in occupied_seat_ids]
+        room_ids = list(room_ids)
+        if not room_ids:
+            return {}
+        now = at or datetime.now()
+
+        rows = db.session.query(
+            Seat.room_id,
+            func.count(func.distinct(Seat.id)),
+            func.count(func.distinct(Booking.seat_id))
+        ).outerjoin(
+            Booking,
+            and_(
+                Booking.seat_id == Seat.id,
+                Booking.status == 'active',
+                Booking.start_time <= now,
+                Booking.end_time >= now
+            )
+        ).filter(
+            Seat.room_id.in_(room_ids)
+        ).group_by(Seat.room_id).all()
+
+        occupancy = {room_id: {'total': 0, 'occupied': 0, 'available': 0} for room_id in room_ids}
+        for room_id, total, occupied in rows:
+            occupancy[room_id] = {'total': total, 'occupied': occupied, 'available': total - occupied}
+        return occupancy
+
+    def _occupancy(self):
+        """当前请求内缓存的占用统计，首次访问时批量统计会话中已加载的所有自习室"""
+        from flask import g, has_app_context
+
+        if not has_app_context():
+            return StudyRoom.occupancy_for([self.id])[self.id]
+
+        memo = g.setdefault('room_occupancy', {})
+        if self.id not in memo:
+            room_ids = {obj.id for obj in db.session.identity_map.values()
+                        if isinstance(obj, StudyRoom) and obj.id not in memo}
+            room_ids.add(self.id)
+            memo.update(StudyRoom.occupancy_for(room_ids))
+        return memo[self.id]
 
-        # 计算可用座位数
-        return self.seats.filter(~Seat.id.in_(occupied_seat_ids)).count() if occupied_seat_ids else self.seats.count()
+    @property
+    def available_seats_count(self):
+        """可用座位数量（基于实时预约数据）"""
+        return self._occupancy()['available']
 
     @property
     def occupied_seats_count(self):
         """已占用座位数量（基于实时预约数据）"""
-        from datetime import datetime
-        from app import db
-        from app.models.booking import Booking
+        return self._occupancy()['occupied']
 
-        # 获取当前时间
-        now = datetime.now()
+    def get_available_seat_ids(self, start_time, end_time):
+        """指定时间段内空闲的座位ID（整个房间只需一次查询）"""
+        from app.utils.availability import seat_availability
+
+        return seat_availability.free_seat_ids(self.id, start_time, end_time)
 
-        # 查询该房间当前被占用的座位数
-        occupied_count = db.session.query(Booking.seat_id).filter(
-            Booking.seat_id.in_([s.id for s in self.seats]),
-            Booking.status == 'active',
-            Booking.start_time <= now,
-            Booking.end_time >= now
-        ).distinct().count()
+    def get_occupied_seat_ids(self, start_time, end_time):
+        """指定时间段内已被预约的座位ID"""
+        from app.utils.availability import seat_availability
 
-        return occupied_count
+        return seat_availability.occupied_seat_ids(self.id, start_time, end_time)
 
     def get_seats_by_type(self, seat_type):
         """根据类型获取座位"""
@@ -85,6 +115,9 @@ class StudyRoom(db.Model):
 
 class Seat(db.Model):
     __tablename__ = 'seats'
+    __table_args__ = (
+        db.Index('ix_seats_room_status', 'room_id', 'status'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey('study_rooms.id'), nullable=False)
@@ -105,14 +138,15 @@ class Seat(db.Model):
     @property
     def is_available_now(self):
         """检查座位当前是否可用"""
-        from datetime import datetime
-        now = datetime.utcnow()
-        active_booking = self.bookings.filter(
-            Booking.status == 'active',
-            Booking.start_time <= now,
-            Booking.end_time >= now
-        ).first()
-        return active_booking is None
+        from datetime import timedelta
+
+        from app.utils.availability import seat_availability
+
+        # 与自习室占用统计一致，使用本地时间
+        now = datetime.now()
+        return seat_availability.is_seat_free(
+            self.room_id, self.id, now, now + timedelta(seconds=1), statuses=('active',)
+        )
 
     def __repr__(self):
         return f'<Seat {self.seat_number} in Room {self.room_id}>'
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from app import db
+
+
+class RoomUsageStat(db.Model):
+    """自习室按小时汇总的使用统计，按日统计由同一天的24条记录汇总得到"""
+    __tablename__ = 'room_usage_stats'
+    __table_args__ = (
+        db.UniqueConstraint('room_id', 'stat_date', 'hour', name='uq_room_usage_bucket'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    room_id = db.Column(db.Integer, db.ForeignKey('study_rooms.id'), nullable=False)
+    stat_date = db.Column(db.Date, nullable=False, index=True)  # 统计日期
+    hour = db.Column(db.Integer, nullable=False)  # 小时 0-23
+    bookings = db.Column(db.Integer, default=0, nullable=False)  # 在该小时开始的预约数
+    cancellations = db.Column(db.Integer, default=0, nullable=False)  # 取消数
+    check_ins = db.Column(db.Integer, default=0, nullable=False)  # 签到数
+    no_shows = db.Column(db.Integer, default=0, nullable=False)  # 未到场数
+    booked_minutes = db.Column(db.Integer, default=0, nullable=False)  # 该小时内被预约占用的座位分钟数
+    used_minutes = db.Column(db.Integer, default=0, nullable=False)  # 该小时内实际使用(签到至签退)的座位分钟数
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<RoomUsageStat room={self.room_id} {self.stat_date} {self.hour}:00>'
@@ -1,7 +1,6 @@
 from datetime import datetime
 
 from flask_login import UserMixin
-from werkzeug.security import check_password_hash, generate_password_hash
 
 from .. import db
 
@@ -25,13 +24,21 @@ class User(UserMixin, db.Model):
     bookings = db.relationship('Booking', backref='user', lazy='dynamic', cascade='all, delete-orphan',
                               foreign_keys='Booking.user_id')
 
+    def get_id(self):
+        """会话中保存的身份标识，带上类型以便加载时直接定位到对应的表"""
+        return f'user:{self.id}'
+
     def set_password(self, password):
         """设置密码"""
-        self.password_hash = generate_password_hash(password)
+        from app.utils.password_hashing import hash_password
+
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         """验证密码"""
-        return check_password_hash(self.password_hash, password)
+        from app.utils.password_hashing import verify_password
+
+        return verify_password(self, password)
 
     def get_active_bookings(self):
         """获取当前活跃的预约"""
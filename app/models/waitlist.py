@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from app import db
+
+
+class WaitlistEntry(db.Model):
+    """候补登记：学生等待某间自习室（或某个座位）在某个时段空出座位"""
+    __tablename__ = 'waitlist_entries'
+    __table_args__ = (
+        # 座位释放时按 (自习室, 日期) 分桶查找候补，不扫描全部登记
+        db.Index('ix_waitlist_room_date_status', 'room_id', 'booking_date', 'status'),
+        db.Index('ix_waitlist_user_status', 'user_id', 'status'),
+        # 清理超时未确认的保留
+        db.Index('ix_waitlist_status_hold_expires', 'status', 'hold_expires_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    room_id = db.Column(db.Integer, db.ForeignKey('study_rooms.id'), nullable=False)
+    seat_id = db.Column(db.Integer, db.ForeignKey('seats.id'))  # 为空表示自习室内任意座位
+    booking_date = db.Column(db.Date, nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+    purpose = db.Column(db.String(200))
+    status = db.Column(db.String(20), default='waiting')  # waiting, offered, promoted, lapsed, cancelled
+    hold_seat_id = db.Column(db.Integer, db.ForeignKey('seats.id'))  # 为学生保留的座位，确认后转为预约
+    hold_token = db.Column(db.String(36))  # 保留凭证（seat_reservations.hold_token）
+    hold_expires_at = db.Column(db.DateTime)  # 超时未确认时转给下一位候补
+    booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id', ondelete='SET NULL'))  # 确认后的预约
+    promoted_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    booking = db.relationship('Booking')
+
+    def __repr__(self):
+        return f'<WaitlistEntry {self.id} room={self.room_id} seat={self.seat_id} {self.status}>'
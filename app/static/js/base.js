@@ -0,0 +1,63 @@
+// 侧边栏切换功能
+$(document).ready(function() {
+    // 检查本地存储中侧边栏的状态
+    var sidebarCollapsed = localStorage.getItem('sidebarCollapsed') === 'true';
+    var $sidebar = $('#sidebar');
+    var $mainContent = $('#mainContentWrapper');
+    var $footer = $('#mainFooter');
+
+    // 初始化侧边栏状态
+    if (sidebarCollapsed) {
+        $sidebar.addClass('collapsed');
+        $mainContent.addClass('collapsed');
+        $footer.addClass('collapsed');
+    }
+
+    // 侧边栏切换按钮点击事件
+    $('#sidebarToggle').click(function() {
+        $sidebar.toggleClass('collapsed');
+        $mainContent.toggleClass('collapsed');
+        $footer.toggleClass('collapsed');
+
+        // 保存状态到本地存储
+        localStorage.setItem('sidebarCollapsed', $sidebar.hasClass('collapsed'));
+    });
+
+    // 高亮当前页面的菜单项
+    highlightCurrentPage();
+
+    // 响应式处理
+    function handleResize() {
+        if ($(window).width() <= 768) {
+            // 移动设备默认隐藏侧边栏
+            $sidebar.addClass('collapsed');
+            $mainContent.addClass('collapsed');
+            $footer.addClass('collapsed');
+            localStorage.setItem('sidebarCollapsed', 'true');
+        }
+    }
+
+    $(window).resize(handleResize);
+    handleResize(); // 初始调用
+});
+
+// 高亮当前页面的菜单项
+function highlightCurrentPage() {
+    var currentPath = window.location.pathname;
+    $('.sidebar .nav-link').each(function() {
+        var $link = $(this);
+        var href = $link.attr('href');
+
+        // 精确匹配或包含匹配
+        if (href === currentPath || (href && currentPath.startsWith(href) && href !== '/')) {
+            $link.addClass('active');
+            return false; // 找到后退出循环
+        }
+    });
+}
+
+// 工具函数
+function showAddUserModal() {
+    // 这里可以显示添加用户的模态框
+    utils.showToast('功能开发中...', 'info');
+}
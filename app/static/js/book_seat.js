@@ -0,0 +1,362 @@
+let selectedRoom = null;
+let selectedRoomName = null;
+let selectedSeat = null;
+let selectedSeatNumber = null;
+let currentStep = 1;
+
+// 选择自习室
+function selectRoom(roomId, roomName) {
+    selectedRoom = roomId;
+    selectedRoomName = roomName;
+
+    // 更新UI
+    document.querySelectorAll('.room-card').forEach(card => {
+        card.classList.remove('selected');
+    });
+    event.currentTarget.classList.add('selected');
+
+    // 更新摘要
+    document.getElementById('summaryRoom').textContent = roomName;
+
+    // 启用下一步按钮
+    document.getElementById('nextStepBtn').disabled = false;
+}
+
+// 选择时间段
+function selectTimeSlot(startTime, endTime) {
+    document.getElementById('startTime').value = startTime;
+    document.getElementById('endTime').value = endTime;
+    updateSummary();
+}
+
+// 时间变化时更新摘要
+document.getElementById('bookingDate').addEventListener('change', updateSummary);
+document.getElementById('startTime').addEventListener('change', updateSummary);
+document.getElementById('endTime').addEventListener('change', updateSummary);
+
+function updateSummary() {
+    const date = document.getElementById('bookingDate').value;
+    const startTime = document.getElementById('startTime').value;
+    const endTime = document.getElementById('endTime').value;
+
+    document.getElementById('summaryDate').textContent = date || '未选择';
+    document.getElementById('summaryTime').textContent = (startTime && endTime) ? `${startTime} - ${endTime}` : '未选择';
+
+    // 计算时长
+    if (startTime && endTime) {
+        const start = new Date(`2000-01-01 ${startTime}`);
+        const end = new Date(`2000-01-01 ${endTime}`);
+        const duration = (end - start) / (1000 * 60 * 60); // 小时
+        document.getElementById('summaryDuration').textContent = `${duration}小时`;
+    }
+}
+
+// 下一步
+function nextStep() {
+    if (currentStep === 1 && !selectedRoom) {
+        utils.showToast('请先选择自习室', 'warning');
+        return;
+    }
+
+    if (currentStep === 2) {
+        const date = document.getElementById('bookingDate').value;
+        const startTime = document.getElementById('startTime').value;
+        const endTime = document.getElementById('endTime').value;
+
+        if (!date || !startTime || !endTime) {
+            utils.showToast('请完善时间信息', 'warning');
+            return;
+        }
+
+        if (startTime >= endTime) {
+            utils.showToast('结束时间必须晚于开始时间', 'warning');
+            return;
+        }
+    }
+
+    if (currentStep === 3 && !selectedSeat) {
+        utils.showToast('请先选择座位', 'warning');
+        return;
+    }
+
+    if (currentStep < 4) {
+        goToStep(currentStep + 1);
+    }
+}
+
+// 跳转到指定步骤
+function goToStep(step) {
+    // 隐藏所有步骤内容
+    for (let i = 1; i <= 4; i++) {
+        document.getElementById(`step${i}Content`).classList.add('d-none');
+        document.getElementById(`step${i}`).classList.remove('active');
+    }
+
+    // 显示当前步骤
+    document.getElementById(`step${step}Content`).classList.remove('d-none');
+    document.getElementById(`step${step}`).classList.add('active');
+
+    currentStep = step;
+
+    // 特殊处理
+    if (step === 3) {
+        loadSeats();
+    } else if (step === 4) {
+        showConfirmation();
+    }
+}
+
+// 加载座位
+function loadSeats() {
+    const date = document.getElementById('bookingDate').value;
+    const startTime = document.getElementById('startTime').value;
+    const endTime = document.getElementById('endTime').value;
+
+    if (!date || !startTime || !endTime) {
+        utils.showToast('请先选择时间', 'warning');
+        goToStep(2);
+        return;
+    }
+
+    const container = document.getElementById('seatsContainer');
+    container.innerHTML = '<div class="text-center py-4"><div class="spinner-border"></div><p class="mt-2">正在加载座位...</p></div>';
+
+    fetch(`/student/room/${selectedRoom}/seats?date=${date}&start_time=${startTime}&end_time=${endTime}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                displaySeats(data.seats);
+                subscribeSeatEvents(selectedRoom);
+            } else {
+                utils.showToast('加载座位失败', 'error');
+            }
+        })
+        .catch(error => {
+            utils.showToast('网络错误', 'error');
+            container.innerHTML = '<div class="text-center text-danger">加载失败，请重试</div>';
+        });
+}
+
+// 显示座位
+function displaySeats(seats) {
+    const container = document.getElementById('seatsContainer');
+    let html = '<div class="row">';
+
+    seats.forEach(seat => {
+        const seatClass = seat.is_available ? 'seat-available' : 'seat-unavailable';
+        const iconHtml = `
+            <i class="bi bi-${seat.power_socket ? 'lightning-charge' : 'chair'}"></i>
+            ${seat.window_seat ? '<i class="bi bi-sun"></i>' : ''}
+            ${seat.computer_available ? '<i class="bi bi-pc-display" title="有电脑"></i>' : ''}
+        `;
+
+        html += `
+            <div class="col-md-3 col-sm-4 col-6 mb-3">
+                <div class="seat-item ${seatClass}" onclick="selectSeat(${seat.id}, '${seat.seat_number}', this.classList.contains('seat-available'))"
+                     data-seat-id="${seat.id}" data-seat-type="${seat.type}"
+                     data-power="${seat.power_socket}" data-window="${seat.window_seat}">
+                    <div class="seat-icon">${iconHtml}</div>
+                    <div class="seat-number">${seat.seat_number}</div>
+                    <div class="seat-type">${getTypeLabel(seat.type)}</div>
+                </div>
+            </div>
+        `;
+    });
+
+    html += '</div>';
+    container.innerHTML = html;
+
+    // 绑定座位过滤器
+    document.querySelectorAll('input[name="seatFilter"]').forEach(radio => {
+        radio.addEventListener('change', filterSeats);
+    });
+}
+
+// 获取座位类型标签
+function getTypeLabel(type) {
+    const labels = {
+        'regular': '普通',
+        'window': '靠窗',
+        'power': '电源',
+        'computer': '电脑'
+    };
+    return labels[type] || type;
+}
+
+// 选择座位
+function selectSeat(seatId, seatNumber, isAvailable) {
+    if (!isAvailable) {
+        utils.showToast('该座位不可用', 'warning');
+        return;
+    }
+
+    selectedSeat = seatId;
+    selectedSeatNumber = seatNumber;
+
+    // 更新UI
+    document.querySelectorAll('.seat-item').forEach(seat => {
+        seat.classList.remove('selected');
+    });
+    event.currentTarget.classList.add('selected');
+
+    // 更新摘要
+    document.getElementById('summarySeat').textContent = seatNumber;
+
+    // 启用下一步按钮
+    document.getElementById('nextStepBtn').disabled = false;
+}
+
+// 过滤座位
+function filterSeats() {
+    const filterType = document.querySelector('input[name="seatFilter"]:checked').id;
+    const seats = document.querySelectorAll('.seat-item');
+
+    seats.forEach(seat => {
+        const power = seat.dataset.power === 'true';
+        const window = seat.dataset.window === 'true';
+        const isAvailable = seat.classList.contains('seat-available');
+
+        let show = true;
+
+        switch (filterType) {
+            case 'filterAvailable':
+                show = isAvailable;
+                break;
+            case 'filterPower':
+                show = power && isAvailable;
+                break;
+            case 'filterWindow':
+                show = window && isAvailable;
+                break;
+        }
+
+        seat.style.display = show ? '' : 'none';
+    });
+}
+
+// 显示确认信息
+function showConfirmation() {
+    const date = document.getElementById('bookingDate').value;
+    const startTime = document.getElementById('startTime').value;
+    const endTime = document.getElementById('endTime').value;
+    const purpose = document.getElementById('purpose').value;
+
+    document.getElementById('confirmRoom').textContent = selectedRoomName;
+    document.getElementById('confirmSeat').textContent = selectedSeatNumber;
+    document.getElementById('confirmDate').textContent = date;
+    document.getElementById('confirmTime').textContent = `${startTime} - ${endTime}`;
+    if (purpose) {
+        document.getElementById('confirmPurpose').textContent = purpose;
+    }
+
+    // 隐藏下一步按钮
+    document.getElementById('nextStepBtn').style.display = 'none';
+}
+
+// 提交预约
+function submitBooking() {
+    const data = {
+        room_id: selectedRoom,
+        seat_id: selectedSeat,
+        booking_date: document.getElementById('bookingDate').value,
+        start_time: document.getElementById('startTime').value,
+        end_time: document.getElementById('endTime').value,
+        purpose: document.getElementById('purpose').value
+    };
+
+    fetch('/student/book_seat', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(data)
+    })
+    .then(response => response.json())
+    .then(result => {
+        if (result.success) {
+            utils.showToast(`预约成功！预约号：${result.booking_number}`, 'success');
+            setTimeout(() => {
+                window.location.href = '/student/my_bookings';
+            }, 2000);
+        } else {
+            utils.showToast(result.message, 'error');
+        }
+    })
+    .catch(error => {
+        utils.showToast('预约失败，请重试', 'error');
+    });
+}
+
+// 订阅所选自习室的座位变化，代替重新拉取整间自习室的座位数据
+let seatEvents = null;
+let seatReloadTimer = null;
+
+function subscribeSeatEvents(roomId) {
+    if (!window.EventSource) return;
+    if (seatEvents) seatEvents.close();
+    seatEvents = new EventSource(`/api/events/stream?rooms=${roomId}`);
+    seatEvents.addEventListener('seat', event => applySeatChange(JSON.parse(event.data)));
+}
+
+function applySeatChange(change) {
+    if (String(change.room_id) !== String(selectedRoom)) return;
+    const date = document.getElementById('bookingDate').value;
+    const windowStart = new Date(`${date}T${document.getElementById('startTime').value}`);
+    const windowEnd = new Date(`${date}T${document.getElementById('endTime').value}`);
+    const changeStart = new Date(change.start_time.slice(0, 19));
+    const changeEnd = new Date(change.end_time.slice(0, 19));
+    if (changeStart >= windowEnd || changeEnd <= windowStart) return;
+
+    const seat = document.querySelector(`.seat-item[data-seat-id="${change.seat_id}"]`);
+    if (!seat) return;
+    if (change.state === 'booked') {
+        seat.classList.remove('seat-available', 'selected');
+        seat.classList.add('seat-unavailable');
+        if (selectedSeat === change.seat_id) {
+            selectedSeat = null;
+            selectedSeatNumber = null;
+            document.getElementById('summarySeat').textContent = '未选择';
+            document.getElementById('nextStepBtn').disabled = true;
+            utils.showToast('所选座位刚被预约，请重新选择', 'warning');
+        }
+    } else if (change.state === 'released') {
+        // 同一时段可能还有其他预约占用该座位，合并后重新加载一次
+        clearTimeout(seatReloadTimer);
+        seatReloadTimer = setTimeout(loadSeats, 1000);
+    }
+}
+
+// 重置选择
+function resetSelection() {
+    if (seatEvents) {
+        seatEvents.close();
+        seatEvents = null;
+    }
+    selectedRoom = null;
+    selectedRoomName = null;
+    selectedSeat = null;
+    selectedSeatNumber = null;
+    currentStep = 1;
+
+    // 重置表单
+    document.getElementById('bookingForm').reset();
+
+    // 重置摘要
+    document.getElementById('summaryRoom').textContent = '未选择';
+    document.getElementById('summarySeat').textContent = '未选择';
+    document.getElementById('summaryDate').textContent = '未选择';
+    document.getElementById('summaryTime').textContent = '未选择';
+    document.getElementById('summaryDuration').textContent = '-';
+
+    // 重置UI
+    document.querySelectorAll('.room-card').forEach(card => {
+        card.classList.remove('selected');
+    });
+
+    // 显示第一步
+    goToStep(1);
+
+    // 重置按钮状态
+    document.getElementById('nextStepBtn').disabled = true;
+    document.getElementById('nextStepBtn').style.display = '';
+}
@@ -0,0 +1,208 @@
+// 当前自习室ID由模板在 script 标签的 data-room-id 上传入
+const ROOM_ID = document.currentScript.dataset.roomId;
+
+$(document).ready(function() {
+    // 切换视图
+    $('#toggleViewBtn').on('click', function() {
+        const gridView = $('#gridView');
+        const listView = $('#listView');
+
+        if (gridView.is(':visible')) {
+            gridView.hide();
+            listView.show();
+            $(this).html('<i class="bi bi-grid-3x3-gap"></i> 网格视图');
+        } else {
+            gridView.show();
+            listView.hide();
+            $(this).html('<i class="bi bi-list"></i> 列表视图');
+        }
+    });
+
+    // 添加座位
+    $('#addSeatForm').on('submit', function(e) {
+        e.preventDefault();
+        const formData = new FormData(this);
+        formData.append('room_id', ROOM_ID);
+
+        $.ajax({
+            url: '/admin/api/add_seat',
+            type: 'POST',
+            data: formData,
+            processData: false,
+            contentType: false,
+            success: function(response) {
+                if (response.success) {
+                    alert('座位添加成功！');
+                    location.reload();
+                } else {
+                    alert('添加失败：' + response.message);
+                }
+            },
+            error: function() {
+                alert('添加失败，请重试');
+            }
+        });
+    });
+
+    // 编辑座位
+    $('.edit-seat-btn').on('click', function() {
+        const btn = $(this);
+        $('#editSeatForm input[name="seat_id"]').val(btn.data('seat-id'));
+        $('#editSeatForm input[name="seat_number"]').val(btn.data('seat-number'));
+        $('#editSeatForm select[name="type"]').val(btn.data('seat-type'));
+        $('#editSeatForm select[name="status"]').val(btn.data('seat-status'));
+        $('#editSeatForm input[name="power_socket"]').prop('checked', btn.data('power-socket') === 'True');
+        $('#editSeatForm input[name="window_seat"]').prop('checked', btn.data('window-seat') === 'True');
+        $('#editSeatForm textarea[name="description"]').val(btn.data('description'));
+
+        $('#editSeatModal').modal('show');
+    });
+
+    $('#editSeatForm').on('submit', function(e) {
+        e.preventDefault();
+        const formData = new FormData(this);
+
+        $.ajax({
+            url: '/admin/api/update_seat',
+            type: 'POST',
+            data: formData,
+            processData: false,
+            contentType: false,
+            success: function(response) {
+                if (response.success) {
+                    alert('座位更新成功！');
+                    location.reload();
+                } else {
+                    alert('更新失败：' + response.message);
+                }
+            },
+            error: function() {
+                alert('更新失败，请重试');
+            }
+        });
+    });
+
+    // 设置座位维护状态
+    $('.set-maintenance-btn').on('click', function() {
+        const seatId = $(this).data('seat-id');
+
+        if (confirm('确定要设置该座位为维护状态吗？')) {
+            $.ajax({
+                url: '/admin/api/set_seat_maintenance',
+                type: 'POST',
+                data: {seat_id: seatId},
+                success: function(response) {
+                    if (response.success) {
+                        alert('座位已设置为维护状态');
+                        location.reload();
+                    } else {
+                        alert('操作失败：' + response.message);
+                    }
+                },
+                error: function() {
+                    alert('操作失败，请重试');
+                }
+            });
+        }
+    });
+
+    // 设置座位可用状态
+    $('.set-available-btn').on('click', function() {
+        const seatId = $(this).data('seat-id');
+
+        if (confirm('确定要设置该座位为可用状态吗？')) {
+            $.ajax({
+                url: '/admin/api/set_seat_available',
+                type: 'POST',
+                data: {seat_id: seatId},
+                success: function(response) {
+                    if (response.success) {
+                        alert('座位已设置为可用状态');
+                        location.reload();
+                    } else {
+                        alert('操作失败：' + response.message);
+                    }
+                },
+                error: function() {
+                    alert('操作失败，请重试');
+                }
+            });
+        }
+    });
+
+    // 删除座位
+    $('.delete-seat-btn').on('click', function() {
+        const seatId = $(this).data('seat-id');
+        const seatNumber = $(this).data('seat-number');
+
+        if (confirm(`确定要删除座位 ${seatNumber} 吗？此操作不可恢复！`)) {
+            $.ajax({
+                url: '/admin/api/delete_seat',
+                type: 'POST',
+                data: {seat_id: seatId},
+                success: function(response) {
+                    if (response.success) {
+                        alert('座位删除成功');
+                        location.reload();
+                    } else {
+                        alert('删除失败：' + response.message);
+                    }
+                },
+                error: function() {
+                    alert('删除失败，请重试');
+                }
+            });
+        }
+    });
+
+    // 批量生成座位
+    $('#autoGenerateSeats').on('click', function() {
+        $('#generateSeatsModal').modal('show');
+    });
+
+    // 预览座位总数
+    $('#generateSeatsForm input[name="rows"], #generateSeatsForm input[name="columns"]').on('input', function() {
+        const rows = parseInt($('#generateSeatsForm input[name="rows"]').val()) || 0;
+        const columns = parseInt($('#generateSeatsForm input[name="columns"]').val()) || 0;
+        $('#totalSeatsPreview').text(rows * columns);
+    });
+
+    $('#generateSeatsForm').on('submit', function(e) {
+        e.preventDefault();
+        const formData = new FormData(this);
+        formData.append('room_id', ROOM_ID);
+
+        $.ajax({
+            url: '/admin/api/generate_seats',
+            type: 'POST',
+            data: formData,
+            processData: false,
+            contentType: false,
+            success: function(response) {
+                if (response.success) {
+                    alert(`成功生成 ${response.seat_count} 个座位！`);
+                    location.reload();
+                } else {
+                    alert('生成失败：' + response.message);
+                }
+            },
+            error: function() {
+                alert('生成失败，请重试');
+            }
+        });
+    });
+
+    // 座位网格点击事件
+    $('.seat-item').on('click', function() {
+        const seatId = $(this).data('seat-id');
+        const seatNumber = $(this).data('seat-number');
+        const status = $(this).data('seat-status');
+
+        if (status === 'available' || status === 'maintenance') {
+            // 获取对应的编辑按钮并触发点击
+            $(`.edit-seat-btn[data-seat-id="${seatId}"]`).click();
+        } else {
+            alert(`座位 ${seatNumber} 当前被占用，无法编辑`);
+        }
+    });
+});
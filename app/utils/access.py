@@ -0,0 +1,50 @@
+"""
+接口访问控制
+"""
+
+from functools import wraps
+
+from flask import jsonify
+from flask_login import current_user
+
+
+def is_admin(user=None):
+    """当前用户是否为管理员"""
+    from app.models import Admin
+
+    user = user if user is not None else current_user
+    if not user or not user.is_authenticated:
+        return False
+    target = user._get_current_object() if hasattr(user, '_get_current_object') else user
+    return isinstance(target, Admin)
+
+
+def is_student(user=None):
+    """当前用户是否为学生"""
+    from app.models import Student
+
+    user = user if user is not None else current_user
+    if not user or not user.is_authenticated:
+        return False
+    target = user._get_current_object() if hasattr(user, '_get_current_object') else user
+    return isinstance(target, Student)
+
+
+def admin_required(view):
+    """仅允许管理员访问的 JSON 接口"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_admin():
+            return jsonify({'success': False, 'message': '需要管理员权限'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def student_required(view):
+    """仅允许学生访问的 JSON 接口"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_student():
+            return jsonify({'success': False, 'message': '请先以学生身份登录'}), 403
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,189 @@
+"""
+静态资源构建
+把 app/static 下的 CSS/JS 压缩后按内容哈希重命名到 app/static/dist/，
+同时预先生成 gzip 和 brotli 版本，并写出 manifest.json（原路径 → 带哈希的路径）。
+
+启用 STATIC_ASSETS_FINGERPRINT 后，模板中的 url_for('static', filename='css/style.css')
+自动替换为带哈希的地址，这些文件设置一年的 immutable 缓存，并按 Accept-Encoding
+直接返回预压缩的版本；重复访问时浏览器不再请求静态资源。
+
+构建（部署时执行，修改静态文件后需要重新构建）:
+    flask build-assets
+    python app/utils/assets.py
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import request, send_from_directory
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+SKIP_DIRS = {DIST_DIR, 'uploads'}
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.ico'}
+MAX_AGE = 365 * 24 * 3600
+
+_STRING = r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\''
+_STRING_OR_COMMENT = re.compile(rf'({_STRING})|/\*.*?\*/', re.S)
+
+
+def minify_css(text):
+    """去掉注释和多余空白，字符串内容保持不变"""
+    text = _STRING_OR_COMMENT.sub(lambda match: match.group(1) or '', text)
+    parts = []
+    position = 0
+    for match in re.finditer(_STRING, text):
+        parts.append(_compact_css(text[position:match.start()]))
+        parts.append(match.group(0))
+        position = match.end()
+    parts.append(_compact_css(text[position:]))
+    return ''.join(parts).strip()
+
+
+def _compact_css(text):
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    return re.sub(r':\s+', ':', text).replace(';}', '}')
+
+
+def minify_js(text):
+    """保守地压缩 JS: 去掉行首缩进、空行和整行注释，不合并行，不改动模板字符串中的内容"""
+    lines = []
+    in_template = in_comment = False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if in_comment:
+            if '*/' in stripped:
+                in_comment = False
+                rest = stripped.split('*/', 1)[1].strip()
+                if rest:
+                    lines.append(rest)
+            continue
+        if in_template:
+            lines.append(line)
+        elif stripped.startswith('/*') and ('*/' not in stripped or stripped.endswith('*/')):
+            in_comment = '*/' not in stripped
+            continue
+        elif stripped and not stripped.startswith('//'):
+            lines.append(stripped)
+        # 未转义的反引号成对出现，奇数个表示模板字符串跨行
+        if len(re.findall(r'(?<!\\)`', line)) % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def _compress(path, data):
+    """写出比原文件更小的 gzip / brotli 版本，返回生成的编码"""
+    encodings = []
+    variants = [('gzip', '.gz', lambda raw: gzip.compress(raw, compresslevel=9, mtime=0))]
+    try:
+        import brotli
+        variants.insert(0, ('br', '.br', lambda raw: brotli.compress(raw, quality=11)))
+    except ImportError:
+        pass
+    for encoding, suffix, compress in variants:
+        compressed = compress(data)
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as output:
+                output.write(compressed)
+            encodings.append(encoding)
+    return encodings
+
+
+def build_assets(static_folder):
+    """构建全部静态资源，返回 manifest"""
+    dist = os.path.join(static_folder, DIST_DIR)
+    files = {}
+    encodings = {}
+    for root, dirs, names in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs
+                         if not (root == static_folder and d in SKIP_DIRS))
+        for name in sorted(names):
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            base, ext = os.path.splitext(logical)
+            with open(source, 'rb') as f:
+                data = f.read()
+            if ext in MINIFIERS:
+                data = MINIFIERS[ext](data.decode('utf-8')).encode('utf-8')
+            hashed = f'{base}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+            target = os.path.join(dist, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as output:
+                output.write(data)
+            files[logical] = hashed
+            if ext in COMPRESSIBLE:
+                encodings[hashed] = _compress(target, data)
+    manifest = {'files': files, 'encodings': encodings}
+    with open(os.path.join(dist, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def init_app(app):
+    """注册构建命令；启用指纹时改写 static 地址并接管带哈希文件的响应"""
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """压缩、加哈希并预压缩静态资源"""
+        manifest = build_assets(app.static_folder)
+        compressed = sum(1 for encodings in manifest['encodings'].values() if encodings)
+        print(f"已构建 {len(manifest['files'])} 个文件，其中 {compressed} 个生成了预压缩版本")
+
+    if not app.config.get('STATIC_ASSETS_FINGERPRINT'):
+        return
+    manifest = load_manifest(app.static_folder)
+    if manifest is None:
+        app.logger.warning("未找到静态资源清单，请先执行 flask build-assets")
+        return
+    files = manifest['files']
+    encodings = {f'{DIST_DIR}/{hashed}': found for hashed, found in manifest['encodings'].items()}
+    served = {f'{DIST_DIR}/{hashed}' for hashed in files.values()}
+    static_view = app.view_functions['static']
+
+    @app.url_defaults
+    def _fingerprint_static(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in files:
+            values['filename'] = f"{DIST_DIR}/{files[values['filename']]}"
+
+    def serve_static(filename):
+        if filename not in served:
+            return static_view(filename=filename)
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding in encodings.get(filename, ()):
+            if request.accept_encodings[encoding]:
+                suffix = '.br' if encoding == 'br' else '.gz'
+                response = send_from_directory(app.static_folder, filename + suffix,
+                                               mimetype=mimetype, max_age=MAX_AGE)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(app.static_folder, filename,
+                                           mimetype=mimetype, max_age=MAX_AGE)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = serve_static
+
+
+if __name__ == '__main__':
+    static_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+    result = build_assets(static_folder)
+    print(f"已构建 {len(result['files'])} 个文件到 {os.path.join(static_folder, DIST_DIR)}")
@@ -0,0 +1,271 @@
+"""
+座位可用性索引
+按 (自习室, 日期) 缓存当天所有座位的预约区间，一次查询即可回答整个房间的空闲座位
+"""
+
+import threading
+import time as _time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import and_, event
+from sqlalchemy.orm import Session
+
+from app import db
+
+# 占用座位的预约状态（与 Booking.check_seat_availability 保持一致）
+BLOCKING_STATUSES = ('active', 'completed')
+
+
+class _SeatTimeline:
+    """单个座位在某一天的预约区间，按开始时间排序"""
+
+    __slots__ = ('entries',)
+
+    def __init__(self):
+        self.entries = []  # (start_time, end_time, booking_id, status)
+
+    def add(self, start_time, end_time, booking_id, status):
+        self.remove(booking_id)
+        insort(self.entries, (start_time, end_time, booking_id, status))
+
+    def remove(self, booking_id):
+        for i, entry in enumerate(self.entries):
+            if entry[2] == booking_id:
+                del self.entries[i]
+                return True
+        return False
+
+    def overlaps(self, start_time, end_time, statuses, exclude_booking_id=None):
+        """是否存在与 [start_time, end_time) 重叠的预约"""
+        # 只有开始时间早于查询结束时间的区间才可能重叠
+        limit = bisect_left(self.entries, (end_time,))
+        for _, entry_end, booking_id, status in self.entries[:limit]:
+            if entry_end > start_time and status in statuses and booking_id != exclude_booking_id:
+                return True
+        return False
+
+    def gaps(self, start_time, end_time, statuses):
+        """[start_time, end_time) 内不与任何预约重叠的最大区间，按开始时间顺序扫描一遍"""
+        gaps = []
+        cursor = start_time
+        for entry_start, entry_end, _, status in self.entries:
+            if entry_start >= end_time:
+                break
+            if status not in statuses or entry_end <= cursor:
+                continue
+            if entry_start > cursor:
+                gaps.append((cursor, entry_start))
+            cursor = entry_end
+        if cursor < end_time:
+            gaps.append((cursor, end_time))
+        return gaps
+
+
+class _RoomDay:
+    """某个自习室某一天的座位时间线集合"""
+
+    __slots__ = ('loaded_at', 'seat_ids', 'timelines')
+
+    def __init__(self, seat_ids):
+        self.seat_ids = frozenset(seat_ids)
+        self.timelines = {}
+        self.loaded_at = _time.monotonic()
+
+    def timeline(self, seat_id):
+        timeline = self.timelines.get(seat_id)
+        if timeline is None:
+            timeline = self.timelines[seat_id] = _SeatTimeline()
+        return timeline
+
+
+def _day_bounds(day):
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
+def _days_between(start_time, end_time):
+    """[start_time, end_time) 覆盖的所有日期"""
+    day = start_time.date()
+    last = (end_time - timedelta(microseconds=1)).date() if end_time > start_time else day
+    while day <= last:
+        yield day
+        day += timedelta(days=1)
+
+
+class SeatAvailabilityIndex:
+    """进程内座位可用性索引
+
+    本进程内的预约变更通过 ORM 事件在提交后同步到索引；
+    其他工作进程的写入由 ttl 限定最长可见延迟。写入路径仍以数据库检查为准。
+    """
+
+    def __init__(self, ttl=5.0):
+        self.ttl = ttl
+        self._rooms = {}       # (room_id, date) -> _RoomDay
+        self._seat_rooms = {}  # seat_id -> room_id
+        self._lock = threading.RLock()
+
+    def _load(self, room_id, day):
+        """一次查询加载房间当天全部座位及其重叠预约"""
+        from app.models import Booking, Seat
+
+        day_start, day_end = _day_bounds(day)
+        rows = db.session.query(
+            Seat.id, Booking.id, Booking.start_time, Booking.end_time, Booking.status
+        ).outerjoin(
+            Booking,
+            and_(
+                Booking.seat_id == Seat.id,
+                Booking.status.in_(BLOCKING_STATUSES),
+                Booking.start_time < day_end,
+                Booking.end_time > day_start,
+            ),
+        ).filter(Seat.room_id == room_id).all()
+
+        room_day = _RoomDay({row[0] for row in rows})
+        for seat_id, booking_id, start_time, end_time, status in rows:
+            self._seat_rooms[seat_id] = room_id
+            if booking_id is not None:
+                room_day.timeline(seat_id).add(start_time, end_time, booking_id, status)
+        return room_day
+
+    def _current_ttl(self):
+        if has_app_context():
+            return current_app.config.get('SEAT_AVAILABILITY_TTL', self.ttl)
+        return self.ttl
+
+    def _room_day(self, room_id, day):
+        key = (room_id, day)
+        with self._lock:
+            room_day = self._rooms.get(key)
+            if room_day is not None and _time.monotonic() - room_day.loaded_at < self._current_ttl():
+                return room_day
+        room_day = self._load(room_id, day)
+        with self._lock:
+            self._rooms[key] = room_day
+            # 历史日期很少被重复查询，加载新数据时顺带清理
+            self.prune(datetime.now().date() - timedelta(days=1))
+        return room_day
+
+    def occupied_seat_ids(self, room_id, start_time, end_time, statuses=BLOCKING_STATUSES,
+                          exclude_booking_id=None):
+        """房间内在 [start_time, end_time) 有冲突预约的座位ID"""
+        occupied = set()
+        for day in _days_between(start_time, end_time):
+            room_day = self._room_day(room_id, day)
+            with self._lock:
+                for seat_id, timeline in room_day.timelines.items():
+                    if seat_id not in occupied and timeline.overlaps(
+                            start_time, end_time, statuses, exclude_booking_id):
+                        occupied.add(seat_id)
+        return occupied
+
+    def free_seat_ids(self, room_id, start_time, end_time, statuses=BLOCKING_STATUSES):
+        """房间内在 [start_time, end_time) 完全空闲的座位ID"""
+        seat_ids = set()
+        for day in _days_between(start_time, end_time):
+            seat_ids |= self._room_day(room_id, day).seat_ids
+        return seat_ids - self.occupied_seat_ids(room_id, start_time, end_time, statuses)
+
+    def is_seat_free(self, room_id, seat_id, start_time, end_time, statuses=BLOCKING_STATUSES,
+                     exclude_booking_id=None):
+        """单个座位在 [start_time, end_time) 是否空闲"""
+        for day in _days_between(start_time, end_time):
+            room_day = self._room_day(room_id, day)
+            with self._lock:
+                timeline = room_day.timelines.get(seat_id)
+                if timeline and timeline.overlaps(start_time, end_time, statuses,
+                                                  exclude_booking_id):
+                    return False
+        return True
+
+    def free_intervals(self, room_id, start_time, end_time, statuses=BLOCKING_STATUSES):
+        """房间内每个座位在 [start_time, end_time)（同一天内）的最大空闲区间
+
+        返回 {seat_id: [(开始, 结束), ...]}
+        """
+        room_day = self._room_day(room_id, start_time.date())
+        with self._lock:
+            return {
+                seat_id: (room_day.timelines[seat_id].gaps(start_time, end_time, statuses)
+                          if seat_id in room_day.timelines else [(start_time, end_time)])
+                for seat_id in room_day.seat_ids
+            }
+
+    def apply(self, booking_id, seat_id, start_time, end_time, status):
+        """同步一条预约的最新状态到已加载的索引"""
+        with self._lock:
+            # 先从所有已加载日期中移除（预约可能改过时间或座位）
+            self.discard(booking_id)
+            room_id = self._seat_rooms.get(seat_id)
+            if room_id is None or status not in BLOCKING_STATUSES:
+                return
+            for day in _days_between(start_time, end_time):
+                room_day = self._rooms.get((room_id, day))
+                if room_day is not None:
+                    room_day.timeline(seat_id).add(start_time, end_time, booking_id, status)
+
+    def discard(self, booking_id):
+        """从索引中删除一条预约"""
+        with self._lock:
+            for room_day in self._rooms.values():
+                for timeline in room_day.timelines.values():
+                    timeline.remove(booking_id)
+
+    def invalidate(self, room_id=None, day=None):
+        """丢弃缓存，下次查询时重新加载"""
+        with self._lock:
+            if room_id is None and day is None:
+                self._rooms.clear()
+                return
+            for key in [k for k in self._rooms
+                        if (room_id is None or k[0] == room_id) and (day is None or k[1] == day)]:
+                del self._rooms[key]
+
+    def prune(self, before):
+        """清理早于指定日期的缓存"""
+        with self._lock:
+            for key in [k for k in self._rooms if k[1] < before]:
+                del self._rooms[key]
+
+
+seat_availability = SeatAvailabilityIndex()
+
+
+def _pending_changes(session):
+    return session.info.setdefault('seat_availability_changes', {})
+
+
+@event.listens_for(Session, 'after_flush', propagate=True)
+def _collect_booking_changes(session, flush_context):
+    """记录本次事务中变更的预约，提交后再写入索引"""
+    from app.models import Booking
+
+    changes = None
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Booking) and obj.id is not None:
+            changes = changes if changes is not None else _pending_changes(session)
+            changes[obj.id] = (obj.seat_id, obj.start_time, obj.end_time, obj.status or 'active')
+    for obj in session.deleted:
+        if isinstance(obj, Booking) and obj.id is not None:
+            changes = changes if changes is not None else _pending_changes(session)
+            changes[obj.id] = None
+
+
+@event.listens_for(Session, 'after_commit', propagate=True)
+def _apply_booking_changes(session):
+    changes = session.info.pop('seat_availability_changes', None)
+    if not changes:
+        return
+    for booking_id, change in changes.items():
+        if change is None:
+            seat_availability.discard(booking_id)
+        else:
+            seat_availability.apply(booking_id, *change)
+
+
+@event.listens_for(Session, 'after_rollback', propagate=True)
+def _drop_booking_changes(session):
+    session.info.pop('seat_availability_changes', None)
@@ -0,0 +1,237 @@
+"""
+头像处理
+上传的原图不再直接保存和展示，而是:
+1. 分块写入临时文件，同时计算 SHA-256 并检查大小，不把整个文件读入内存
+2. 在进程池中解码、裁剪为正方形并缩放为几个固定尺寸，重新编码为 WebP
+3. 以内容哈希命名保存（{哈希}_{尺寸}.webp），相同图片只处理和存储一次
+4. 由 /avatars/ 接口返回，文件名随内容变化，可以设置一年的 immutable 缓存
+
+数据库的 avatar 列保存最大尺寸的地址，模板中用 avatar_url(地址, 显示像素) 取合适的尺寸；
+旧的原图地址原样返回，可用 flask migrate-avatars 批量转换。
+
+用法（视图中）:
+    from app.utils.avatars import save_avatar
+    url = save_avatar(current_user, request.files['avatar'])
+    db.session.commit()
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+
+from flask import abort, jsonify, send_from_directory
+
+from app import db
+
+AVATAR_URL_RE = re.compile(r'^/avatars/(?P<digest>[0-9a-f]{64})_(?P<size>\d+)\.webp$')
+DEFAULT_SIZES = (64, 128, 320)
+CHUNK_SIZE = 64 * 1024
+
+
+class AvatarError(Exception):
+    """上传的文件不能作为头像"""
+
+
+def thumbnail_name(digest, size):
+    return f'{digest}_{size}.webp'
+
+
+def _make_thumbnails(source, directory, digest, sizes, quality, max_pixels):
+    """解码原图并生成各尺寸缩略图（在工作进程中执行）"""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(source) as image:
+            if image.width * image.height > max_pixels:
+                raise AvatarError('图片分辨率过大')
+            # JPEG 可以在解码时直接按 1/2、1/4、1/8 缩小，大幅减少解码时间和内存
+            largest = max(sizes)
+            image.draft('RGB', (largest, largest))
+            image = ImageOps.exif_transpose(image)
+            image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+            side = min(image.size)
+            image = ImageOps.fit(image, (side, side), method=Image.Resampling.BICUBIC)
+            for size in sorted(sizes, reverse=True):
+                if image.width > size:
+                    image = image.resize((size, size), Image.Resampling.LANCZOS)
+                path = os.path.join(directory, thumbnail_name(digest, size))
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as output:
+                    image.save(output, 'WEBP', quality=quality, method=4)
+                # mkstemp 创建的文件只有属主可读，改为与普通静态文件一致，便于 Nginx 直接读取
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise AvatarError('无法识别的图片文件') from e
+
+
+class AvatarStore:
+    """按内容哈希保存头像缩略图"""
+
+    def __init__(self, root, sizes=DEFAULT_SIZES, quality=80, max_bytes=8 * 1024 * 1024,
+                 max_pixels=40_000_000, workers=2, wait_timeout=10.0):
+        self.root = root
+        self.sizes = tuple(sorted(sizes))
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.workers = workers
+        self.wait_timeout = wait_timeout
+        self._slots = threading.BoundedSemaphore(max(workers, 1) * 2)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def directory(self, digest):
+        return os.path.join(self.root, digest[:2])
+
+    def _get_executor(self):
+        # 进程池模块导入较慢，只在第一次使用时导入
+        from concurrent.futures import ProcessPoolExecutor
+
+        # 进程池在 fork 出的工作进程中各自创建
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _spool(self, stream):
+        """分块写入临时文件，返回 (哈希, 临时文件路径)"""
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, path = tempfile.mkstemp(dir=self.root, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise AvatarError(f'图片大小不能超过{self.max_bytes // (1024 * 1024)}MB')
+                    digest.update(chunk)
+                    output.write(chunk)
+        except BaseException:
+            os.unlink(path)
+            raise
+        if not size:
+            os.unlink(path)
+            raise AvatarError('上传的文件为空')
+        return digest.hexdigest(), path
+
+    def exists(self, digest):
+        directory = self.directory(digest)
+        return all(os.path.exists(os.path.join(directory, thumbnail_name(digest, size)))
+                   for size in self.sizes)
+
+    def _process(self, source, digest):
+        directory = self.directory(digest)
+        os.makedirs(directory, exist_ok=True)
+        args = (source, directory, digest, self.sizes, self.quality, self.max_pixels)
+        if not self.workers:
+            return _make_thumbnails(*args)
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            raise AvatarError('系统繁忙，请稍后再试')
+        try:
+            return self._get_executor().submit(_make_thumbnails, *args).result()
+        finally:
+            self._slots.release()
+
+    def store(self, stream):
+        """保存上传的图片，返回内容哈希；相同内容已处理过时直接复用"""
+        digest, path = self._spool(stream)
+        try:
+            if not self.exists(digest):
+                self._process(path, digest)
+        finally:
+            os.unlink(path)
+        return digest
+
+    def url(self, digest, size=None):
+        return f'/avatars/{thumbnail_name(digest, size or self.sizes[-1])}'
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+avatar_store = None
+
+
+def save_avatar(user, upload):
+    """处理上传的头像并写入 user.avatar（由调用方提交），返回大尺寸头像地址"""
+    user.avatar = avatar_store.url(avatar_store.store(upload.stream))
+    return user.avatar
+
+
+def avatar_url(value, pixels=None):
+    """头像地址中选取不小于 pixels 的最小尺寸；旧的原图地址原样返回"""
+    match = AVATAR_URL_RE.match(value or '')
+    if not match or avatar_store is None:
+        return value
+    sizes = avatar_store.sizes
+    size = next((size for size in sizes if pixels and size >= pixels), sizes[-1])
+    return avatar_store.url(match.group('digest'), size)
+
+
+def serve_avatar(filename):
+    """返回缩略图，文件名包含内容哈希，可以永久缓存"""
+    match = AVATAR_URL_RE.match(f'/avatars/{filename}')
+    if not match:
+        abort(404)
+    response = send_from_directory(avatar_store.directory(match.group('digest')), filename,
+                                   mimetype='image/webp', max_age=365 * 24 * 3600)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def migrate_avatars(static_folder):
+    """把数据库中仍指向原图的头像转换为缩略图，返回转换的数量"""
+    from app.models import Admin, Student, User
+
+    converted = 0
+    for model in (Student, Admin, User):
+        for user in model.query.filter(model.avatar.like('/static/uploads/%')).all():
+            path = os.path.join(static_folder, user.avatar[len('/static/'):])
+            if not os.path.isfile(path):
+                continue
+            try:
+                with open(path, 'rb') as source:
+                    user.avatar = avatar_store.url(avatar_store.store(source))
+                converted += 1
+            except AvatarError as e:
+                print(f"跳过 {model.__name__} {user.id}: {e}")
+        db.session.commit()
+    return converted
+
+
+def init_app(app):
+    """按配置创建头像存储，注册缩略图接口、模板函数和转换命令"""
+    global avatar_store
+
+    avatar_store = AvatarStore(
+        app.config.get('AVATAR_STORAGE_PATH') or os.path.join(app.instance_path, 'avatars'),
+        sizes=app.config.get('AVATAR_SIZES', DEFAULT_SIZES),
+        quality=app.config.get('AVATAR_QUALITY', 80),
+        max_bytes=app.config.get('AVATAR_MAX_UPLOAD_BYTES', 8 * 1024 * 1024),
+        max_pixels=app.config.get('AVATAR_MAX_PIXELS', 40_000_000),
+        workers=app.config.get('AVATAR_WORKERS', 2),
+    )
+    app.add_url_rule('/avatars/<filename>', 'avatar', serve_avatar)
+    app.add_template_global(avatar_url, 'avatar_url')
+
+    @app.errorhandler(AvatarError)
+    def _avatar_error(e):
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    @app.cli.command('migrate-avatars')
+    def migrate_avatars_command():
+        """把旧的原图头像转换为缩略图"""
+        print(f"已转换 {migrate_avatars(app.static_folder)} 个头像")
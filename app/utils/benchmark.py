@@ -0,0 +1,329 @@
+"""
+端到端性能基准
+模拟学生完整使用流程: 登录 → 自习室列表 → 座位图 → 预约 → 签到 → 签退 → 退出，
+统计每一步的 p50/p95/p99 延迟和每个请求执行的 SQL 条数。
+
+默认在临时 SQLite 库上用 bulk_seed 生成数据并通过 Flask 测试客户端发请求；
+指定 --base-url 时改为请求本地运行中的服务（此时无法统计 SQL 条数）。
+结果可以保存为基线，之后每次改动都与同一基线对比:
+
+    python app/utils/benchmark.py --users 200 --output baseline.json
+    python app/utils/benchmark.py --users 200 --baseline baseline.json
+    python app/utils/benchmark.py --base-url http://127.0.0.1:5000 --users 50
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import event
+
+# 各步骤的端点及在端点未注册时使用的路径
+ROUTES = {
+    'login': ('auth.student_login', '/auth/student_login'),
+    'rooms': ('student.rooms', '/student/rooms'),
+    'seat_grid': (None, '/student/room/{room_id}/seats'),
+    'book': (None, '/student/book_seat'),
+    'check_in': (None, '/student/bookings/{booking_id}/check-in'),
+    'check_out': ('booking.check_out', '/booking/{booking_id}/check_out'),
+    'logout': ('auth.logout', '/auth/logout'),
+}
+STEPS = tuple(ROUTES)
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def _resolve_routes(app):
+    """优先用 url_for 生成路径，视图未注册时使用默认路径"""
+    from flask import url_for
+    from werkzeug.routing import BuildError
+
+    routes = {}
+    with app.test_request_context():
+        for step, (endpoint, fallback) in ROUTES.items():
+            path = fallback
+            if endpoint:
+                try:
+                    # 用占位值生成后还原为模板，保留路径参数
+                    path = url_for(endpoint, booking_id=987654321).replace('987654321', '{booking_id}')
+                except BuildError:
+                    pass
+            routes[step] = path
+    return routes
+
+
+class QueryCounter:
+    """统计请求期间执行的 SQL 条数"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self.active = False
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active:
+            self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+    def start(self):
+        self.count = 0
+        self.active = True
+
+    def stop(self):
+        self.active = False
+        return self.count
+
+
+class TestClientTransport:
+    """通过 Flask 测试客户端发请求"""
+
+    def __init__(self, app, counter):
+        self.client = app.test_client()
+        self.counter = counter
+
+    def request(self, method, path, form=None, json_body=None):
+        self.counter.start()
+        try:
+            response = self.client.open(path, method=method, data=form, json=json_body)
+        finally:
+            queries = self.counter.stop()
+        return response.status_code, response.get_json(silent=True), queries
+
+
+class HttpTransport:
+    """向运行中的服务发 HTTP 请求"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+
+    def request(self, method, path, form=None, json_body=None):
+        data, headers = None, {}
+        if json_body is not None:
+            data, headers = json.dumps(json_body).encode(), {'Content-Type': 'application/json'}
+        elif form is not None:
+            data = urlencode(form).encode()
+        request = Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                status, body = response.status, response.read()
+        except HTTPError as e:
+            status, body = e.code, e.read()
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+        return status, payload, None
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {step: [] for step in STEPS}
+        self.queries = {step: [] for step in STEPS}
+        self.errors = dict.fromkeys(STEPS, 0)
+
+    def call(self, transport, step, method, path, **kwargs):
+        began = time.perf_counter()
+        status, payload, queries = transport.request(method, path, **kwargs)
+        self.latencies[step].append(time.perf_counter() - began)
+        if queries is not None:
+            self.queries[step].append(queries)
+        ok = status < 400 and not (isinstance(payload, dict) and payload.get('success') is False)
+        if not ok:
+            self.errors[step] += 1
+        return ok, payload
+
+    def summary(self):
+        result = {}
+        for step in STEPS:
+            latencies, queries = self.latencies[step], self.queries[step]
+            if not latencies:
+                continue
+            result[step] = {
+                'requests': len(latencies),
+                'errors': self.errors[step],
+                'p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+                'p95_ms': round(_percentile(latencies, 95) * 1000, 2),
+                'p99_ms': round(_percentile(latencies, 99) * 1000, 2),
+                'avg_queries': round(sum(queries) / len(queries), 1) if queries else None,
+                'max_queries': max(queries) if queries else None,
+            }
+        return result
+
+
+def _booking_window(now, slot_index):
+    """从下一个整刻钟开始的 1 小时，不同用户错开，保证签到时间窗口内可签到"""
+    start = now.replace(second=0, microsecond=0) + timedelta(minutes=15 - now.minute % 15)
+    start += timedelta(hours=slot_index)
+    return start, start + timedelta(hours=1)
+
+
+def run_flow(transport, recorder, routes, student_id, password, room_id, slot_index, rng,
+             lookup_booking_id=None):
+    """单个学生的完整流程，返回是否走完全部步骤"""
+    recorder.call(transport, 'login', 'POST', routes['login'], form={
+        'user_type': 'student', 'username': student_id, 'password': password})
+    recorder.call(transport, 'rooms', 'GET', routes['rooms'])
+
+    start, end = _booking_window(datetime.now(), slot_index)
+    query = urlencode({'date': start.strftime('%Y-%m-%d'), 'start_time': start.strftime('%H:%M'),
+                       'end_time': end.strftime('%H:%M')})
+    ok, payload = recorder.call(transport, 'seat_grid', 'GET',
+                                routes['seat_grid'].format(room_id=room_id) + '?' + query)
+    seats = [seat for seat in (payload or {}).get('seats', []) if seat.get('is_available')]
+    completed = False
+    if seats:
+        seat = rng.choice(seats)
+        ok, payload = recorder.call(transport, 'book', 'POST', routes['book'], json_body={
+            'room_id': room_id, 'seat_id': seat['id'], 'booking_date': start.strftime('%Y-%m-%d'),
+            'start_time': start.strftime('%H:%M'), 'end_time': end.strftime('%H:%M'),
+            'purpose': '性能基准'})
+        booking_id = (payload or {}).get('booking_id')
+        if ok and booking_id is None and lookup_booking_id:
+            booking_id = lookup_booking_id(payload.get('booking_number'))
+        if ok and booking_id:
+            ok, _ = recorder.call(transport, 'check_in', 'POST',
+                                  routes['check_in'].format(booking_id=booking_id))
+            if ok:
+                ok, _ = recorder.call(transport, 'check_out', 'POST',
+                                      routes['check_out'].format(booking_id=booking_id))
+                completed = ok
+    recorder.call(transport, 'logout', 'GET', routes['logout'])
+    return completed
+
+
+def run_benchmark(app=None, users=100, rooms=20, seats_per_room=40, students=2000, bookings=20000,
+                  base_url=None, seed_value=42):
+    """执行基准并返回各步骤统计"""
+    from app.utils.bulk_seed import DEFAULT_PASSWORD
+
+    rng = random.Random(seed_value)
+    recorder = Recorder()
+    started = time.perf_counter()
+
+    if base_url:
+        # 外部服务的数据需事先用 bulk_seed 生成，这里只读取学号和自习室
+        from app import db
+        from app.models import Student, StudyRoom
+
+        with app.app_context():
+            student_ids = [s for s, in db.session.query(Student.student_id).limit(users * 2)]
+            room_ids = [r for r, in db.session.query(StudyRoom.id).filter_by(status='open')]
+        routes = {step: fallback for step, (_, fallback) in ROUTES.items()}
+        completed = 0
+        for i in range(users):
+            transport = HttpTransport(base_url)
+            completed += run_flow(transport, recorder, routes, rng.choice(student_ids),
+                                  DEFAULT_PASSWORD, rng.choice(room_ids), i % 8, rng)
+    else:
+        from app import db
+        from app.models import Booking, Student, StudyRoom
+        from app.utils.bulk_seed import seed
+        from app.utils.schema import upgrade_schema
+
+        app.config['WTF_CSRF_ENABLED'] = False
+        with app.app_context():
+            upgrade_schema()
+            seed(db, rooms, seats_per_room, students, bookings, seed_value=seed_value)
+            student_ids = [s for s, in db.session.query(Student.student_id).limit(users * 2)]
+            room_ids = [r for r, in db.session.query(StudyRoom.id)]
+        routes = _resolve_routes(app)
+
+        def lookup_booking_id(booking_number):
+            with app.app_context():
+                booking = Booking.query.filter_by(booking_number=booking_number).first()
+                return booking.id if booking else None
+
+        completed = 0
+        with app.app_context():
+            engine = db.engine
+        with QueryCounter(engine) as counter:
+            for i in range(users):
+                transport = TestClientTransport(app, counter)
+                completed += run_flow(transport, recorder, routes, rng.choice(student_ids),
+                                      DEFAULT_PASSWORD, rng.choice(room_ids), i % 8, rng,
+                                      lookup_booking_id)
+
+    return {
+        'users': users,
+        'completed_flows': completed,
+        'elapsed_s': round(time.perf_counter() - started, 2),
+        'steps': recorder.summary(),
+    }
+
+
+def print_report(result, baseline=None):
+    print(f"用户: {result['users']}  完整走完流程: {result['completed_flows']}  "
+          f"耗时: {result['elapsed_s']}s")
+    print(f"{'步骤':<10}{'请求':>6}{'失败':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}"
+          f"{'SQL均值':>9}{'SQL最大':>9}")
+    for step, stats in result['steps'].items():
+        line = (f"{step:<12}{stats['requests']:>6}{stats['errors']:>6}{stats['p50_ms']:>10}"
+                f"{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+                f"{stats['avg_queries'] if stats['avg_queries'] is not None else '-':>9}"
+                f"{stats['max_queries'] if stats['max_queries'] is not None else '-':>9}")
+        base = (baseline or {}).get('steps', {}).get(step)
+        if base and base['p95_ms']:
+            change = (stats['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100
+            line += f"   p95 较基线 {change:+.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='端到端性能基准')
+    parser.add_argument('--users', type=int, default=100, help='模拟的学生数量')
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--seats', type=int, default=40)
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--bookings', type=int, default=20000)
+    parser.add_argument('--base-url', help='请求运行中的服务，而不是测试客户端')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='将结果保存为 JSON，可作为之后对比的基线')
+    parser.add_argument('--baseline', help='与之前保存的基线结果对比')
+    args = parser.parse_args()
+
+    if not args.base_url:
+        # 配置在导入时读取环境变量，必须在创建应用前设置
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+
+    from app import create_app
+
+    app = create_app()
+    result = run_benchmark(app, args.users, args.rooms, args.seats, args.students, args.bookings,
+                           base_url=args.base_url, seed_value=args.seed)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
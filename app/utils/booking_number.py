@@ -0,0 +1,100 @@
+"""
+预约编号生成器
+格式: CD + 时间(年月日时分秒毫秒, 17位) + 工作进程号(7位) + 毫秒内序号(3位)，共29位
+
+同一进程内严格递增；不同进程通过工作进程号区分，不依赖随机数，
+同一秒内的大量预约也不会产生唯一约束冲突。
+工作进程号默认取完整进程号（Linux 进程号不超过 7 位），同一台机器上不会重复；
+多台机器部署时应为每个进程配置唯一的 BOOKING_WORKER_ID。
+即使配置出错导致重复，写入时的唯一约束冲突也会换一个编号重试（见 is_duplicate_number）。
+旧格式 CD + 14位时间 + 4位随机数(共20位)与新格式长度不同，不会相互冲突，
+且按字符串排序时仍按时间先后排列，已有编号无需迁移。
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+PREFIX = 'CD'
+WORKER_ID_DIGITS = 7
+MAX_WORKER_ID = 10 ** WORKER_ID_DIGITS - 1
+SEQUENCE_DIGITS = 3
+MAX_SEQUENCE = 10 ** SEQUENCE_DIGITS - 1
+LEGACY_LENGTH = 20
+NUMBER_LENGTH = len(PREFIX) + 17 + WORKER_ID_DIGITS + SEQUENCE_DIGITS
+# 工作进程号为 3 位时生成的编号（25位）
+SHORT_WORKER_LENGTH = len(PREFIX) + 17 + 3 + SEQUENCE_DIGITS
+
+
+def _default_worker_id():
+    """工作进程号：优先使用环境变量 BOOKING_WORKER_ID，否则取完整进程号"""
+    value = os.environ.get('BOOKING_WORKER_ID')
+    worker_id = int(value) if value is not None else os.getpid()
+    if not 0 <= worker_id <= MAX_WORKER_ID:
+        # 取模会让不同进程得到相同的号，宁可启动失败
+        raise ValueError(f'BOOKING_WORKER_ID 应在 0-{MAX_WORKER_ID} 之间: {worker_id}')
+    return worker_id
+
+
+class BookingNumberGenerator:
+    """按时间有序、进程内单调递增的预约编号生成器"""
+
+    def __init__(self, worker_id=None):
+        self._fixed_worker_id = worker_id
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.worker_id = (self._fixed_worker_id if self._fixed_worker_id is not None
+                          else _default_worker_id())
+        self._last_ms = 0
+        self._sequence = 0
+
+    def _now_ms(self):
+        return time.time_ns() // 1_000_000
+
+    def next(self):
+        with self._lock:
+            now_ms = self._now_ms()
+            # 时钟回拨时沿用上一次的时间，保证单调
+            if now_ms <= self._last_ms:
+                now_ms = self._last_ms
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    # 同一毫秒内序号用尽，借用下一毫秒
+                    now_ms += 1
+                    self._sequence = 0
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+
+            moment = datetime.fromtimestamp(now_ms / 1000)
+            return (f"{PREFIX}{moment:%Y%m%d%H%M%S}{now_ms % 1000:03d}"
+                    f"{self.worker_id:0{WORKER_ID_DIGITS}d}{self._sequence:0{SEQUENCE_DIGITS}d}")
+
+
+def parse_booking_number(number):
+    """解析预约编号中的生成时间，兼容旧格式；无法识别时返回 None"""
+    if not number or not number.startswith(PREFIX):
+        return None
+    try:
+        if len(number) in (NUMBER_LENGTH, SHORT_WORKER_LENGTH):
+            return datetime.strptime(number[2:19], '%Y%m%d%H%M%S%f')
+        if len(number) == LEGACY_LENGTH:
+            return datetime.strptime(number[2:16], '%Y%m%d%H%M%S')
+    except ValueError:
+        return None
+    return None
+
+
+def is_duplicate_number(error):
+    """IntegrityError 是否由预约编号唯一约束引起（可以换一个编号重试）"""
+    return 'booking_number' in str(getattr(error, 'orig', error))
+
+
+booking_numbers = BookingNumberGenerator()
+
+# fork 出的子进程(如 gunicorn worker)重新取进程号并清空序号
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=booking_numbers._reset)
@@ -0,0 +1,131 @@
+"""
+并发抢座压测
+多个客户端同时预约同一批座位的同一时段，统计成功、冲突、错误数量和延迟，
+并校验数据库中不存在重叠预约。
+
+用法:
+    python app/utils/booking_race_bench.py --clients 50 --seats 5
+    python app/utils/booking_race_bench.py --database-url postgresql://localhost/study_room_bench
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def run_benchmark(app, clients, seats, rounds):
+    from app import db
+    from app.models import Booking, Seat, StudyRoom
+    from app.utils.seat_reservation import reserve_seat
+
+    with app.app_context():
+        db.create_all()
+        room = StudyRoom(room_number=f'BENCH{int(time.time())}', name='压测自习室',
+                         building='压测楼', capacity=seats)
+        db.session.add(room)
+        db.session.flush()
+        seat_ids = []
+        for i in range(seats):
+            seat = Seat(room_id=room.id, seat_number=f'Z{i + 1}')
+            db.session.add(seat)
+            db.session.flush()
+            seat_ids.append(seat.id)
+        db.session.commit()
+
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    windows = [(start + timedelta(hours=2 * r), start + timedelta(hours=2 * r + 2))
+               for r in range(rounds)]
+    stats = {'success': 0, 'conflict': 0, 'error': 0}
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients)
+
+    def client(user_id):
+        barrier.wait()
+        for window_start, window_end in windows:
+            for seat_id in seat_ids:
+                began = time.perf_counter()
+                with app.app_context():
+                    try:
+                        booking = reserve_seat(user_id, seat_id, window_start, window_end)
+                        outcome = 'success' if booking else 'conflict'
+                    except Exception:
+                        db.session.rollback()
+                        outcome = 'error'
+                    finally:
+                        db.session.remove()
+                elapsed = time.perf_counter() - began
+                with lock:
+                    stats[outcome] += 1
+                    latencies.append(elapsed)
+
+    began = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(100000 + i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total_time = time.perf_counter() - began
+
+    with app.app_context():
+        # 每个 (座位, 时段) 最多只能有一条有效预约
+        double_booked = 0
+        for seat_id in seat_ids:
+            for window_start, window_end in windows:
+                count = Booking.query.filter(
+                    Booking.seat_id == seat_id,
+                    Booking.status == 'active',
+                    Booking.start_time < window_end,
+                    Booking.end_time > window_start
+                ).count()
+                double_booked += max(0, count - 1)
+
+    attempts = sum(stats.values())
+    print(f"数据库: {app.config['SQLALCHEMY_DATABASE_URI']}")
+    print(f"客户端: {clients}  座位: {seats}  时段: {rounds}  请求总数: {attempts}")
+    print(f"成功: {stats['success']}  冲突: {stats['conflict']}  错误: {stats['error']}  "
+          f"重复预约: {double_booked}")
+    print(f"吞吐: {attempts / total_time:.1f} 次/秒")
+    print(f"延迟 p50: {_percentile(latencies, 50) * 1000:.1f}ms  "
+          f"p95: {_percentile(latencies, 95) * 1000:.1f}ms  "
+          f"p99: {_percentile(latencies, 99) * 1000:.1f}ms")
+    return stats, double_booked
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并发抢座压测')
+    parser.add_argument('--database-url', help='默认使用临时 SQLite 文件')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--seats', type=int, default=5)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if not database_url:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'booking_bench.db')
+    # 配置在导入时读取环境变量，必须在创建应用前设置
+    os.environ['DATABASE_URL'] = database_url
+
+    from app import create_app
+
+    app = create_app()
+    _, double_booked = run_benchmark(app, args.clients, args.seats, args.rounds)
+    return 1 if double_booked else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""
+合成数据批量生成
+与 init_data / init_complete_data 逐个创建 ORM 对象不同，这里直接用 Core 批量插入，
+可以快速生成上千间自习室、数万学生和上百万条预约，用于压测和执行计划检查。
+
+分布尽量贴近真实使用情况:
+- 自习室类型以普通为主，少数热门自习室承担大部分预约
+- 学生活跃度呈长尾分布，工作日多于周末
+- 预约集中在上午、下午、晚上三个时段，时长 1-4 小时，同一座位同一时段不重叠
+- 已结束的预约大多完成，少量取消或未签到
+
+用法:
+    python app/utils/bulk_seed.py --rooms 1000 --seats 40 --students 20000 --bookings 1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import func, select
+
+BATCH_SIZE = 5000
+DEFAULT_PASSWORD = '123456'
+
+BUILDINGS = ('图书馆', '教学楼A栋', '教学楼B栋', '实验楼', '综合楼')
+ROOM_TYPES = (('regular', 50), ('quiet', 25), ('discussion', 15), ('computer', 10))
+OPEN_HOURS = (('08:00', '22:00'), ('07:30', '22:30'), ('09:00', '21:00'))
+MAJORS = ('计算机科学与技术', '软件工程', '数学与应用数学', '电子信息工程', '汉语言文学', '经济学', '临床医学')
+GRADES = ('2021', '2022', '2023', '2024')
+
+# 与默认时间段一致: (开始小时, 结束小时, 权重)
+SLOTS = ((8, 12, 30), (14, 18, 35), (19, 22, 35))
+DURATIONS = ((1, 25), (2, 35), (3, 25), (4, 15))
+
+
+def _next_id(connection, table):
+    return (connection.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+
+def _insert(connection, table, rows):
+    """分批插入，避免一次性在内存中构造全部数据"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            connection.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        connection.execute(table.insert(), batch)
+
+
+def _cum_weights(count, skew):
+    """长尾权重：排名越靠前被选中的概率越高"""
+    return list(accumulate(1.0 / (rank ** skew) for rank in range(1, count + 1)))
+
+
+def _room_rows(rng, first_id, rooms, seats_per_room, now):
+    for room_id in range(first_id, first_id + rooms):
+        room_type = rng.choices([t for t, _ in ROOM_TYPES], [w for _, w in ROOM_TYPES])[0]
+        building = rng.choice(BUILDINGS)
+        floor = rng.randint(1, 6)
+        open_time, close_time = rng.choice(OPEN_HOURS)
+        yield {
+            'id': room_id, 'room_number': f'SYN{room_id:05d}', 'name': f'{building}{floor}楼自习室{room_id}',
+            'building': building, 'floor': f'{floor}楼', 'location': f'{building}{floor}楼',
+            'capacity': seats_per_room, 'room_type': room_type,
+            'open_time': open_time, 'close_time': close_time, 'status': 'open',
+            'has_power': True, 'has_wifi': True, 'has_air_conditioning': rng.random() < 0.9,
+            'is_quiet': room_type == 'quiet', 'created_at': now, 'updated_at': now,
+        }
+
+
+def _seat_rows(first_room_id, rooms, first_seat_id, seats_per_room, columns, room_types, now):
+    seat_id = first_seat_id
+    for room_id in range(first_room_id, first_room_id + rooms):
+        is_computer_room = room_types[room_id] == 'computer'
+        for index in range(seats_per_room):
+            row, col = index // columns + 1, index % columns + 1
+            if is_computer_room:
+                seat_type = 'computer'
+            elif col == 1 or col == columns:
+                seat_type = 'window'
+            elif col == (columns + 1) // 2:
+                seat_type = 'power'
+            else:
+                seat_type = 'regular'
+            yield {
+                'id': seat_id, 'room_id': room_id,
+                'seat_number': f'{chr(64 + row)}{col}' if row <= 26 else f'R{row}C{col}',
+                'type': seat_type, 'status': 'available', 'position': f'第{row}行第{col}列',
+                'power_socket': seat_type in ('power', 'computer'),
+                'window_seat': seat_type == 'window',
+                'computer_available': seat_type == 'computer',
+                'created_at': now, 'updated_at': now,
+            }
+            seat_id += 1
+
+
+def _student_rows(rng, first_id, students, password_hash, now):
+    for student_id in range(first_id, first_id + students):
+        grade = rng.choice(GRADES)
+        yield {
+            'id': student_id, 'student_id': f'{grade}{student_id:07d}', 'name': f'学生{student_id}',
+            'email': f'syn{student_id}@example.com', 'password_hash': password_hash,
+            'gender': rng.choice(('男', '女')), 'major': rng.choice(MAJORS), 'grade': grade,
+            'class_name': f'{grade}级{rng.randint(1, 8)}班', 'status': 'active',
+            'credit_score': rng.choices((100, 90, 80, 60), (85, 8, 5, 2))[0],
+            'total_bookings': 0, 'violation_count': 0, 'is_active': True,
+            'created_at': now, 'updated_at': now,
+        }
+
+
+def _booking_status(rng, start, end, now):
+    """根据预约时间与当前时间生成状态及签到签退时间"""
+    if end <= now:
+        status = rng.choices(('completed', 'cancelled', 'no_show'), (80, 12, 8))[0]
+    elif start <= now:
+        status = rng.choices(('active', 'cancelled'), (95, 5))[0]
+    else:
+        status = rng.choices(('active', 'cancelled'), (90, 10))[0]
+
+    check_in = check_out = None
+    if status == 'completed' or (status == 'active' and start <= now and rng.random() < 0.85):
+        check_in = start + timedelta(minutes=rng.randint(0, 20))
+        if status == 'completed':
+            check_out = end - timedelta(minutes=rng.randint(0, 30))
+    return status, check_in, check_out
+
+
+def _booking_rows(rng, first_id, bookings, seat_ids, seat_weights, student_ids, student_weights,
+                  days_back, days_ahead, now):
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    days = list(range(-days_back, days_ahead + 1))
+    day_weights = list(accumulate(0.6 if (today + timedelta(days=d)).weekday() >= 5 else 1.0
+                                  for d in days))
+    slot_weights = list(accumulate(w for _, _, w in SLOTS))
+    durations = [d for d, _ in DURATIONS]
+    duration_weights = [w for _, w in DURATIONS]
+
+    # 每个(座位, 日期, 时段)至多一条预约，保证同一座位不出现重叠
+    capacity = len(seat_ids) * len(days) * len(SLOTS)
+    bookings = min(bookings, int(capacity * 0.8))
+    taken = set()
+    booking_id = first_id
+    while booking_id < first_id + bookings:
+        seat_index = bisect_left(seat_weights, rng.random() * seat_weights[-1])
+        day_index = bisect_left(day_weights, rng.random() * day_weights[-1])
+        slot_index = bisect_left(slot_weights, rng.random() * slot_weights[-1])
+        key = (seat_index * len(days) + day_index) * len(SLOTS) + slot_index
+        if key in taken:
+            continue
+        taken.add(key)
+
+        slot_start, slot_end, _ = SLOTS[slot_index]
+        hours = min(rng.choices(durations, duration_weights)[0], slot_end - slot_start)
+        offset = rng.randint(0, (slot_end - slot_start - hours) * 2) * 30
+        start = today + timedelta(days=days[day_index], hours=slot_start, minutes=offset)
+        end = start + timedelta(hours=hours)
+        status, check_in, check_out = _booking_status(rng, start, end, now)
+        user_id = student_ids[bisect_left(student_weights, rng.random() * student_weights[-1])]
+        created_at = min(now, start - timedelta(hours=rng.randint(1, 72)))
+
+        yield {
+            'id': booking_id, 'booking_number': f'SYN{booking_id:012d}', 'user_id': user_id,
+            'seat_id': seat_ids[seat_index], 'booking_date': start.date(),
+            'start_time': start, 'end_time': end, 'status': status,
+            'check_in_time': check_in, 'check_out_time': check_out,
+            'cancel_reason': '个人原因' if status == 'cancelled' else None,
+            'violation_type': 'no_show' if status == 'no_show' else None,
+            'created_at': created_at, 'updated_at': check_out or created_at,
+        }
+        booking_id += 1
+
+
+def seed(db, rooms=50, seats_per_room=40, students=5000, bookings=50000, days_back=60,
+         days_ahead=7, seed_value=42, columns=5, password=DEFAULT_PASSWORD,
+         reservations=False, usage_stats=False):
+    """批量生成合成数据，返回各表插入的行数
+
+    数据追加在已有数据之后，可以在 init_data 初始化过的库上直接运行。
+    所有学生共用同一个密码哈希，登录密码为 password。
+    """
+    from app.models import Booking, Seat, Student, StudyRoom
+    from app.utils.password_hashing import hash_password
+
+    rng = random.Random(seed_value)
+    now = datetime.now().replace(second=0, microsecond=0)
+    connection = db.session.connection()
+    room_table, seat_table = StudyRoom.__table__, Seat.__table__
+    student_table, booking_table = Student.__table__, Booking.__table__
+
+    first_room_id = _next_id(connection, room_table)
+    room_rows = list(_room_rows(rng, first_room_id, rooms, seats_per_room, now))
+    _insert(connection, room_table, room_rows)
+    room_types = {row['id']: row['room_type'] for row in room_rows}
+
+    first_seat_id = _next_id(connection, seat_table)
+    _insert(connection, seat_table, _seat_rows(first_room_id, rooms, first_seat_id, seats_per_room,
+                                               columns, room_types, now))
+
+    first_student_id = _next_id(connection, student_table)
+    _insert(connection, student_table, _student_rows(rng, first_student_id, students,
+                                                     hash_password(password), now))
+
+    # 热门自习室的座位、活跃学生被选中的概率更高
+    room_order = list(range(rooms))
+    rng.shuffle(room_order)
+    room_weights = [1.0 / ((rank + 1) ** 0.8) for rank in room_order]
+    seat_ids = list(range(first_seat_id, first_seat_id + rooms * seats_per_room))
+    seat_weights = list(accumulate(room_weights[i // seats_per_room] for i in range(len(seat_ids))))
+    student_ids = list(range(first_student_id, first_student_id + students))
+    rng.shuffle(student_ids)
+
+    first_booking_id = _next_id(connection, booking_table)
+    _insert(connection, booking_table, _booking_rows(
+        rng, first_booking_id, bookings, seat_ids, seat_weights, student_ids,
+        _cum_weights(students, 0.6), days_back, days_ahead, now))
+    booking_count = _next_id(connection, booking_table) - first_booking_id
+
+    # 学生累计预约数一次性回填
+    connection.execute(student_table.update().where(
+        student_table.c.id >= first_student_id
+    ).values(total_bookings=select(func.count()).where(
+        booking_table.c.user_id == student_table.c.id
+    ).scalar_subquery()))
+    db.session.commit()
+
+    counts = {'rooms': rooms, 'seats': rooms * seats_per_room, 'students': students,
+              'bookings': booking_count}
+    if reservations:
+        from app.utils.seat_reservation import backfill_reservations
+
+        counts['reservations'] = backfill_reservations(now)
+    if usage_stats:
+        from app.utils.usage_rollup import backfill_usage_stats
+
+        counts['usage_stats'] = backfill_usage_stats()
+
+    # 更新统计信息，让查询规划器基于新的数据量选择索引
+    if db.engine.dialect.name in ('sqlite', 'postgresql'):
+        db.session.connection().exec_driver_sql('ANALYZE')
+        db.session.commit()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量生成合成数据')
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--seats', type=int, default=40, help='每间自习室的座位数')
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--bookings', type=int, default=50000)
+    parser.add_argument('--days-back', type=int, default=60, help='历史预约覆盖的天数')
+    parser.add_argument('--days-ahead', type=int, default=7, help='未来预约覆盖的天数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子，相同种子生成相同数据')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD, help='所有合成学生的登录密码')
+    parser.add_argument('--reservations', action='store_true', help='为有效预约补建座位时间片')
+    parser.add_argument('--usage-stats', action='store_true', help='重建使用统计汇总表')
+    args = parser.parse_args()
+
+    from app import create_app, db
+    from app.utils.schema import upgrade_schema
+
+    app = create_app()
+    with app.app_context():
+        upgrade_schema()
+        counts = seed(db, args.rooms, args.seats, args.students, args.bookings, args.days_back,
+                      args.days_ahead, args.seed, password=args.password,
+                      reservations=args.reservations, usage_stats=args.usage_stats)
+    print('已生成: ' + ', '.join(f'{name} {count}' for name, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
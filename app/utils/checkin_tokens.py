@@ -0,0 +1,317 @@
+"""
+签到凭证
+学生在预约开始前领取一个签名的签到凭证（二维码内容），其中包含预约ID、学生、座位和预约时段。
+门口的签到终端扫码后调用验证接口：只校验 HMAC 签名和有效时间，不查询数据库，
+签到时间先放入进程内队列，由后台线程按批次写回（一条批量 UPDATE），
+预约开始时几百人集中签到也不会产生几百次页面加载和 ORM 往返。
+
+凭证格式（base64url，约 47 个字符）:
+    版本(1) | 预约ID(4) | 学生ID(4) | 座位ID(4) | 开始时间(4, 分钟时间戳) | 时长(2, 分钟) | HMAC-SHA256 前 16 字节
+有效期: 开始前 CHECKIN_EARLY_MINUTES 分钟至开始后 AUTO_CANCEL_MINUTES 分钟（超过即按未到场处理），
+截止时间再提前 CHECKIN_FLUSH_INTERVAL 秒，保证提示签到成功的签到在过期清理之前写回。
+持有 CHECKIN_TOKEN_SECRET 的终端可以用 verify_token() 离线校验。
+
+凭证由学生本人领取，只凭凭证不能证明学生在现场，因此签到接口只接受持有 CHECKIN_KIOSK_KEYS
+中密钥的终端提交；未配置终端密钥时拒绝所有签到请求。
+
+写回时只更新仍为 active 且尚未签到的预约，重复扫码或重放凭证不会覆盖已有的签到时间。
+队列中的签到最多延迟 CHECKIN_FLUSH_INTERVAL 秒写入；进程异常退出时未写回的签到会丢失。
+
+接口:
+    GET  /api/bookings/<id>/checkin_token    学生领取凭证
+    POST /api/checkin  {"token": "..."}     签到终端提交，需带 X-Kiosk-Key
+"""
+
+import atexit
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app, jsonify, request
+from flask_login import current_user
+from sqlalchemy import bindparam, select
+
+from app import db
+
+VERSION = 1
+PAYLOAD = struct.Struct('>BIIIIH')
+SIGNATURE_BYTES = 16
+
+
+class CheckInTokenError(Exception):
+    """凭证无效或不在有效期内"""
+
+
+def _secret(config):
+    """终端共享的签名密钥；未单独配置时由 SECRET_KEY 派生"""
+    secret = config.get('CHECKIN_TOKEN_SECRET')
+    if secret:
+        return secret.encode('utf-8') if isinstance(secret, str) else secret
+    return hmac.new(str(config['SECRET_KEY']).encode('utf-8'), b'check-in-token', hashlib.sha256).digest()
+
+
+def _encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _decode(token):
+    token = token.strip()
+    return base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+
+
+def issue_token(secret, booking_id, user_id, seat_id, start_time, end_time):
+    """生成签到凭证"""
+    minutes = int((end_time - start_time).total_seconds() // 60)
+    payload = PAYLOAD.pack(VERSION, booking_id, user_id, seat_id, int(start_time.timestamp() // 60), minutes)
+    signature = hmac.new(secret, payload, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+    return _encode(payload + signature)
+
+
+def verify_token(secret, token, now=None, early_minutes=15, late_minutes=15):
+    """校验签名和有效时间，返回凭证内容；无效时抛出 CheckInTokenError"""
+    try:
+        data = _decode(token)
+    except (binascii.Error, ValueError):
+        raise CheckInTokenError('签到码无效') from None
+    if len(data) != PAYLOAD.size + SIGNATURE_BYTES:
+        raise CheckInTokenError('签到码无效')
+    payload, signature = data[:PAYLOAD.size], data[PAYLOAD.size:]
+    expected = hmac.new(secret, payload, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+    if not hmac.compare_digest(signature, expected):
+        raise CheckInTokenError('签到码无效')
+    version, booking_id, user_id, seat_id, start_minutes, minutes = PAYLOAD.unpack(payload)
+    if version != VERSION:
+        raise CheckInTokenError('签到码版本不受支持')
+
+    start_time = datetime.fromtimestamp(start_minutes * 60)
+    now = now or datetime.now()
+    if now < start_time - timedelta(minutes=early_minutes):
+        raise CheckInTokenError(f'尚未到签到时间，请在 {start_time - timedelta(minutes=early_minutes):%H:%M} 后签到')
+    if now > start_time + timedelta(minutes=late_minutes):
+        raise CheckInTokenError('已超过签到时间')
+    return {
+        'booking_id': booking_id,
+        'user_id': user_id,
+        'seat_id': seat_id,
+        'start_time': start_time,
+        'end_time': start_time + timedelta(minutes=minutes),
+    }
+
+
+class CheckInQueue:
+    """等待写回的签到 {预约ID: 签到时间}，同一预约只保留最早一次"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.batch_ready = threading.Event()
+        self.batch_size = 200
+
+    def add(self, booking_id, checked_in_at):
+        with self._lock:
+            if booking_id not in self._pending:
+                self._pending[booking_id] = checked_in_at
+            if len(self._pending) >= self.batch_size:
+                self.batch_ready.set()
+
+    def drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self.batch_ready.clear()
+            return pending
+
+    def restore(self, pending):
+        """写回失败时放回队列，下次重试"""
+        with self._lock:
+            for booking_id, checked_in_at in pending.items():
+                self._pending.setdefault(booking_id, checked_in_at)
+
+    def __len__(self):
+        return len(self._pending)
+
+
+check_ins = CheckInQueue()
+
+
+def flush_check_ins():
+    """把队列中的签到批量写回，返回实际签到的预约数"""
+    from app.models import Booking
+    from app.utils.live_events import queue_bulk_transitions
+    from app.utils.usage_rollup import record_bulk_transitions
+
+    pending = check_ins.drain()
+    if not pending:
+        return 0
+    table = Booking.__table__
+    try:
+        connection = db.session.connection()
+        # 只处理仍为 active 且未签到的预约（已取消、已按未到场处理或已签到的忽略）
+        ids = [row[0] for row in connection.execute(select(table.c.id).where(
+            table.c.id.in_(list(pending)),
+            table.c.status == 'active',
+            table.c.check_in_time.is_(None),
+        ))]
+        if ids:
+            connection.execute(table.update().where(
+                table.c.id == bindparam('_id'),
+                table.c.status == 'active',
+                table.c.check_in_time.is_(None),
+            ).values(check_in_time=bindparam('_at'), updated_at=bindparam('_at')),
+                [{'_id': booking_id, '_at': pending[booking_id]} for booking_id in ids])
+            record_bulk_transitions(ids, from_fields={'check_in_time': None})
+            queue_bulk_transitions(ids, 'active', 'active', checked_in=True)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        check_ins.restore(pending)
+        raise
+    return len(ids)
+
+
+class CheckInFlusher:
+    """后台写回线程：按间隔写回，队列达到批量大小时提前写回"""
+
+    def __init__(self, app, interval=None):
+        self.app = app
+        self.interval = interval or app.config.get('CHECKIN_FLUSH_INTERVAL', 1.0)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='check-in-flusher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        check_ins.batch_ready.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def flush(self):
+        with self.app.app_context():
+            try:
+                flush_check_ins()
+            except Exception as e:
+                self.app.logger.warning(f"签到写回失败: {e}")
+            finally:
+                db.session.remove()
+
+    def _run(self):
+        while not self._stop.is_set():
+            check_ins.batch_ready.wait(self.interval)
+            self.flush()
+
+
+_flusher = None
+_start_lock = threading.Lock()  # 并发的首批请求只启动一个后台线程
+
+
+def _flush_on_exit(app):
+    """进程正常退出时写回队列中剩余的签到"""
+    if _flusher is not None:
+        _flusher.stop(timeout=5)
+    CheckInFlusher(app).flush()
+
+
+def _late_minutes(config):
+    """开始后还能签到的分钟数：未到场处理时限减去一个写回间隔"""
+    return config.get('AUTO_CANCEL_MINUTES', 15) - config.get('CHECKIN_FLUSH_INTERVAL', 1.0) / 60
+
+
+def _kiosk_authorized(config):
+    key = request.headers.get('X-Kiosk-Key') or ''
+    return any(hmac.compare_digest(key, allowed) for allowed in config.get('CHECKIN_KIOSK_KEYS') or ())
+
+
+def token_api(booking_id):
+    """GET /api/bookings/<id>/checkin_token"""
+    from app.models import Booking
+
+    booking = db.session.get(Booking, booking_id)
+    if booking is None or booking.user_id != current_user.id:
+        return jsonify({'success': False, 'message': '预约不存在'}), 404
+    if booking.status != 'active' or booking.check_in_time:
+        return jsonify({'success': False, 'message': '该预约无需签到'}), 400
+    config = current_app.config
+    late = _late_minutes(config)
+    if datetime.now() > booking.start_time + timedelta(minutes=late):
+        return jsonify({'success': False, 'message': '已超过签到时间'}), 400
+    token = issue_token(_secret(config), booking.id, booking.user_id, booking.seat_id,
+                        booking.start_time, booking.end_time)
+    return jsonify({
+        'success': True,
+        'token': token,
+        'valid_from': (booking.start_time - timedelta(minutes=config.get('CHECKIN_EARLY_MINUTES', 15))).strftime('%Y-%m-%d %H:%M'),
+        'valid_until': (booking.start_time + timedelta(minutes=late)).strftime('%Y-%m-%d %H:%M'),
+    })
+
+
+def check_in_api():
+    """POST /api/checkin：只校验签名，不查询数据库"""
+    config = current_app.config
+    if not config.get('CHECKIN_KIOSK_KEYS'):
+        return jsonify({'success': False, 'message': '未配置签到终端'}), 503
+    if not _kiosk_authorized(config):
+        return jsonify({'success': False, 'message': '签到终端未授权'}), 403
+    data = request.get_json(silent=True) or {}
+    token = data.get('token') or request.form.get('token') or ''
+    now = datetime.now()
+    try:
+        claims = verify_token(_secret(config), token, now,
+                              early_minutes=config.get('CHECKIN_EARLY_MINUTES', 15),
+                              late_minutes=_late_minutes(config))
+    except CheckInTokenError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    check_ins.add(claims['booking_id'], now)
+    return jsonify({
+        'success': True,
+        'message': '签到成功',
+        'booking_id': claims['booking_id'],
+        'seat_id': claims['seat_id'],
+        'start_time': claims['start_time'].strftime('%H:%M'),
+        'end_time': claims['end_time'].strftime('%H:%M'),
+    })
+
+
+def init_app(app):
+    """注册签到接口、写回命令，并在首个请求时启动后台写回线程
+
+    签到终端的提交不带会话和 CSRF 令牌，由终端密钥和凭证签名认证；
+    应用启用 CSRFProtect 时需在其之后调用，以便豁免 /api/checkin
+    """
+    from app.utils.access import student_required
+
+    check_ins.batch_size = app.config.get('CHECKIN_FLUSH_BATCH_SIZE', 200)
+    atexit.register(_flush_on_exit, app)
+
+    app.add_url_rule('/api/bookings/<int:booking_id>/checkin_token', 'checkin_token', student_required(token_api))
+    app.add_url_rule('/api/checkin', 'checkin', check_in_api, methods=['POST'])
+    csrf = app.extensions.get('csrf')
+    if csrf is not None:
+        csrf.exempt(check_in_api)
+
+    @app.cli.command('flush-check-ins')
+    def flush_check_ins_command():
+        """立即写回队列中的签到"""
+        print(f"已写回 {flush_check_ins()} 条签到")
+
+    @app.before_request
+    def _start_check_in_flusher():
+        global _flusher
+        if _flusher is not None:
+            return
+        with _start_lock:
+            if _flusher is None:
+                _flusher = CheckInFlusher(app)
+                _flusher.start()
@@ -0,0 +1,244 @@
+"""
+延迟写入计数器
+公告浏览次数这类高频计数如果每次都 UPDATE 并提交，会让读请求排队争抢 SQLite 写锁。
+这里先把增量累积在内存（或本机共享的 SQLite 文件）中，由后台线程按间隔合并为
+批量的 UPDATE ... SET 列 = 列 + ? 写回数据库，进程正常退出时再写回一次。
+
+存储方式:
+- memory: 进程内累积（默认），正常重启不丢失，进程被强制杀掉时丢失未写回的增量
+- sqlite: 本机 SQLite 文件累积，多个工作进程共享，进程崩溃也不丢失
+
+用法:
+    from app.utils.counters import announcement_views
+    announcement_views.incr(announcement.id)
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+
+from sqlalchemy import bindparam, func
+
+from app import db
+
+
+class MemoryStore:
+    """进程内增量存储"""
+
+    def __init__(self):
+        self._deltas = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, counter, row_id, delta):
+        with self._lock:
+            self._deltas[(counter, row_id)] += delta
+
+    def pending(self, counter, row_id):
+        with self._lock:
+            return self._deltas.get((counter, row_id), 0)
+
+    def drain(self):
+        """取出全部增量并清空"""
+        with self._lock:
+            deltas, self._deltas = self._deltas, defaultdict(int)
+        return dict(deltas)
+
+    def restore(self, deltas):
+        """写回失败时把增量放回去"""
+        with self._lock:
+            for key, delta in deltas.items():
+                self._deltas[key] += delta
+
+
+class SQLiteStore:
+    """本机 SQLite 文件增量存储，同一台机器上的工作进程共享"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute("""
+            CREATE TABLE IF NOT EXISTS counter_deltas (
+                counter TEXT NOT NULL, row_id INTEGER NOT NULL, delta INTEGER NOT NULL,
+                PRIMARY KEY (counter, row_id))
+        """)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _upsert(self, connection, rows):
+        connection.executemany(
+            'INSERT INTO counter_deltas (counter, row_id, delta) VALUES (?, ?, ?) '
+            'ON CONFLICT (counter, row_id) DO UPDATE SET delta = delta + excluded.delta', rows)
+
+    def add(self, counter, row_id, delta):
+        self._upsert(self._connection(), [(counter, row_id, delta)])
+
+    def pending(self, counter, row_id):
+        row = self._connection().execute(
+            'SELECT delta FROM counter_deltas WHERE counter = ? AND row_id = ?',
+            (counter, row_id)).fetchone()
+        return row[0] if row else 0
+
+    def drain(self):
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            rows = connection.execute('SELECT counter, row_id, delta FROM counter_deltas').fetchall()
+            connection.execute('DELETE FROM counter_deltas')
+        return {(counter, row_id): delta for counter, row_id, delta in rows}
+
+    def restore(self, deltas):
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            self._upsert(connection, [(counter, row_id, delta)
+                                      for (counter, row_id), delta in deltas.items()])
+
+
+_store = MemoryStore()
+_counters = {}
+
+
+class WriteBehindCounter:
+    """某个模型整数列的延迟写入计数器"""
+
+    def __init__(self, model_name, column_name):
+        self.name = f'{model_name}.{column_name}'
+        self.model_name = model_name
+        self.column_name = column_name
+        _counters[self.name] = self
+
+    def _column(self):
+        import app.models as models
+
+        return getattr(getattr(models, self.model_name), self.column_name)
+
+    def incr(self, row_id, delta=1):
+        if row_id is not None and delta:
+            _store.add(self.name, row_id, delta)
+
+    def pending(self, row_id):
+        """尚未写回数据库的增量"""
+        return _store.pending(self.name, row_id)
+
+    def value(self, obj):
+        """数据库中的值加上未写回的增量，用于页面显示"""
+        return (getattr(obj, self.column_name) or 0) + self.pending(obj.id)
+
+    def write(self, deltas):
+        """把 {row_id: delta} 合并为一条批量 UPDATE"""
+        column = self._column()
+        table = column.table
+        statement = table.update().where(
+            table.c.id == bindparam('_row_id')
+        ).values({column.key: func.coalesce(table.c[column.key], 0) + bindparam('_delta')})
+        db.session.connection().execute(statement, [
+            {'_row_id': row_id, '_delta': delta} for row_id, delta in deltas.items()])
+
+
+announcement_views = WriteBehindCounter('Announcement', 'view_count')
+student_total_bookings = WriteBehindCounter('Student', 'total_bookings')
+
+
+def flush_counters():
+    """把所有计数器的增量写回数据库，返回写回的行数"""
+    deltas = _store.drain()
+    if not deltas:
+        return 0
+    grouped = defaultdict(dict)
+    for (counter, row_id), delta in deltas.items():
+        if delta:
+            grouped[counter][row_id] = delta
+    try:
+        for counter, rows in grouped.items():
+            _counters[counter].write(rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        _store.restore(deltas)
+        raise
+    return sum(len(rows) for rows in grouped.values())
+
+
+class CounterFlusher:
+    """后台定时写回线程"""
+
+    def __init__(self, app, interval=None):
+        self.app = app
+        self.interval = interval or app.config.get('COUNTER_FLUSH_INTERVAL', 10)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='counter-flusher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def flush(self):
+        with self.app.app_context():
+            try:
+                flush_counters()
+            except Exception as e:
+                self.app.logger.warning(f"计数器写回失败: {e}")
+            finally:
+                db.session.remove()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+
+_flusher = None
+_start_lock = threading.Lock()  # 并发的首批请求只启动一个后台线程
+
+
+def _flush_on_exit(app):
+    """进程正常退出（包括 gunicorn 平滑重启）时写回剩余增量"""
+    if _flusher is not None:
+        _flusher.stop(timeout=5)
+    CounterFlusher(app).flush()
+
+
+def init_app(app):
+    """按配置选择增量存储，注册写回命令并在首个请求时启动后台写回线程"""
+    global _store
+
+    if app.config.get('COUNTER_STORE') == 'sqlite':
+        path = app.config.get('COUNTER_STORE_PATH') or os.path.join(app.instance_path, 'counters.db')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _store = SQLiteStore(path)
+    atexit.register(_flush_on_exit, app)
+
+    @app.cli.command('flush-counters')
+    def flush_counters_command():
+        """立即写回计数器增量"""
+        print(f"已写回 {flush_counters()} 行计数")
+
+    @app.before_request
+    def _start_counter_flusher():
+        global _flusher
+        if _flusher is not None:
+            return
+        with _start_lock:
+            if _flusher is None:
+                _flusher = CounterFlusher(app)
+                _flusher.start()
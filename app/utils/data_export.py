@@ -0,0 +1,243 @@
+"""
+流式数据导出
+按行读取数据库并逐块写出 CSV / NDJSON，导出任意行数时内存占用保持不变
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+from flask import Response, jsonify, request, stream_with_context
+
+from app import db
+
+# 每次从游标取回的行数 / 每个输出块包含的行数
+FETCH_SIZE = 1000
+CHUNK_ROWS = 500
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def _users_query(filters):
+    from app.models import Student
+
+    query = db.session.query(
+        Student.student_id.label('学号'),
+        Student.name.label('姓名'),
+        Student.gender.label('性别'),
+        Student.email.label('邮箱'),
+        Student.phone.label('手机号'),
+        Student.major.label('专业'),
+        Student.grade.label('年级'),
+        Student.class_name.label('班级'),
+        Student.status.label('账户状态'),
+        Student.credit_score.label('信用积分'),
+        Student.total_bookings.label('预约次数'),
+        Student.violation_count.label('违规次数'),
+        Student.created_at.label('创建时间'),
+    )
+    if filters.get('start_date'):
+        query = query.filter(Student.created_at >= filters['start_date'])
+    if filters.get('end_date'):
+        query = query.filter(db.func.date(Student.created_at) <= filters['end_date'])
+    return query.order_by(Student.id)
+
+
+def _rooms_query(filters):
+    from app.models import StudyRoom
+
+    query = db.session.query(
+        StudyRoom.room_number.label('房间号'),
+        StudyRoom.name.label('名称'),
+        StudyRoom.building.label('楼栋'),
+        StudyRoom.floor.label('楼层'),
+        StudyRoom.capacity.label('座位数'),
+        StudyRoom.room_type.label('类型'),
+        StudyRoom.open_time.label('开放时间'),
+        StudyRoom.close_time.label('关闭时间'),
+        StudyRoom.status.label('状态'),
+        StudyRoom.created_at.label('创建时间'),
+    )
+    if filters.get('room_id'):
+        query = query.filter(StudyRoom.id == filters['room_id'])
+    return query.order_by(StudyRoom.id)
+
+
+def _bookings_query(filters):
+    """预约数据一次 JOIN 座位、自习室和学生，避免逐行延迟加载"""
+    from app.models import Booking, Seat, Student, StudyRoom
+
+    query = db.session.query(
+        Booking.booking_number.label('预约编号'),
+        Student.student_id.label('学号'),
+        Student.name.label('姓名'),
+        StudyRoom.room_number.label('房间号'),
+        StudyRoom.name.label('自习室'),
+        Seat.seat_number.label('座位号'),
+        Booking.booking_date.label('预约日期'),
+        Booking.start_time.label('开始时间'),
+        Booking.end_time.label('结束时间'),
+        Booking.status.label('状态'),
+        Booking.check_in_time.label('签到时间'),
+        Booking.check_out_time.label('签退时间'),
+        Booking.purpose.label('用途'),
+        Booking.created_at.label('创建时间'),
+    ).join(
+        Seat, Booking.seat_id == Seat.id
+    ).join(
+        StudyRoom, Seat.room_id == StudyRoom.id
+    ).outerjoin(
+        Student, Booking.user_id == Student.id
+    )
+    if filters.get('start_date'):
+        query = query.filter(Booking.booking_date >= filters['start_date'])
+    if filters.get('end_date'):
+        query = query.filter(Booking.booking_date <= filters['end_date'])
+    if filters.get('room_id'):
+        query = query.filter(Seat.room_id == filters['room_id'])
+    return query.order_by(Booking.id)
+
+
+def _announcements_query(filters):
+    from app.models import Announcement
+
+    query = db.session.query(
+        Announcement.title.label('标题'),
+        Announcement.content.label('内容'),
+        Announcement.publisher_type.label('发布者类型'),
+        Announcement.priority.label('优先级'),
+        Announcement.target_audience.label('目标用户'),
+        Announcement.is_active.label('是否启用'),
+        Announcement.view_count.label('浏览次数'),
+        Announcement.publish_date.label('发布时间'),
+    )
+    if filters.get('start_date'):
+        query = query.filter(Announcement.publish_date >= filters['start_date'])
+    if filters.get('end_date'):
+        query = query.filter(db.func.date(Announcement.publish_date) <= filters['end_date'])
+    return query.order_by(Announcement.id)
+
+
+EXPORT_QUERIES = {
+    'users': _users_query,
+    'rooms': _rooms_query,
+    'bookings': _bookings_query,
+    'announcements': _announcements_query,
+}
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+
+def iter_csv(query):
+    """逐块生成 CSV 文本，首块带 BOM 以便 Excel 正确识别中文"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow([column['name'] for column in query.column_descriptions])
+
+    rows = 0
+    for row in query.yield_per(FETCH_SIZE):
+        writer.writerow([_format_value(value) for value in row])
+        rows += 1
+        if rows % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(query):
+    """逐块生成 NDJSON，每行一个 JSON 对象"""
+    names = [column['name'] for column in query.column_descriptions]
+    lines = []
+    for row in query.yield_per(FETCH_SIZE):
+        record = {name: _format_value(value) for name, value in zip(names, row, strict=True)}
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) >= CHUNK_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def iter_gzip(chunks):
+    """边生成边压缩"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 输出 gzip 格式
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
+def export_response(data_type, fmt='csv', filters=None, compress=False):
+    """构造流式导出响应"""
+    filters = filters or {}
+    query = EXPORT_QUERIES[data_type](filters)
+    chunks = iter_ndjson(query) if fmt == 'ndjson' else iter_csv(query)
+
+    headers = {
+        'Content-Disposition': f'attachment; filename="{data_type}_{datetime.now():%Y%m%d%H%M%S}.{fmt}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',  # 关闭反向代理缓冲，保证分块及时下发
+    }
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+        body = iter_gzip(chunks)
+    else:
+        body = (chunk.encode('utf-8') for chunk in chunks)
+
+    return Response(stream_with_context(body), content_type=EXPORT_FORMATS[fmt], headers=headers)
+
+
+def export_data_stream():
+    """GET /admin/api/export_data/stream
+
+    参数: type=users|rooms|bookings|announcements, format=csv|ndjson,
+    start_date / end_date (YYYY-MM-DD), room_id, gzip=1
+    """
+    data_type = request.args.get('type', 'bookings')
+    fmt = request.args.get('format', 'csv')
+    if data_type not in EXPORT_QUERIES or fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': '不支持的导出类型或格式'}), 400
+
+    try:
+        filters = {
+            'start_date': _parse_date(request.args.get('start_date')),
+            'end_date': _parse_date(request.args.get('end_date')),
+            'room_id': request.args.get('room_id', type=int),
+        }
+    except ValueError:
+        return jsonify({'success': False, 'message': '日期格式应为 YYYY-MM-DD'}), 400
+
+    compress = (request.args.get('gzip') in ('1', 'true')
+                and 'gzip' in request.headers.get('Accept-Encoding', ''))
+    return export_response(data_type, fmt, filters, compress)
+
+
+def init_app(app):
+    """注册流式导出接口，并告知导出页面可以使用"""
+    from app.utils.access import admin_required
+
+    app.add_url_rule('/admin/api/export_data/stream', 'export_data_stream',
+                     admin_required(export_data_stream))
+    # 导出页面据此决定使用流式下载；未注册时仍走原有的 /admin/api/export_data
+    app.jinja_env.globals['export_stream_url'] = '/admin/api/export_data/stream'
+
@@ -0,0 +1,244 @@
+"""
+过期预约清理任务
+以分批的集合式 UPDATE 完成 active -> completed / no_show 状态流转，
+可在应用进程内后台运行，也可作为独立的命令行工作进程运行；
+每轮清理后顺带为周期预约生成滚动窗口内的预约
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, or_
+
+from app import db
+
+_sweeper = None
+_start_lock = threading.Lock()  # 并发的首批请求只启动一个后台线程
+
+
+def _expire_batch(criteria, values, batch_size):
+    """按主键分批更新，每批单独提交以缩短 SQLite 写锁持有时间
+
+    返回 (本批候选数量, 实际由本次更新的预约ID)
+    """
+    from app.models import Booking
+
+    # 不排序：ORDER BY id 会让 SQLite 放弃按状态/时间索引查找而改为全表扫描
+    ids = [row[0] for row in db.session.query(Booking.id).filter(*criteria)
+           .limit(batch_size).all()]
+    if not ids:
+        return 0, []
+
+    # 再次带上状态条件，避免覆盖刚被签到/取消或已被其他进程处理的预约
+    updated = db.session.query(Booking).filter(
+        Booking.id.in_(ids), *criteria
+    ).update(values, synchronize_session=False)
+    if updated == len(ids):
+        return len(ids), ids
+
+    # 部分预约已被其他进程处理，按本次写入的状态和时间找出真正更新的行
+    updated_ids = [row[0] for row in db.session.query(Booking.id).filter(
+        Booking.id.in_(ids),
+        Booking.status == values[Booking.status],
+        Booking.updated_at == values[Booking.updated_at]
+    )]
+    return len(ids), updated_ids
+
+
+def _apply_no_show_penalties(booking_ids):
+    """按学生汇总未到场次数，批量扣除信用积分并累计违规次数"""
+    from app.models import Booking, Student
+
+    counts = defaultdict(int)
+    for (user_id,) in db.session.query(Booking.user_id).filter(Booking.id.in_(booking_ids)):
+        counts[user_id] += 1
+
+    # 同样次数的学生合并为一条 UPDATE
+    by_count = defaultdict(list)
+    for user_id, count in counts.items():
+        by_count[count].append(user_id)
+
+    for count, user_ids in by_count.items():
+        score = Student.credit_score - Booking.NO_SHOW_PENALTY * count
+        db.session.query(Student).filter(Student.id.in_(user_ids)).update({
+            Student.credit_score: case((score < 0, 0), else_=score),
+            Student.violation_count: db.func.coalesce(Student.violation_count, 0) + count,
+        }, synchronize_session=False)
+
+
+def sweep_expired_bookings(now=None, batch_size=None, auto_cancel_minutes=None):
+    """处理过期预约，返回 {'completed': n, 'no_show': n, 'waitlist_lapsed': n}
+
+    - 已签到且已过结束时间：标记为 completed，签退时间记为预约结束时间
+    - 开始后超过 AUTO_CANCEL_MINUTES 或已过结束时间仍未签到：标记为 no_show 并扣除信用积分
+    - 为候补学生保留的座位超时未确认：保留作废，座位转给下一位候补
+    """
+    from flask import current_app
+
+    from app.models import Booking
+    from app.utils.availability import seat_availability
+    from app.utils.live_events import queue_bulk_transitions
+    from app.utils.seat_reservation import release_slots
+    from app.utils.usage_rollup import record_bulk_transitions
+    from app.utils.waitlist import lapse_expired_offers, queue_bulk_releases
+
+    # 与 Booking.update_expired_bookings 一致，使用本地时间
+    now = now or datetime.now()
+    config = current_app.config
+    if batch_size is None:
+        batch_size = config.get('EXPIRY_SWEEP_BATCH_SIZE', 500)
+    if auto_cancel_minutes is None:
+        auto_cancel_minutes = config.get('AUTO_CANCEL_MINUTES', 15)
+    no_show_deadline = now - timedelta(minutes=auto_cancel_minutes)
+
+    result = {'completed': 0, 'no_show': 0, 'waitlist_lapsed': 0}
+    try:
+        while True:
+            candidates, ids = _expire_batch(
+                (Booking.status == 'active',
+                 Booking.check_in_time.isnot(None),
+                 Booking.end_time < now),
+                {Booking.status: 'completed',
+                 Booking.check_out_time: Booking.end_time,
+                 Booking.updated_at: now},
+                batch_size)
+            if not candidates:
+                break
+            record_bulk_transitions(ids)
+            queue_bulk_transitions(ids, 'active', 'completed')
+            db.session.commit()
+            result['completed'] += len(ids)
+
+        while True:
+            candidates, ids = _expire_batch(
+                (Booking.status == 'active',
+                 Booking.check_in_time.is_(None),
+                 or_(Booking.start_time < no_show_deadline, Booking.end_time < now)),
+                {Booking.status: 'no_show',
+                 Booking.updated_at: now},
+                batch_size)
+            if not candidates:
+                break
+            if ids:
+                _apply_no_show_penalties(ids)
+                record_bulk_transitions(ids)
+                queue_bulk_transitions(ids, 'active', 'no_show')
+                release_slots(db.session.connection(), ids)
+                # 空出的座位在同一事务中转给候补学生
+                queue_bulk_releases(ids)
+            db.session.commit()
+            result['no_show'] += len(ids)
+            # no_show 不再占用座位，集合式更新不会触发 ORM 事件，需要手动同步索引
+            for booking_id in ids:
+                seat_availability.discard(booking_id)
+
+        result['waitlist_lapsed'] = lapse_expired_offers(now)
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return result
+
+
+class ExpirySweeper:
+    """应用进程内的后台清理线程"""
+
+    def __init__(self, app, interval=None):
+        self.app = app
+        self.interval = interval or app.config.get('EXPIRY_SWEEP_INTERVAL', 60)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='expiry-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        from app.utils.recurring_bookings import materialize_due
+
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    sweep_expired_bookings()
+                except Exception as e:
+                    self.app.logger.warning(f"过期预约清理失败: {e}")
+                try:
+                    materialize_due()
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.warning(f"周期预约生成失败: {e}")
+                finally:
+                    db.session.remove()
+            self._stop.wait(self.interval)
+
+
+def is_sweeper_running():
+    """当前进程是否有后台清理线程在运行"""
+    return _sweeper is not None and _sweeper.running
+
+
+def init_app(app):
+    """注册命令行任务，并按配置启动后台清理线程"""
+
+    @app.cli.command('sweep-bookings')
+    def sweep_bookings_command():
+        """处理一次过期预约"""
+        result = sweep_expired_bookings()
+        print(f"已完成: {result['completed']}  未到场: {result['no_show']}")
+
+    if not app.config.get('EXPIRY_SWEEPER_ENABLED'):
+        return
+
+    # 在真正处理请求的进程中启动（避开 reloader 监控进程和命令行任务）
+    @app.before_request
+    def _start_expiry_sweeper():
+        global _sweeper
+        if _sweeper is not None:
+            return
+        with _start_lock:
+            if _sweeper is None:
+                _sweeper = ExpirySweeper(app)
+                _sweeper.start()
+
+
+def run_worker(app, once=False):
+    """独立工作进程：循环清理过期预约，并为周期预约生成滚动窗口内的预约"""
+    from app.utils.recurring_bookings import materialize_due
+
+    interval = app.config.get('EXPIRY_SWEEP_INTERVAL', 60)
+    while True:
+        with app.app_context():
+            result = sweep_expired_bookings()
+            recurring = materialize_due()
+            print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] "
+                  f"已完成: {result['completed']}  未到场: {result['no_show']}  "
+                  f"周期预约生成: {recurring['bookings']}")
+            db.session.remove()
+        if once:
+            return
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    run_worker(create_app(), once='--once' in sys.argv)
@@ -0,0 +1,134 @@
+"""
+空闲时段查询
+给定自习室（或单个座位）、日期和最短时长，返回每个座位当天所有的最大空闲区间，
+学生不必再逐个尝试固定时段。区间由座位可用性索引中当天已排序的预约扫描一遍得到，
+并限定在自习室开放时间内；当天查询时从下一个时间片开始，区间两端都对齐到时间片（预约时间须对齐）。
+每个区间同时给出 latest_end：从区间开始预约时受 MAX_BOOKING_HOURS 限制的最晚结束时间。
+
+接口:
+    GET /api/free_windows?room_id=1&date=2025-01-06&min_minutes=60
+    GET /api/free_windows?seat_id=12&date=2025-01-06
+"""
+
+from datetime import datetime, timedelta
+
+from flask import current_app, jsonify, request
+
+from app import db
+
+
+def _clock(day, value, default):
+    """把 '08:00' 形式的开放时间换算为当天的时间点，无法解析时使用默认值"""
+    try:
+        parsed = datetime.strptime((value or '').strip(), '%H:%M').time()
+    except ValueError:
+        return datetime.combine(day, default)
+    return datetime.combine(day, parsed)
+
+
+def _next_slot(now, slot_minutes):
+    """向上取整到下一个时间片边界"""
+    now = now.replace(second=0, microsecond=0) + (timedelta(minutes=1) if now.second or now.microsecond else timedelta())
+    remainder = now.minute % slot_minutes
+    return now + timedelta(minutes=slot_minutes - remainder) if remainder else now
+
+
+def _slot_floor(value, slot_minutes):
+    """向下取整到时间片边界"""
+    value = value.replace(second=0, microsecond=0)
+    return value - timedelta(minutes=value.minute % slot_minutes)
+
+
+def find_free_windows(room, day, min_minutes=60, seat_id=None, now=None):
+    """自习室在指定日期每个座位的空闲区间
+
+    返回 [{'seat_id', 'seat_number', 'windows': [(开始, 结束), ...]}]，只包含至少 min_minutes 的区间
+    """
+    from app.models import Seat
+    from app.utils.availability import seat_availability
+
+    config = current_app.config
+    now = now or datetime.now()
+    slot_minutes = config.get('SEAT_SLOT_MINUTES', 15)
+    window_start = _clock(day, room.open_time, datetime.min.time())
+    window_end = _clock(day, room.close_time, datetime.max.time())
+    if day == now.date():
+        window_start = max(window_start, _next_slot(now, slot_minutes))
+    if window_end <= window_start:
+        return []
+
+    query = db.session.query(Seat.id, Seat.seat_number).filter(
+        Seat.room_id == room.id, Seat.status != 'maintenance')
+    if seat_id is not None:
+        query = query.filter(Seat.id == seat_id)
+    seats = query.order_by(Seat.id).all()
+
+    intervals = seat_availability.free_intervals(room.id, window_start, window_end)
+    minimum = timedelta(minutes=min_minutes)
+    result = []
+    for current_id, seat_number in seats:
+        # 预约只能按时间片对齐，区间两端收缩到时间片边界（旧的未对齐预约、非整点的开放时间）
+        windows = [(start, end) for start, end in (
+            (_next_slot(start, slot_minutes), _slot_floor(end, slot_minutes))
+            for start, end in intervals.get(current_id, [(window_start, window_end)])
+        ) if end - start >= minimum]
+        if windows:
+            result.append({'seat_id': current_id, 'seat_number': seat_number, 'windows': windows})
+    return result
+
+
+def free_windows_api():
+    """GET /api/free_windows"""
+    from app.models import Seat, StudyRoom
+
+    args = request.args
+    config = current_app.config
+    try:
+        day = datetime.strptime(args.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'success': False, 'message': '请提供正确的日期（date=YYYY-MM-DD）'}), 400
+    today = datetime.now().date()
+    if not today <= day <= today + timedelta(days=config.get('MAX_ADVANCE_DAYS', 7)):
+        return jsonify({'success': False, 'message': f"只能查询今天起 {config.get('MAX_ADVANCE_DAYS', 7)} 天内的空闲时段"}), 400
+
+    seat_id = args.get('seat_id', type=int)
+    room_id = args.get('room_id', type=int)
+    if seat_id is not None:
+        seat = db.session.get(Seat, seat_id)
+        if seat is None:
+            return jsonify({'success': False, 'message': '座位不存在'}), 404
+        room_id = seat.room_id
+    room = db.session.get(StudyRoom, room_id) if room_id is not None else None
+    if room is None:
+        return jsonify({'success': False, 'message': '自习室不存在'}), 404
+    if room.status != 'open':
+        return jsonify({'success': True, 'seats': [], 'message': '自习室当前不开放'})
+
+    max_booking = timedelta(hours=config.get('MAX_BOOKING_HOURS', 4))
+    min_minutes = min(max(args.get('min_minutes', 60, type=int), 1), int(max_booking.total_seconds() // 60))
+    seats = find_free_windows(room, day, min_minutes, seat_id=seat_id)
+    return jsonify({
+        'success': True,
+        'room_id': room.id,
+        'date': day.strftime('%Y-%m-%d'),
+        'open_time': room.open_time,
+        'close_time': room.close_time,
+        'max_booking_hours': config.get('MAX_BOOKING_HOURS', 4),
+        'seats': [{
+            'seat_id': seat['seat_id'],
+            'seat_number': seat['seat_number'],
+            'windows': [{
+                'start': start.strftime('%H:%M'),
+                'end': end.strftime('%H:%M'),
+                'minutes': int((end - start).total_seconds() // 60),
+                'latest_end': min(end, start + max_booking).strftime('%H:%M'),
+            } for start, end in seat['windows']],
+        } for seat in seats],
+    })
+
+
+def init_app(app):
+    """注册空闲时段查询接口"""
+    from app.utils.access import student_required
+
+    app.add_url_rule('/api/free_windows', 'free_windows', student_required(free_windows_api))
@@ -0,0 +1,343 @@
+"""
+小组预约
+讨论室等按行列排布的自习室，座位的 position 为 "第{row}行第{col}列"。
+按自习室缓存 (行, 列) → 座位 的网格索引，一次请求内：
+1. 从座位可用性索引取出该时段已被占用的座位，得到空闲网格
+2. 以每个空闲座位为起点扩展相邻（上下左右）的空闲座位，先同一排再相邻排，取满 N 个，
+   在所有起点中选占用行数最少、其次包围矩形最小的一组
+3. 在同一事务中为全部成员创建预约；任一座位的时间片冲突则整体回滚，
+   排除冲突座位后重新选座（最多 GROUP_BOOKING_RETRIES 次），不会出现只订到一部分的情况
+
+接口:
+    POST /api/group_bookings
+    {"room_id": 3, "date": "2025-01-06", "start_time": "14:00", "end_time": "17:00",
+     "members": ["2021001002", "2021001003"], "purpose": "课程讨论"}
+    发起人自动加入，members 为其他成员的学号
+"""
+
+import heapq
+import re
+import threading
+import time as _time
+from datetime import datetime, timedelta
+
+from flask import current_app, jsonify, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import db
+
+POSITION_PATTERN = re.compile(r'第\s*(\d+)\s*行\s*第\s*(\d+)\s*列')
+NEIGHBOURS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+
+class GroupBookingError(Exception):
+    """小组预约无法完成，message 可直接返回给用户"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def parse_position(position):
+    """'第2行第3列' → (2, 3)，无法解析时返回 None"""
+    match = POSITION_PATTERN.search(position or '')
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+class SeatGridIndex:
+    """按自习室缓存座位网格 {(行, 列): (座位ID, 座位号)}，维修中的座位不在网格内
+
+    本进程的座位变更提交后立即失效，其他工作进程的变更由 SEAT_SEARCH_INDEX_TTL 限定可见延迟。
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._grids = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def grid(self, room_id):
+        ttl = current_app.config.get('SEAT_SEARCH_INDEX_TTL', self.ttl)
+        with self._lock:
+            entry = self._grids.get(room_id)
+            if entry is not None and _time.monotonic() - entry[1] < ttl:
+                return entry[0]
+            generation = self._generation
+        grid = self._load(room_id)
+        with self._lock:
+            # 加载期间有座位变更提交时不缓存
+            if generation == self._generation:
+                self._grids[room_id] = (grid, _time.monotonic())
+        return grid
+
+    @staticmethod
+    def _load(room_id):
+        from app.models import Seat
+
+        rows = db.session.query(Seat.id, Seat.seat_number, Seat.position).filter(
+            Seat.room_id == room_id, Seat.status != 'maintenance').all()
+        grid = {}
+        for seat_id, seat_number, position in rows:
+            cell = parse_position(position)
+            if cell is not None:
+                grid[cell] = (seat_id, seat_number)
+        return grid
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._grids.clear()
+
+
+seat_grid_index = SeatGridIndex()
+
+
+def _grow(free, start, size):
+    """从 start 出发取 size 个互相连通的空闲格子，不足时返回 None"""
+    chosen = []
+    seen = {start}
+    frontier = [((0, False, 0), start)]
+    while frontier and len(chosen) < size:
+        _, cell = heapq.heappop(frontier)
+        chosen.append(cell)
+        for d_row, d_col in NEIGHBOURS:
+            neighbour = (cell[0] + d_row, cell[1] + d_col)
+            if neighbour in free and neighbour not in seen:
+                seen.add(neighbour)
+                # 先取完同一排，再取相邻排（后排优先）中离起点最近的座位
+                d_start = neighbour[0] - start[0]
+                distance = (abs(d_start), d_start < 0, abs(neighbour[1] - start[1]))
+                heapq.heappush(frontier, (distance, neighbour))
+    return chosen if len(chosen) == size else None
+
+
+def _score(cells):
+    rows = [cell[0] for cell in cells]
+    cols = [cell[1] for cell in cells]
+    spanned_rows = max(rows) - min(rows) + 1
+    area = spanned_rows * (max(cols) - min(cols) + 1)
+    return spanned_rows, area, min(cells)
+
+
+def find_adjacent_seats(grid, occupied, size):
+    """在网格中找 size 个相邻的空闲座位，返回按行列排序的 [(座位ID, 座位号)]，找不到时返回 None"""
+    free = {cell for cell, (seat_id, _) in grid.items() if seat_id not in occupied}
+    best = None
+    for start in sorted(free):
+        cells = _grow(free, start, size)
+        if cells is None:
+            continue
+        score = _score(cells)
+        if best is None or score < best[0]:
+            best = (score, cells)
+            if score[:2] == (1, size):
+                # 同一排连续的座位已是最优
+                break
+    if best is None:
+        return None
+    return [grid[cell] for cell in sorted(best[1])]
+
+
+def _commit_group(members, seats, start_time, end_time, purpose):
+    """在选定的座位上写入整组预约，返回每名成员的结果
+
+    座位被占用时回滚并抛出 SeatConflictError；预约编号撞上唯一约束时换一组编号重试同一组座位
+    """
+    from app.models import Booking
+    from app.utils.booking_number import is_duplicate_number
+    from app.utils.seat_reservation import NUMBER_RETRIES, SeatConflictError
+
+    for attempt in range(NUMBER_RETRIES):
+        bookings, booked = [], []
+        group_number = None
+        for student, (seat_id, seat_number) in zip(members, seats, strict=True):
+            booking = Booking(user_id=student.id, seat_id=seat_id, start_time=start_time,
+                              end_time=end_time, booking_date=start_time.date(), purpose=purpose)
+            group_number = group_number or booking.booking_number
+            booking.notes = f'小组预约 {group_number}'
+            bookings.append(booking)
+            # 提交后对象会过期，先记下结果，避免逐个重新查询
+            booked.append({'user_id': student.id, 'student_id': student.student_id, 'name': student.name,
+                           'seat_id': seat_id, 'seat_number': seat_number,
+                           'booking_number': booking.booking_number})
+        db.session.add_all(bookings)
+        try:
+            db.session.commit()
+            return booked
+        except SeatConflictError:
+            db.session.rollback()
+            raise
+        except IntegrityError as e:
+            db.session.rollback()
+            if not is_duplicate_number(e) or attempt == NUMBER_RETRIES - 1:
+                raise
+    return None
+
+
+def book_group(room, members, start_time, end_time, purpose=None):
+    """为全部成员在相邻座位上创建预约，要么全部成功要么全部失败
+
+    返回每名成员的 {学号, 姓名, 座位, 预约编号}；没有足够的相邻座位时抛出 GroupBookingError
+    """
+    from app.utils.availability import seat_availability
+    from app.utils.counters import student_total_bookings
+    from app.utils.seat_reservation import SeatConflictError
+
+    grid = seat_grid_index.grid(room.id)
+    if not grid:
+        raise GroupBookingError('该自习室没有按行列排布的座位，无法小组预约')
+
+    excluded = set()
+    for _ in range(current_app.config.get('GROUP_BOOKING_RETRIES', 3)):
+        occupied = seat_availability.occupied_seat_ids(room.id, start_time, end_time) | excluded
+        seats = find_adjacent_seats(grid, occupied, len(members))
+        if seats is None:
+            break
+        try:
+            booked = _commit_group(members, seats, start_time, end_time, purpose)
+        except SeatConflictError as e:
+            # 选座后座位被他人抢先占用（或有临时保留），整组回滚后避开该座位重选
+            excluded.add(e.seat_id)
+            continue
+        for item in booked:
+            student_total_bookings.incr(item.pop('user_id'))
+        return booked
+    raise GroupBookingError(f'该时段没有 {len(members)} 个相邻的空闲座位', status=409)
+
+
+@event.listens_for(Session, 'after_flush', propagate=True)
+def _collect_seat_changes(session, flush_context):
+    """座位有增删改时，提交后重建网格"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if type(obj).__name__ == 'Seat':
+            session.info['seat_grid_stale'] = True
+            return
+
+
+@event.listens_for(Session, 'do_orm_execute', propagate=True)
+def _collect_bulk_seat_changes(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_.__name__ == 'Seat':
+        orm_execute_state.session.info['seat_grid_stale'] = True
+
+
+@event.listens_for(Session, 'after_commit', propagate=True)
+def _rebuild_after_commit(session):
+    if session.info.pop('seat_grid_stale', False):
+        seat_grid_index.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback', propagate=True)
+def _drop_seat_changes(session):
+    session.info.pop('seat_grid_stale', None)
+
+
+def _parse_window(data, config):
+    """解析并校验预约时段，返回 (开始, 结束)"""
+    from app.utils.seat_reservation import SlotAlignmentError, check_alignment
+
+    try:
+        day = datetime.strptime(str(data.get('date', '')), '%Y-%m-%d').date()
+        start_time = datetime.combine(day, datetime.strptime(str(data.get('start_time', '')), '%H:%M').time())
+        end_time = datetime.combine(day, datetime.strptime(str(data.get('end_time', '')), '%H:%M').time())
+    except ValueError:
+        raise GroupBookingError('请提供正确的日期和时间（date=YYYY-MM-DD, start_time/end_time=HH:MM）') from None
+    if end_time <= start_time:
+        raise GroupBookingError('结束时间必须晚于开始时间')
+    try:
+        check_alignment(start_time, end_time)
+    except SlotAlignmentError as e:
+        raise GroupBookingError(str(e)) from None
+    if start_time < datetime.now():
+        raise GroupBookingError('不能预约已经开始的时段')
+    if end_time - start_time > timedelta(hours=config.get('MAX_BOOKING_HOURS', 4)):
+        raise GroupBookingError(f"单次预约不能超过 {config.get('MAX_BOOKING_HOURS', 4)} 小时")
+    if day > datetime.now().date() + timedelta(days=config.get('MAX_ADVANCE_DAYS', 7)):
+        raise GroupBookingError(f"最多提前 {config.get('MAX_ADVANCE_DAYS', 7)} 天预约")
+    return start_time, end_time
+
+
+def _load_members(organizer, student_ids, start_time, end_time):
+    """发起人加上其他成员，校验都能预约且该时段没有其他预约"""
+    from app.models import Booking, Student
+    from app.utils.availability import BLOCKING_STATUSES
+
+    numbers = [str(number).strip() for number in student_ids if str(number).strip()]
+    numbers = list(dict.fromkeys(number for number in numbers if number != organizer.student_id))
+    found = {student.student_id: student
+             for student in Student.query.filter(Student.student_id.in_(numbers)).all()} if numbers else {}
+    missing = [number for number in numbers if number not in found]
+    if missing:
+        raise GroupBookingError(f"学号不存在: {', '.join(missing)}")
+    members = [organizer] + [found[number] for number in numbers]
+
+    max_size = current_app.config.get('GROUP_BOOKING_MAX_SIZE', 8)
+    if len(members) < 2:
+        raise GroupBookingError('小组预约至少需要两名成员')
+    if len(members) > max_size:
+        raise GroupBookingError(f'小组预约最多 {max_size} 人')
+
+    blocked = [student.name for student in members if not student.can_book()]
+    if blocked:
+        raise GroupBookingError(f"以下成员当前不能预约: {', '.join(blocked)}")
+
+    # 一次查询检查全部成员在该时段是否已有预约
+    busy_ids = {user_id for user_id, in db.session.query(Booking.user_id).filter(
+        Booking.user_id.in_([student.id for student in members]),
+        Booking.status.in_(BLOCKING_STATUSES),
+        Booking.start_time < end_time,
+        Booking.end_time > start_time,
+    ).distinct()}
+    busy = [student.name for student in members if student.id in busy_ids]
+    if busy:
+        raise GroupBookingError(f"以下成员在该时段已有预约: {', '.join(busy)}", status=409)
+    return members
+
+
+def group_booking_api():
+    """POST /api/group_bookings"""
+    from app.models import StudyRoom
+
+    data = request.get_json(silent=True) or {}
+    config = current_app.config
+    try:
+        room = db.session.get(StudyRoom, data.get('room_id')) if data.get('room_id') else None
+        if room is None:
+            raise GroupBookingError('自习室不存在', status=404)
+        if room.status != 'open':
+            raise GroupBookingError('自习室当前不开放')
+        start_time, end_time = _parse_window(data, config)
+        if ((room.open_time and start_time.strftime('%H:%M') < room.open_time)
+                or (room.close_time and end_time.strftime('%H:%M') > room.close_time)):
+            raise GroupBookingError(f'预约时间需在开放时间 {room.open_time}-{room.close_time} 内')
+        members = data.get('members') or []
+        if not isinstance(members, list):
+            raise GroupBookingError('members 应为学号列表')
+        organizer = current_user._get_current_object()
+        members = _load_members(organizer, members, start_time, end_time)
+        booked = book_group(room, members, start_time, end_time, purpose=data.get('purpose'))
+    except GroupBookingError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status
+
+    return jsonify({
+        'success': True,
+        'message': f'已为 {len(booked)} 名成员预约相邻座位',
+        'group_number': booked[0]['booking_number'],
+        'bookings': booked,
+    })
+
+
+def init_app(app):
+    """注册小组预约接口"""
+    from app.utils.access import student_required
+
+    app.add_url_rule('/api/group_bookings', 'group_booking',
+                     student_required(group_booking_api), methods=['POST'])
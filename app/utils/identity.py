@@ -0,0 +1,164 @@
+"""
+登录身份缓存
+学生、管理员和普通用户分别存放在 students、admins、users 三张表中，
+会话中只保存 id 时加载器需要逐表查找。模型的 get_id() 返回带类型的标识（如 student:12），
+加载器直接定位到对应的表；查到的用户再按 (类型, id) 放入有容量上限和过期时间的进程内缓存，
+之后的请求把缓存的快照合并进当前会话（不执行 SELECT），常见情况下已登录请求不再有身份查询。
+
+失效:
+- 通过 ORM 修改用户（is_active、status、credit_score 等任意列）并提交后，立即失效对应条目
+- query.update()/delete() 批量修改时，失效该类型的全部条目
+- 其他工作进程中的修改只能等待 IDENTITY_CACHE_TTL 过期
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app import db
+
+# 会话标识前缀 → 模型名
+IDENTITY_KINDS = {'student': 'Student', 'admin': 'Admin', 'user': 'User'}
+MODEL_KINDS = {model: kind for kind, model in IDENTITY_KINDS.items()}
+
+
+class IdentityCache:
+    """按 (类型, id) 缓存用户快照，LRU 淘汰并按时间过期"""
+
+    def __init__(self, max_entries=2048, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self):
+        """每次失效加一；加载前记录，写入时不一致说明期间有修改，放弃写入"""
+        return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, snapshot, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (snapshot, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys=(), kinds=()):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+            if kinds:
+                for key in [key for key in self._entries if key[0] in kinds]:
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+identity_cache = IdentityCache()
+
+
+def parse_identity(user_id):
+    """解析会话中的标识，返回 (类型, id)；旧格式的纯数字标识无法确定类型，返回 None"""
+    kind, _, pk = str(user_id).partition(':')
+    if kind not in IDENTITY_KINDS or not pk.isdigit():
+        return None
+    return kind, int(pk)
+
+
+def _model(kind):
+    import app.models as models
+
+    return getattr(models, IDENTITY_KINDS[kind])
+
+
+def _snapshot(user):
+    """复制已加载的列，生成不属于任何会话的快照"""
+    mapper = inspect(type(user))
+    snapshot = mapper.class_(**{attr.key: getattr(user, attr.key) for attr in mapper.column_attrs})
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+def load_user(user_id):
+    """Flask-Login 用户加载器"""
+    identity = parse_identity(user_id)
+    if identity is None:
+        # 旧会话只保存了 id，三张表的 id 会重复，要求重新登录而不是猜测类型
+        return None
+    snapshot = identity_cache.get(identity)
+    if snapshot is not None:
+        # 快照只读，合并时复制一份到当前会话，修改和延迟加载的关系与查询得到的对象一致
+        return db.session.merge(snapshot, load=False)
+    generation = identity_cache.generation
+    user = db.session.get(_model(identity[0]), identity[1])
+    if user is not None:
+        identity_cache.set(identity, _snapshot(user), generation)
+    return user
+
+
+def _pending_identities(session):
+    return session.info.setdefault('identity_invalidate', set())
+
+
+@event.listens_for(Session, 'after_flush', propagate=True)
+def _collect_identities(session, flush_context):
+    """记录本次事务修改的用户，提交后再失效，回滚则丢弃"""
+    for obj in list(session.dirty) + list(session.deleted):
+        kind = MODEL_KINDS.get(type(obj).__name__)
+        if kind and obj.id is not None:
+            _pending_identities(session).add((kind, obj.id))
+
+
+@event.listens_for(Session, 'do_orm_execute', propagate=True)
+def _collect_bulk_identities(orm_execute_state):
+    """query.update()/delete() 无法得知涉及哪些行，失效该类型的全部条目"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    kind = MODEL_KINDS.get(mapper.class_.__name__) if mapper is not None else None
+    if kind:
+        orm_execute_state.session.info.setdefault('identity_invalidate_kinds', set()).add(kind)
+
+
+@event.listens_for(Session, 'after_commit', propagate=True)
+def _invalidate_identities(session):
+    keys = session.info.pop('identity_invalidate', None)
+    kinds = session.info.pop('identity_invalidate_kinds', None)
+    if keys or kinds:
+        identity_cache.invalidate(keys or (), kinds or ())
+
+
+@event.listens_for(Session, 'after_rollback', propagate=True)
+def _drop_identities(session):
+    session.info.pop('identity_invalidate', None)
+    session.info.pop('identity_invalidate_kinds', None)
+
+
+def init_app(app):
+    """按配置设置缓存大小与过期时间，并注册为 Flask-Login 的用户加载器
+
+    需在 LoginManager 初始化之后调用。
+    """
+    identity_cache.max_entries = app.config.get('IDENTITY_CACHE_SIZE', 2048)
+    identity_cache.ttl = app.config.get('IDENTITY_CACHE_TTL', 30)
+    app.login_manager.user_loader(load_user)
@@ -0,0 +1,322 @@
+"""
+管理后台列表的游标(keyset)分页
+学生列表和预约列表按 (created_at, id) 排序，翻页时带上当前页首行/末行的排序键，
+下一页查询变成 "WHERE (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT n+1"，
+可以直接沿索引定位，不再使用 OFFSET 逐行跳过，翻到多深的位置耗时都只和每页行数有关。
+
+总数不再每页执行 COUNT(*)：最多数到 ADMIN_COUNT_CAP 行（超过时显示为 "N+"），
+同一组筛选条件的结果缓存 ADMIN_COUNT_CACHE_TTL 秒。
+
+游标是 base64url 编码的 JSON，只包含排序键和翻页方向，不能跨排序方式使用。
+
+接口:
+    GET /admin/api/users?search=&status=&order=newest&cursor=
+    GET /admin/api/bookings?search=&status=&date=&order=newest&cursor=
+"""
+
+import base64
+import binascii
+import json
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, jsonify, request
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import contains_eager
+
+from app import db
+
+# 支持的排序方式: 名称 → 是否倒序，排序键固定为 (created_at, id)，id 保证同一时间的行顺序稳定
+ORDERINGS = {
+    'newest': True,
+    'oldest': False,
+}
+DEFAULT_ORDER = 'newest'
+
+
+class CursorError(ValueError):
+    """游标无法解析"""
+
+
+def encode_cursor(created_at, row_id, direction='next'):
+    data = json.dumps([direction, created_at.isoformat() if created_at else None, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor):
+    """游标 → (方向, created_at, id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, created_at, row_id = json.loads(raw)
+        if direction not in ('next', 'prev') or not isinstance(row_id, int):
+            raise ValueError
+        return direction, datetime.fromisoformat(created_at) if created_at else None, row_id
+    except (binascii.Error, ValueError, TypeError):
+        raise CursorError('分页参数无效') from None
+
+
+class KeysetPage:
+    """一页结果，模板和 JSON 接口共用"""
+
+    def __init__(self, items, order, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.order = order
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = None
+        self.total_is_estimate = False
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def total_display(self):
+        if self.total is None:
+            return ''
+        return f'{self.total}+' if self.total_is_estimate else str(self.total)
+
+    def to_dict(self):
+        return {
+            'order': self.order,
+            'per_page': self.per_page,
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor,
+            'total': self.total,
+            'total_is_estimate': self.total_is_estimate,
+        }
+
+
+def _after(created, pk, created_at, row_id, descending):
+    """排序键严格位于 (created_at, id) 之后的条件（按当前扫描方向）"""
+    if created_at is None:
+        # 创建时间为空的行在升序时排在最前；列表数据都有默认创建时间，这里只保证游标可用
+        return pk < row_id if descending else pk > row_id
+    # 外层的 <= / >= 是冗余条件，让数据库能按索引直接定位起点，只用 OR 条件时 JOIN 查询会从头扫描索引
+    if descending:
+        return and_(created <= created_at, or_(created < created_at, and_(created == created_at, pk < row_id)))
+    return and_(created >= created_at, or_(created > created_at, and_(created == created_at, pk > row_id)))
+
+
+def keyset_paginate(query, model, cursor=None, order=DEFAULT_ORDER, per_page=20):
+    """按 (model.created_at, model.id) 取一页"""
+    descending = ORDERINGS[order]
+    created, pk = model.created_at, model.id
+
+    backwards = False
+    if cursor:
+        direction, created_at, row_id = decode_cursor(cursor)
+        backwards = direction == 'prev'
+        # 向前翻页时反向扫描，取到后再把结果倒过来
+        query = query.filter(_after(created, pk, created_at, row_id, descending != backwards))
+
+    scan_descending = descending != backwards
+    ordering = (created.desc(), pk.desc()) if scan_descending else (created.asc(), pk.asc())
+    rows = query.order_by(*ordering).limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    page = KeysetPage(rows, order, per_page)
+    if rows:
+        # 从后一页翻回来时后面必然还有数据；从前一页翻过来时前面必然有数据
+        if more or backwards:
+            last = rows[-1]
+            page.next_cursor = encode_cursor(last.created_at, last.id, 'next')
+        if cursor and (more or not backwards):
+            first = rows[0]
+            page.prev_cursor = encode_cursor(first.created_at, first.id, 'prev')
+    return page
+
+
+class CountCache:
+    """筛选条件 → (总数, 是否超过上限, 过期时间)"""
+
+    MAX_KEYS = 256
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, cache_key):
+        with self._lock:
+            entry = self._entries.get(cache_key)
+        if entry and entry[2] > time.monotonic():
+            return entry[0], entry[1]
+        return None
+
+    def set(self, cache_key, total, capped, ttl):
+        with self._lock:
+            if len(self._entries) >= self.MAX_KEYS:
+                now = time.monotonic()
+                self._entries = {k: v for k, v in self._entries.items() if v[2] > now}
+                if len(self._entries) >= self.MAX_KEYS:
+                    self._entries.clear()
+            self._entries[cache_key] = (total, capped, time.monotonic() + ttl)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+counts = CountCache()
+
+
+def approximate_count(query, column, cache_key):
+    """最多数到 ADMIN_COUNT_CAP 行的总数，返回 (总数, 是否超过上限)
+
+    只取 column（通常是主键）计数，可以只扫描索引
+    """
+    cached = counts.get(cache_key)
+    if cached is not None:
+        return cached
+    config = current_app.config
+    cap = config.get('ADMIN_COUNT_CAP', 10000)
+    limited = query.with_entities(column).order_by(None).limit(cap + 1).subquery()
+    total = db.session.execute(select(func.count()).select_from(limited)).scalar() or 0
+    capped = total > cap
+    result = (min(total, cap), capped)
+    counts.set(cache_key, *result, config.get('ADMIN_COUNT_CACHE_TTL', 60))
+    return result
+
+
+def _page_args(args):
+    order = args.get('order', DEFAULT_ORDER)
+    if order not in ORDERINGS:
+        order = DEFAULT_ORDER
+    return order, args.get('cursor') or None, current_app.config.get('ITEMS_PER_PAGE', 20)
+
+
+def paginate_students(args):
+    """学生列表，筛选参数与 admin/users.html 一致: search, status"""
+    from app.models import Student
+
+    search = (args.get('search') or '').strip()
+    status = args.get('status') or ''
+    query = Student.query
+    if search:
+        pattern = f'%{search}%'
+        query = query.filter(or_(
+            Student.student_id.like(pattern),
+            Student.name.like(pattern),
+            Student.email.like(pattern),
+            Student.major.like(pattern),
+        ))
+    if status:
+        query = query.filter(Student.status == status)
+
+    order, cursor, per_page = _page_args(args)
+    page = keyset_paginate(query, Student, cursor, order, per_page)
+    page.total, page.total_is_estimate = approximate_count(query, Student.id, ('students', search, status))
+    return page
+
+
+def paginate_bookings(args):
+    """预约列表，筛选参数与 admin/bookings.html 一致: search, status, date
+
+    学生、座位、自习室在同一条查询中 JOIN 取回，通过 contains_eager 填充到 booking.student、
+    booking.seat、booking.seat.study_room，模板访问时不再逐行查询
+    """
+    from app.models import Booking, Seat, Student, StudyRoom
+
+    search = (args.get('search') or '').strip()
+    status = args.get('status') or ''
+    day = args.get('date') or ''
+    conditions = []
+    if status:
+        conditions.append(Booking.status == status)
+    if day:
+        try:
+            conditions.append(Booking.booking_date == datetime.strptime(day, '%Y-%m-%d').date())
+        except ValueError:
+            day = ''
+
+    query = Booking.query.join(Booking.seat).join(Seat.study_room).outerjoin(Booking.student)
+    if search:
+        pattern = f'%{search}%'
+        query = query.filter(or_(
+            Student.student_id.like(pattern),
+            Student.name.like(pattern),
+            StudyRoom.name.like(pattern),
+        ))
+    query = query.filter(*conditions)
+
+    order, cursor, per_page = _page_args(args)
+    page = keyset_paginate(query.options(
+        contains_eager(Booking.seat).contains_eager(Seat.study_room),
+        contains_eager(Booking.student),
+    ), Booking, cursor, order, per_page)
+
+    if not search:
+        # 不按学生或自习室搜索时 JOIN 不影响行数，直接在预约表上计数
+        query = Booking.query.filter(*conditions)
+    page.total, page.total_is_estimate = approximate_count(query, Booking.id, ('bookings', search, status, day))
+    return page
+
+
+def _format(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+
+def users_api():
+    """GET /admin/api/users"""
+    try:
+        page = paginate_students(request.args)
+    except CursorError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'data': [{
+            'id': student.id,
+            'student_id': student.student_id,
+            'name': student.name,
+            'email': student.email,
+            'major': student.major,
+            'class_name': student.class_name,
+            'credit_score': student.credit_score,
+            'status': student.status,
+            'created_at': _format(student.created_at),
+        } for student in page.items],
+        'pagination': page.to_dict(),
+    })
+
+
+def bookings_api():
+    """GET /admin/api/bookings"""
+    try:
+        page = paginate_bookings(request.args)
+    except CursorError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'data': [{
+            'id': booking.id,
+            'booking_number': booking.booking_number,
+            'student_id': booking.student.student_id if booking.student else None,
+            'student_name': booking.student.name if booking.student else None,
+            'room_name': booking.seat.study_room.name,
+            'seat_number': booking.seat.seat_number,
+            'booking_date': booking.booking_date.strftime('%Y-%m-%d'),
+            'start_time': booking.start_time.strftime('%H:%M'),
+            'end_time': booking.end_time.strftime('%H:%M'),
+            'status': booking.status,
+            'check_in_time': _format(booking.check_in_time),
+            'created_at': _format(booking.created_at),
+        } for booking in page.items],
+        'pagination': page.to_dict(),
+    })
+
+
+def init_app(app):
+    """注册管理后台的分页接口"""
+    from app.utils.access import admin_required
+
+    app.add_url_rule('/admin/api/users', 'admin_users_api', admin_required(users_api))
+    app.add_url_rule('/admin/api/bookings', 'admin_bookings_api', admin_required(bookings_api))
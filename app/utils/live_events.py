@@ -0,0 +1,368 @@
+"""
+实时事件推送（Server-Sent Events）
+预约创建、取消、签到、签退或过期时，向座位图推送座位变化，向管理员仪表板推送统计增量，
+页面不再轮询整间自习室的座位数据。
+
+- 进程内: LocalBroker 把事件分发给本进程的订阅连接，并保留最近的事件供断线重连补发
+- 多进程: LIVE_EVENTS_BACKEND=sqlite 时事件先写入本机共享的 SQLite 文件，
+  每个有订阅连接的工作进程用一个后台线程按间隔读取新事件再分发，
+  打开的页面再多，每个进程也只有这一条轮询
+
+接口: GET /api/events/stream?rooms=1,2 或 rooms=all，管理员可加 dashboard=1；
+      学生登录时自动订阅本人的通知频道 student:<id>
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+
+from flask import Response, current_app, jsonify, request
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app.utils.availability import BLOCKING_STATUSES
+
+_CLOSED = object()
+
+
+class Subscriber:
+    """一个 SSE 连接"""
+
+    def __init__(self, channels, queue_size):
+        self.channels = frozenset(channels)
+        self._queue = queue.Queue(maxsize=queue_size)
+
+    def put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # 客户端读得太慢：断开，由浏览器带 Last-Event-ID 重连补发
+            self.close()
+
+    def close(self):
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._queue.put_nowait(_CLOSED)
+
+    def get(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class LocalBroker:
+    """进程内事件分发"""
+
+    def __init__(self, history=1000, queue_size=256):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._history = deque(maxlen=history)
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def publish(self, channels, name, data):
+        with self._lock:
+            event_id = self._next_id
+            self._next_id += 1
+        self.deliver(event_id, channels, name, data)
+
+    def deliver(self, event_id, channels, name, data):
+        item = (event_id, frozenset(channels), name, data)
+        with self._lock:
+            self._next_id = max(self._next_id, event_id + 1)
+            self._history.append(item)
+            subscribers = [s for s in self._subscribers if s.channels & item[1]]
+        for subscriber in subscribers:
+            subscriber.put(item)
+
+    def subscribe(self, channels, last_event_id=None):
+        subscriber = Subscriber(channels, self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if last_event_id is not None:
+                for item in self._history:
+                    if item[0] > last_event_id and subscriber.channels & item[1]:
+                        subscriber.put(item)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+class SQLiteFanout(LocalBroker):
+    """通过本机 SQLite 文件在多个工作进程之间分发事件"""
+
+    def __init__(self, path, poll_interval=0.5, retention=600, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._local = threading.local()
+        self._poller = None
+        self._poller_lock = threading.Lock()
+        connection = self._connection()
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS live_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, channels TEXT NOT NULL, name TEXT NOT NULL,
+                data TEXT NOT NULL, created_at REAL NOT NULL)
+        """)
+        self._last_id = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def publish(self, channels, name, data):
+        # 只写入共享文件，包括本进程在内的所有进程都由轮询线程分发
+        self._connection().execute(
+            'INSERT INTO live_events (channels, name, data, created_at) VALUES (?, ?, ?, ?)',
+            (' '.join(sorted(channels)), name, json.dumps(data), time.time()))
+
+    def subscribe(self, channels, last_event_id=None):
+        subscriber = super().subscribe(channels, last_event_id)
+        with self._poller_lock:
+            if self._poller is None:
+                # 没有订阅期间的事件不再补发
+                self._last_id = self._connection().execute(
+                    'SELECT COALESCE(MAX(id), 0) FROM live_events').fetchone()[0]
+                self._poller = threading.Thread(target=self._poll, name='live-events', daemon=True)
+                self._poller.start()
+        return subscriber
+
+    def _poll(self):
+        """有订阅连接时才轮询，最后一个连接断开后线程退出"""
+        last_prune = 0
+        while True:
+            with self._poller_lock:
+                if not self.subscriber_count:
+                    self._poller = None
+                    return
+            try:
+                connection = self._connection()
+                rows = connection.execute(
+                    'SELECT id, channels, name, data FROM live_events WHERE id > ? ORDER BY id',
+                    (self._last_id,)).fetchall()
+                for event_id, channels, name, data in rows:
+                    self.deliver(event_id, channels.split(), name, json.loads(data))
+                    self._last_id = event_id
+                if time.time() - last_prune > 60:
+                    connection.execute('DELETE FROM live_events WHERE created_at < ?',
+                                       (time.time() - self.retention,))
+                    last_prune = time.time()
+            except sqlite3.Error:
+                pass
+            time.sleep(self.poll_interval)
+
+
+broker = LocalBroker()
+_seat_room_cache = {}
+
+
+def _seat_rooms(connection, seat_ids):
+    """座位所属自习室（座位很少调整，按进程缓存）"""
+    from app.models import Seat
+
+    missing = [seat_id for seat_id in seat_ids if seat_id not in _seat_room_cache]
+    if missing:
+        table = Seat.__table__
+        for seat_id, room_id in connection.execute(
+                select(table.c.id, table.c.room_id).where(table.c.id.in_(missing))):
+            _seat_room_cache[seat_id] = room_id
+    return {seat_id: _seat_room_cache.get(seat_id) for seat_id in seat_ids}
+
+
+def _transition(old_status, new_status, checked_in_now):
+    """预约状态变化对应的座位状态；无需推送时返回 None"""
+    was_blocking = old_status in BLOCKING_STATUSES
+    is_blocking = new_status in BLOCKING_STATUSES
+    if is_blocking and not was_blocking:
+        return 'booked'
+    if was_blocking and not is_blocking:
+        return 'released'
+    if old_status == 'active' and new_status == 'completed':
+        return 'checked_out'
+    if checked_in_now:
+        return 'checked_in'
+    return None
+
+
+def _counter_deltas(state, new_status, start_time, counters):
+    if start_time is None or start_time.date() != datetime.now().date():
+        return
+    if state == 'booked' and new_status == 'active':
+        counters['today_bookings'] += 1
+    elif state == 'checked_in':
+        counters['today_check_ins'] += 1
+    elif state == 'released' and new_status == 'cancelled':
+        counters['today_cancellations'] += 1
+    elif state == 'released' and new_status == 'no_show':
+        counters['today_no_shows'] += 1
+
+
+def _build_events(connection, changes):
+    """changes: [(booking_id, seat_id, start_time, end_time, 状态, 新状态)] -> [(频道, 事件名, 数据)]"""
+    rooms = _seat_rooms(connection, {change[1] for change in changes})
+    events = []
+    counters = defaultdict(int)
+    for booking_id, seat_id, start_time, end_time, state, new_status in changes:
+        room_id = rooms.get(seat_id)
+        events.append(({f'room:{room_id}', 'rooms'}, 'seat', {
+            'seat_id': seat_id,
+            'room_id': room_id,
+            'booking_id': booking_id,
+            'state': state,
+            'start_time': start_time.isoformat() if start_time else None,
+            'end_time': end_time.isoformat() if end_time else None,
+        }))
+        _counter_deltas(state, new_status, start_time, counters)
+    if counters:
+        events.append(({'dashboard'}, 'counters', dict(counters)))
+    return events
+
+
+@event.listens_for(Session, 'after_flush', propagate=True)
+def _collect_booking_events(session, flush_context):
+    """记录预约的状态变化，提交后再推送"""
+    from app.models import Booking
+
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Booking) and (obj.status or 'active') in BLOCKING_STATUSES:
+            changes.append((obj.id, obj.seat_id, obj.start_time, obj.end_time, 'booked',
+                            obj.status or 'active'))
+    for obj in session.dirty:
+        if not isinstance(obj, Booking):
+            continue
+        state = inspect(obj)
+        status_history = state.attrs.status.history
+        old_status = status_history.deleted[0] if status_history.deleted else obj.status
+        check_in_history = state.attrs.check_in_time.history
+        checked_in_now = bool(check_in_history.added and check_in_history.added[0]
+                              and not (check_in_history.deleted and check_in_history.deleted[0]))
+        transition = _transition(old_status, obj.status, checked_in_now)
+        if transition:
+            changes.append((obj.id, obj.seat_id, obj.start_time, obj.end_time, transition, obj.status))
+    for obj in session.deleted:
+        if isinstance(obj, Booking) and obj.status in BLOCKING_STATUSES:
+            changes.append((obj.id, obj.seat_id, obj.start_time, obj.end_time, 'released', 'deleted'))
+
+    if changes:
+        session.info.setdefault('live_events', []).extend(
+            _build_events(session.connection(), changes))
+
+
+@event.listens_for(Session, 'after_commit', propagate=True)
+def _publish_booking_events(session):
+    for channels, name, data in session.info.pop('live_events', ()):
+        try:
+            broker.publish(channels, name, data)
+        except Exception:
+            # 推送失败不影响已提交的预约
+            pass
+
+
+@event.listens_for(Session, 'after_rollback', propagate=True)
+def _drop_booking_events(session):
+    session.info.pop('live_events', None)
+
+
+def queue_bulk_transitions(booking_ids, old_status, new_status, checked_in=False):
+    """集合式更新（如过期清理、批量签到）不触发 flush 事件，由调用方在提交前登记，提交后推送"""
+    from app import db
+    from app.models import Booking
+
+    state = _transition(old_status, new_status, checked_in)
+    if not booking_ids or state is None:
+        return
+    connection = db.session.connection()
+    table = Booking.__table__
+    rows = connection.execute(select(
+        table.c.id, table.c.seat_id, table.c.start_time, table.c.end_time
+    ).where(table.c.id.in_(list(booking_ids)))).all()
+    db.session.info.setdefault('live_events', []).extend(
+        _build_events(connection, [(*row, state, new_status) for row in rows]))
+
+
+def _format(item):
+    event_id, _, name, data = item
+    return f'id: {event_id}\nevent: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+def event_stream():
+    """GET /api/events/stream"""
+    from flask_login import current_user
+
+    from app.utils.access import is_admin, is_student
+
+    channels = set()
+    rooms = request.args.get('rooms', '')
+    if rooms == 'all':
+        channels.add('rooms')
+    else:
+        channels.update(f'room:{room_id}' for room_id in rooms.split(',') if room_id.isdigit())
+    if request.args.get('dashboard', type=int):
+        if not is_admin():
+            return jsonify({'success': False, 'message': '需要管理员权限'}), 403
+        channels.add('dashboard')
+    if is_student():
+        # 本人的通知（如候补保留座位）
+        channels.add(f'student:{current_user.id}')
+    if not channels:
+        return jsonify({'success': False, 'message': '请指定订阅的自习室'}), 400
+
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    heartbeat = current_app.config.get('LIVE_EVENTS_HEARTBEAT', 15)
+    subscriber = broker.subscribe(channels, last_event_id)
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                item = subscriber.get(timeout=heartbeat)
+                if item is _CLOSED:
+                    break
+                # 心跳注释行，防止代理断开空闲连接
+                yield ': ping\n\n' if item is None else _format(item)
+        finally:
+            broker.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+def init_app(app):
+    """按配置创建事件分发并注册 SSE 接口"""
+    global broker
+
+    queue_size = app.config.get('LIVE_EVENTS_QUEUE_SIZE', 256)
+    if app.config.get('LIVE_EVENTS_BACKEND') == 'sqlite':
+        path = app.config.get('LIVE_EVENTS_PATH') or os.path.join(app.instance_path, 'live_events.db')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        broker = SQLiteFanout(path, poll_interval=app.config.get('LIVE_EVENTS_POLL_INTERVAL', 0.5),
+                              queue_size=queue_size)
+    else:
+        broker = LocalBroker(queue_size=queue_size)
+
+    app.add_url_rule('/api/events/stream', 'live_events', event_stream)
@@ -0,0 +1,387 @@
+"""
+页面与片段缓存
+公开页面（首页、自习室列表、关于、帮助、联系我们）对匿名用户整页缓存，
+登录用户则缓存页面中的公共片段（自习室卡片、公告列表）。
+
+缓存按标签失效：StudyRoom、Seat、Announcement、Booking 的写入提交后，
+立即清除带有对应标签的缓存，不依赖过期时间。占用数随时间推移也会变化
+（预约到点开始或结束时并没有写库），带 occupancy 标签的缓存最多保留到下一个整分钟。
+
+后端可选:
+- lru: 进程内 LRU（默认），单进程部署使用
+- sqlite: 共享的 SQLite 文件，多个工作进程之间共享缓存和失效
+"""
+
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request, session
+from flask_login import current_user
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# 各模型变更时失效的标签
+MODEL_TAGS = {
+    'StudyRoom': ('rooms',),
+    'Seat': ('rooms',),
+    'Announcement': ('announcements',),
+    'Booking': ('occupancy',),
+}
+
+# 整页缓存的公开页面及其依赖的标签
+PAGE_TAGS = {
+    'main.index': ('rooms', 'occupancy', 'announcements'),
+    'main.rooms_list': ('rooms', 'occupancy'),
+    'main.about': (),
+    'main.help': (),
+    'main.contact': (),
+}
+
+# 随时间变化的标签，缓存最多保留到下一个整分钟
+TIME_SENSITIVE_TAGS = ('occupancy',)
+
+
+class LRUBackend:
+    """进程内 LRU 缓存"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, tags, expires_at)
+        self._tags = {}  # tag -> {key}
+        self._versions = {}  # tag -> 失效次数
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, _, expires_at = entry
+            if expires_at and expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def versions(self, tags):
+        with self._lock:
+            return tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def set(self, key, value, tags=(), expires_at=None, versions=None):
+        with self._lock:
+            # 渲染期间标签已失效，结果可能基于旧数据，不写入
+            if versions is not None and versions != tuple(self._versions.get(tag, 0) for tag in tags):
+                return
+            self._remove(key)
+            self._entries[key] = (value, tuple(tags), expires_at)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+
+class SQLiteBackend:
+    """共享 SQLite 文件缓存，多进程部署时各工作进程看到一致的缓存与失效"""
+
+    def __init__(self, path, max_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        connection = self._connection()
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL, created_at REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS cache_tags (
+                tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key));
+            CREATE INDEX IF NOT EXISTS ix_cache_tags_key ON cache_tags (key);
+            CREATE INDEX IF NOT EXISTS ix_cache_entries_created ON cache_entries (created_at);
+            CREATE TABLE IF NOT EXISTS cache_tag_versions (
+                tag TEXT PRIMARY KEY, version INTEGER NOT NULL);
+        """)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value, expires_at FROM cache_entries WHERE key = ?', (key,)).fetchone()
+        if row is None or (row[1] and row[1] <= time.time()):
+            return None
+        return pickle.loads(row[0])
+
+    def _versions(self, connection, tags):
+        if not tags:
+            return ()
+        rows = dict(connection.execute(
+            f"SELECT tag, version FROM cache_tag_versions WHERE tag IN ({', '.join('?' * len(tags))})",
+            list(tags)).fetchall())
+        return tuple(rows.get(tag, 0) for tag in tags)
+
+    def versions(self, tags):
+        return self._versions(self._connection(), tags)
+
+    def set(self, key, value, tags=(), expires_at=None, versions=None):
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            # 渲染期间标签已失效，结果可能基于旧数据，不写入
+            if versions is not None and versions != self._versions(connection, tags):
+                return
+            connection.execute('DELETE FROM cache_tags WHERE key = ?', (key,))
+            connection.execute(
+                'INSERT OR REPLACE INTO cache_entries (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)',
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires_at, time.time()))
+            connection.executemany('INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)',
+                                   [(tag, key) for tag in tags])
+            # 超出容量时淘汰最早写入的条目
+            connection.execute(
+                'DELETE FROM cache_entries WHERE key IN (SELECT key FROM cache_entries '
+                'ORDER BY created_at DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+            connection.execute('DELETE FROM cache_tags WHERE key NOT IN (SELECT key FROM cache_entries)')
+
+    def invalidate_tags(self, tags):
+        tags = list(tags)
+        if not tags:
+            return
+        marks = ', '.join('?' * len(tags))
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute(f'DELETE FROM cache_entries WHERE key IN '
+                               f'(SELECT key FROM cache_tags WHERE tag IN ({marks}))', tags)
+            connection.execute(f'DELETE FROM cache_tags WHERE tag IN ({marks})', tags)
+            connection.executemany(
+                'INSERT INTO cache_tag_versions (tag, version) VALUES (?, 1) '
+                'ON CONFLICT (tag) DO UPDATE SET version = version + 1', [(tag,) for tag in tags])
+
+    def clear(self):
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute('DELETE FROM cache_entries')
+            connection.execute('DELETE FROM cache_tags')
+
+
+class PageCache:
+    """按标签失效的页面/片段缓存"""
+
+    def __init__(self):
+        self.backend = None
+        self.version = ''
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def _key(self, kind, name):
+        return f'{self.version}:{kind}:{name}'
+
+    def _expires_at(self, tags):
+        timeout = current_app.config.get('PAGE_CACHE_TIMEOUT') or 0
+        expires_at = time.time() + timeout if timeout else None
+        if any(tag in TIME_SENSITIVE_TAGS for tag in tags):
+            next_minute = (int(time.time()) // 60 + 1) * 60
+            expires_at = min(expires_at or next_minute, next_minute)
+        return expires_at
+
+    def get(self, kind, name):
+        if not self.enabled:
+            return None
+        return self.backend.get(self._key(kind, name))
+
+    def versions(self, tags):
+        """渲染前记录标签版本，写入时据此判断期间是否发生过失效"""
+        return self.backend.versions(tags) if self.enabled else None
+
+    def set(self, kind, name, value, tags=(), versions=None):
+        if self.enabled:
+            self.backend.set(self._key(kind, name), value, tags, self._expires_at(tags), versions)
+
+    def invalidate(self, *tags):
+        if self.enabled and tags:
+            self.backend.invalidate_tags(tags)
+
+    def clear(self):
+        if self.enabled:
+            self.backend.clear()
+
+
+page_cache = PageCache()
+
+
+def _viewer_kind():
+    """片段缓存按访问者身份区分（卡片上的按钮因身份而异）"""
+    if not current_user or not current_user.is_authenticated:
+        return 'anonymous'
+    return current_user.__class__.__name__.lower()
+
+
+def cached_fragment(name, *tags, caller=None):
+    """模板片段缓存，模板中通过 _helpers.html 的 fragment_cache 宏使用（未注册时照常渲染）:
+
+        {% call fragment_cache('rooms_list:cards', 'rooms', 'occupancy') %}
+            ...
+        {% endcall %}
+    """
+    key = f'{name}:{_viewer_kind()}:{request.query_string.decode()}'
+    html = page_cache.get('fragment', key)
+    if html is None:
+        versions = page_cache.versions(tags)
+        html = str(caller())
+        page_cache.set('fragment', key, html, tags, versions)
+    return Markup(html)
+
+
+def cached_page(*tags):
+    """匿名用户的整页缓存；有待显示的闪现消息时不读也不写缓存
+
+    只缓存会话为空、渲染时也没有写入会话的响应：会话 Cookie 在视图返回之后才写出，
+    响应头里看不到，而页面一旦用到会话（如 CSRF 令牌）就不能共享给其他访问者
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if (not page_cache.enabled or request.method != 'GET'
+                    or current_user.is_authenticated or '_flashes' in session):
+                return view(*args, **kwargs)
+
+            key = request.full_path
+            cached = page_cache.get('page', key)
+            if cached is not None:
+                response = current_app.response_class(cached['body'], status=cached['status'],
+                                                      content_type=cached['content_type'])
+                response.headers['X-Page-Cache'] = 'HIT'
+                return response
+
+            versions = page_cache.versions(tags)
+            session_was_empty = not session
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough \
+                    and session_was_empty and not session.modified \
+                    and 'Set-Cookie' not in response.headers:
+                page_cache.set('page', key, {
+                    'body': response.get_data(),
+                    'status': response.status_code,
+                    'content_type': response.content_type,
+                }, tags, versions)
+            response.headers['X-Page-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def _template_version(app):
+    """模板内容版本：部署新模板后旧缓存自动不再命中"""
+    digest = hashlib.md5()
+    template_dir = os.path.join(app.root_path, app.template_folder or 'templates')
+    for root, _, files in sorted(os.walk(template_dir)):
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            digest.update(f'{path}:{os.path.getmtime(path)}'.encode())
+    return digest.hexdigest()[:8]
+
+
+def _pending_tags(session):
+    return session.info.setdefault('page_cache_tags', set())
+
+
+def _tags_for(obj):
+    return MODEL_TAGS.get(type(obj).__name__, ())
+
+
+@event.listens_for(Session, 'after_flush', propagate=True)
+def _collect_tags(session, flush_context):
+    """记录本次事务涉及的标签，提交后再失效，回滚则丢弃"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        tags = _tags_for(obj)
+        if tags:
+            _pending_tags(session).update(tags)
+
+
+@event.listens_for(Session, 'do_orm_execute', propagate=True)
+def _collect_bulk_tags(orm_execute_state):
+    """query.update()/delete() 等集合式写入不经过 flush，同样需要记录标签"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    tags = MODEL_TAGS.get(mapper.class_.__name__, ()) if mapper is not None else ()
+    if tags:
+        _pending_tags(orm_execute_state.session).update(tags)
+
+
+@event.listens_for(Session, 'after_commit', propagate=True)
+def _invalidate_tags(session):
+    tags = session.info.pop('page_cache_tags', None)
+    if tags:
+        page_cache.invalidate(*tags)
+
+
+@event.listens_for(Session, 'after_rollback', propagate=True)
+def _drop_tags(session):
+    session.info.pop('page_cache_tags', None)
+
+
+def init_app(app):
+    """按配置创建缓存后端，包装公开页面视图并注册模板函数
+
+    需在蓝图注册之后调用。
+    """
+    backend = app.config.get('PAGE_CACHE_BACKEND', 'lru')
+    if backend == 'sqlite':
+        path = app.config.get('PAGE_CACHE_PATH') or os.path.join(app.instance_path, 'page_cache.db')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        page_cache.backend = SQLiteBackend(path, app.config.get('PAGE_CACHE_MAX_ENTRIES', 512))
+    elif backend == 'lru':
+        page_cache.backend = LRUBackend(app.config.get('PAGE_CACHE_MAX_ENTRIES', 512))
+    else:
+        page_cache.backend = None
+    page_cache.version = _template_version(app)
+
+    for endpoint, tags in PAGE_TAGS.items():
+        if endpoint in app.view_functions:
+            app.view_functions[endpoint] = cached_page(*tags)(app.view_functions[endpoint])
+
+    # 未启用缓存时片段照常渲染
+    app.jinja_env.globals['cached_fragment'] = cached_fragment
+
+    @app.cli.command('clear-page-cache')
+    def clear_page_cache_command():
+        """清空页面与片段缓存"""
+        page_cache.clear()
+        print("页面缓存已清空")
@@ -0,0 +1,182 @@
+"""
+密码哈希进程池
+密码哈希（pbkdf2/scrypt）是 CPU 密集运算，在请求线程中同步计算时，
+早上 8 点集中登录会让同一工作进程内的其他请求都排队等待。
+这里把哈希和校验交给有界的进程池执行，等待中的任务超过上限时直接拒绝（PasswordHashBusyError），
+由登录视图返回"系统繁忙"，而不是让请求无限堆积。
+
+哈希算法与强度由 PASSWORD_HASH_METHOD 统一配置；登录成功时若旧哈希与当前配置不一致，
+自动用当前配置重新计算（由调用方随登录时间一起提交）。
+
+吞吐测试（每核每秒登录次数）:
+    python app/utils/password_hashing.py --seconds 5
+"""
+
+import argparse
+import functools
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# students/admins 表的 password_hash 为 128 字符，scrypt 哈希超出该长度，默认使用 pbkdf2
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'
+
+
+class PasswordHashBusyError(Exception):
+    """等待哈希的任务已达上限"""
+
+
+def hash_method(pwhash):
+    """哈希字符串中记录的算法与参数，如 pbkdf2:sha256:600000"""
+    return pwhash.split('$', 1)[0] if pwhash and '$' in pwhash else ''
+
+
+@functools.lru_cache(maxsize=8)
+def normalized_method(method):
+    """配置的算法写入哈希后的完整形式，如 pbkdf2:sha256 → pbkdf2:sha256:<默认迭代次数>
+
+    省略的参数由 werkzeug 补上默认值，直接比较配置字符串会让每次登录都重新哈希
+    """
+    return hash_method(generate_password_hash('', method))
+
+
+def needs_rehash(pwhash, method=None):
+    """已有哈希是否与当前配置的算法和强度不一致"""
+    return hash_method(pwhash) != normalized_method(method or password_hasher.method)
+
+
+class PasswordHasher:
+    """有界进程池；workers 为 0 时在当前线程计算"""
+
+    def __init__(self, method=DEFAULT_METHOD, workers=0, max_pending=None, wait_timeout=2.0):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending or max(workers, 1) * 4
+        self.wait_timeout = wait_timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # 进程池模块导入较慢，只在第一次使用时导入
+        from concurrent.futures import ProcessPoolExecutor
+
+        # 进程池在 fork 出的工作进程中各自创建
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            raise PasswordHashBusyError('密码校验繁忙，请稍后再试')
+        try:
+            return self._get_executor().submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+password_hasher = PasswordHasher()
+
+
+def hash_password(password):
+    return password_hasher.hash(password)
+
+
+def verify_password(user, password):
+    """校验密码；成功且哈希强度过时则在 user 上写入新哈希（由调用方提交）"""
+    if not user.password_hash or not password_hasher.verify(user.password_hash, password):
+        return False
+    if needs_rehash(user.password_hash):
+        user.password_hash = password_hasher.hash(password)
+    return True
+
+
+def init_app(app):
+    """按配置创建密码哈希进程池"""
+    global password_hasher
+
+    workers = app.config.get('PASSWORD_HASH_WORKERS')
+    if workers is None:
+        workers = os.cpu_count() or 1
+    password_hasher = PasswordHasher(
+        method=app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+        workers=workers,
+        max_pending=app.config.get('PASSWORD_HASH_MAX_PENDING'),
+        wait_timeout=app.config.get('PASSWORD_HASH_WAIT_TIMEOUT', 2.0),
+    )
+
+    @app.errorhandler(PasswordHashBusyError)
+    def _password_hash_busy(e):
+        from flask import jsonify, request
+
+        if request.is_json or request.path.startswith('/api/'):
+            return jsonify({'success': False, 'message': '系统繁忙，请稍后再试'}), 503, {'Retry-After': '1'}
+        return '系统繁忙，请稍后再试', 503, {'Retry-After': '1'}
+
+
+def benchmark(method, workers, clients, seconds):
+    """并发校验 seconds 秒，返回每秒登录次数"""
+    hasher = PasswordHasher(method, workers, max_pending=clients, wait_timeout=60)
+    pwhash = generate_password_hash('123456', method)
+    hasher.verify(pwhash, '123456')  # 预热进程池
+    done = []
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        count = 0
+        while time.perf_counter() < deadline:
+            hasher.verify(pwhash, '123456')
+            count += 1
+        done.append(count)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    hasher.shutdown()
+    return sum(done) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='密码校验吞吐测试')
+    parser.add_argument('--method', default=DEFAULT_METHOD)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--clients', type=int, default=16, help='并发登录线程数')
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    print(f"算法: {args.method}  CPU 核数: {cores}  并发: {args.clients}")
+    inline = benchmark(args.method, 0, args.clients, args.seconds)
+    print(f"请求线程内计算: {inline:.1f} 次/秒")
+    for workers in sorted({1, cores // 2 or 1, cores}):
+        rate = benchmark(args.method, workers, args.clients, args.seconds)
+        print(f"进程池 {workers} 个: {rate:.1f} 次/秒  每核 {rate / workers:.1f} 次/秒")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+热点查询执行计划检查
+在合成的大数据量 SQLite 库上执行各热点查询的真实代码路径，
+记录实际发出的 SQL 并用 EXPLAIN QUERY PLAN 检查，出现全表扫描时以非零状态退出，
+可直接放进 CI：
+
+    python app/utils/query_plans.py
+    python app/utils/query_plans.py --bookings 200000 --verbose
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import event
+
+# 不允许被全表扫描的大表
+WATCHED_TABLES = ('bookings', 'seats', 'seat_reservations', 'room_usage_stats')
+SCAN_PATTERN = re.compile(rf"\bSCAN (?:TABLE )?({'|'.join(WATCHED_TABLES)})\b")
+
+
+def _check_availability(db):
+    from app.models import Booking
+    from app.utils.availability import seat_availability
+
+    now = datetime.now()
+    seat_availability.invalidate()
+    seat_availability.free_seat_ids(1, now, now + timedelta(hours=2))
+    Booking.check_seat_availability(1, now, now + timedelta(hours=2))
+
+
+def _check_occupancy(db):
+    from app.models import StudyRoom
+
+    StudyRoom.occupancy_for(range(1, 51))
+
+
+def _check_my_bookings(db):
+    from app.models import Booking
+
+    Booking.for_user(1).limit(20).all()
+    Booking.for_user(1, ['active']).all()
+
+
+def _check_realtime_usage(db):
+    from app.models import Booking
+
+    Booking.get_realtime_seat_usage()
+
+
+def _check_expiry_sweep(db):
+    from app.utils.expiry_sweeper import sweep_expired_bookings
+
+    sweep_expired_bookings(batch_size=200)
+
+
+def _check_dashboard(db):
+    from app.utils.usage_rollup import get_dashboard_stats
+
+    get_dashboard_stats()
+
+
+HOT_QUERIES = {
+    'availability': _check_availability,
+    'occupancy': _check_occupancy,
+    'my_bookings': _check_my_bookings,
+    'realtime_usage': _check_realtime_usage,
+    'expiry_sweep': _check_expiry_sweep,
+    'dashboard': _check_dashboard,
+}
+
+
+def explain(db, statement, parameters):
+    """返回 EXPLAIN QUERY PLAN 的明细行"""
+    connection = db.session.connection()
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    return [row[-1] for row in rows]
+
+
+def check_query_plans(db, verbose=False):
+    """逐个执行热点查询，返回 [(检查名, SQL, 计划)] 中出现全表扫描的部分"""
+    failures = []
+    for name, run in HOT_QUERIES.items():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany, statements=statements):
+            # 不带 WHERE 的全量计数是有意为之，不在检查范围内
+            if not executemany and re.match(r'\s*(SELECT|UPDATE|DELETE)\b', statement, re.I) \
+                    and re.search(r'\bWHERE\b', statement, re.I):
+                statements.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            run(db)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        for statement, parameters in statements:
+            plan = explain(db, statement, parameters)
+            bad = [line for line in plan if SCAN_PATTERN.search(line)]
+            if verbose or bad:
+                print(f"[{name}] {'全表扫描' if bad else 'OK'}")
+                print('  ' + ' '.join(statement.split()))
+                for line in plan:
+                    print(f'    {line}')
+            if bad:
+                failures.append((name, statement, plan))
+        if not verbose:
+            print(f"[{name}] 检查 {len(statements)} 条语句")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='热点查询执行计划检查')
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--seats', type=int, default=40)
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--bookings', type=int, default=50000)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    # 配置在导入时读取环境变量，必须在创建应用前设置
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'query_plans.db')
+
+    from app import create_app, db
+    from app.utils.bulk_seed import seed
+    from app.utils.schema import upgrade_schema
+
+    app = create_app()
+    with app.app_context():
+        upgrade_schema()
+        seed(db, args.rooms, args.seats, args.students, args.bookings)
+        failures = check_query_plans(db, args.verbose)
+
+    if failures:
+        print(f"\n发现 {len(failures)} 条语句出现全表扫描")
+        return 1
+    print("\n所有热点查询均使用索引")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
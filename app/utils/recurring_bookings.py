@@ -0,0 +1,299 @@
+"""
+周期预约
+学生为同一座位设置每周固定几天、固定时段的规则（RecurringBooking），
+具体的 Booking 不在创建时一次性生成一个学期，而是由后台任务按滚动窗口逐步生成：
+每次只补到 今天 + RECURRING_BOOKING_HORIZON_DAYS，已处理的日期记录在 recurring_occurrences 中。
+
+冲突检查对整个系列一次完成：一次查询取出该座位和该学生在系列时间范围内的有效预约，
+与按时间排序的各次时段做一遍归并扫描；再检查同一座位 / 同一学生的其他周期规则。
+生成时被一次性预约抢先的日期记录为跳过，不影响其余日期。
+
+接口:
+    POST /api/recurring_bookings
+    {"seat_id": 12, "weekdays": [1, 2, 3, 4, 5], "start_time": "18:00", "end_time": "21:00",
+     "start_date": "2025-03-03", "end_date": "2025-06-27", "skip_conflicts": false}
+    GET  /api/recurring_bookings
+    POST /api/recurring_bookings/<id>/cancel
+
+命令行:
+    flask materialize-recurring
+"""
+
+import heapq
+from datetime import datetime, timedelta
+
+from flask import current_app, jsonify, request
+from flask_login import current_user
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+
+
+def series_conflicts(rule, dates, include_rules=True):
+    """规则在 dates 各天的冲突，返回 {日期: 原因}"""
+    from app.models import Booking, RecurringBooking
+    from app.utils.availability import BLOCKING_STATUSES
+
+    if not dates:
+        return {}
+    windows = [(day, *rule.window_on(day)) for day in sorted(dates)]
+    conflicts = {}
+
+    rows = db.session.query(Booking.seat_id, Booking.start_time, Booking.end_time).filter(
+        or_(Booking.seat_id == rule.seat_id, Booking.user_id == rule.user_id),
+        Booking.status.in_(BLOCKING_STATUSES),
+        Booking.start_time < windows[-1][2],
+        Booking.end_time > windows[0][1],
+    ).order_by(Booking.start_time).all()
+
+    # 归并扫描：按开始时间依次纳入预约，按结束时间移出，留下的都与当前时段重叠
+    active = []
+    position = 0
+    for day, start, end in windows:
+        while position < len(rows) and rows[position].start_time < end:
+            heapq.heappush(active, (rows[position].end_time, rows[position].seat_id))
+            position += 1
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        if active:
+            conflicts[day] = ('座位已被预约' if any(seat_id == rule.seat_id for _, seat_id in active)
+                              else '本人该时段已有其他预约')
+
+    if include_rules:
+        others = RecurringBooking.query.filter(
+            or_(RecurringBooking.seat_id == rule.seat_id, RecurringBooking.user_id == rule.user_id),
+            RecurringBooking.status == 'active',
+            RecurringBooking.start_date <= windows[-1][0],
+            RecurringBooking.end_date >= windows[0][0],
+        )
+        if rule.id is not None:
+            others = others.filter(RecurringBooking.id != rule.id)
+        for other in others:
+            if not (other.weekdays & rule.weekdays
+                    and other.start_clock < rule.end_clock and other.end_clock > rule.start_clock):
+                continue
+            for day, _, _ in windows:
+                if other.occurs_on(day):
+                    conflicts.setdefault(day, f'与周期预约 #{other.id} 冲突')
+    return conflicts
+
+
+def materialize(rule, until, now=None):
+    """为规则生成到 until（含）为止尚未处理的预约，返回生成的预约数"""
+    from app.models import Booking, RecurringOccurrence, Student
+    from app.utils.counters import student_total_bookings
+    from app.utils.seat_reservation import SeatConflictError
+
+    now = now or datetime.now()
+    first = max(rule.materialized_until + timedelta(days=1) if rule.materialized_until else rule.start_date,
+                now.date())
+    last = min(until, rule.end_date)
+    rule_id, user_id, seat_id = rule.id, rule.user_id, rule.seat_id
+    dates = [day for day in rule.dates_between(first, last) if rule.window_on(day)[0] > now]
+
+    student = db.session.get(Student, user_id)
+    if student is None or not student.can_book():
+        skipped = dict.fromkeys(dates, '当前不能预约')
+    else:
+        skipped = series_conflicts(rule, dates, include_rules=False)
+
+    # 每次冲突都会多跳过一个日期，重试次数不超过日期数
+    for _ in range(len(dates) + 1):
+        created = 0
+        for day in dates:
+            occurrence = RecurringOccurrence(rule_id=rule_id, occurrence_date=day, skipped_reason=skipped.get(day))
+            if day not in skipped:
+                start_time, end_time = rule.window_on(day)
+                occurrence.booking = Booking(user_id=user_id, seat_id=seat_id, start_time=start_time,
+                                             end_time=end_time, booking_date=day, purpose=rule.purpose,
+                                             notes=f'周期预约 #{rule_id}')
+                created += 1
+            db.session.add(occurrence)
+        if last >= rule.start_date and (rule.materialized_until is None or last > rule.materialized_until):
+            rule.materialized_until = last
+        if rule.materialized_until and rule.materialized_until >= rule.end_date:
+            rule.status = 'ended'
+        try:
+            db.session.commit()
+        except SeatConflictError as e:
+            # 检查之后座位被抢先占用，跳过该日期后整批重试
+            db.session.rollback()
+            skipped[e.start_time.date()] = '座位已被预约'
+            continue
+        except IntegrityError:
+            # 其他进程已经处理了这些日期
+            db.session.rollback()
+            return 0
+        if created:
+            student_total_bookings.incr(user_id, created)
+        return created
+    db.session.rollback()
+    return 0
+
+
+def materialize_due(now=None):
+    """为所有需要续期的规则生成预约，返回 {'rules': n, 'bookings': n}"""
+    from app.models import RecurringBooking
+
+    now = now or datetime.now()
+    horizon = now.date() + timedelta(days=current_app.config.get('RECURRING_BOOKING_HORIZON_DAYS', 1))
+    rule_ids = [row[0] for row in db.session.query(RecurringBooking.id).filter(
+        RecurringBooking.status == 'active',
+        RecurringBooking.start_date <= horizon,
+        or_(RecurringBooking.materialized_until.is_(None), RecurringBooking.materialized_until < horizon),
+    )]
+    result = {'rules': 0, 'bookings': 0}
+    for rule_id in rule_ids:
+        rule = db.session.get(RecurringBooking, rule_id)
+        if rule is None or rule.status != 'active':
+            continue
+        result['bookings'] += materialize(rule, horizon, now)
+        result['rules'] += 1
+    return result
+
+
+def cancel_rule(rule, now=None):
+    """取消规则及其尚未开始的预约，返回取消的预约数"""
+    from app.models import Booking, RecurringOccurrence
+
+    now = now or datetime.now()
+    bookings = Booking.query.join(RecurringOccurrence, RecurringOccurrence.booking_id == Booking.id).filter(
+        RecurringOccurrence.rule_id == rule.id,
+        Booking.status == 'active',
+        Booking.start_time > now,
+    ).all()
+    for booking in bookings:
+        booking.status = 'cancelled'
+        booking.cancel_reason = '取消周期预约'
+    rule.status = 'cancelled'
+    db.session.commit()
+    return len(bookings)
+
+
+def _rule_dict(rule):
+    return {
+        'id': rule.id,
+        'seat_id': rule.seat_id,
+        'weekdays': rule.weekday_list,
+        'start_time': rule.start_clock,
+        'end_time': rule.end_clock,
+        'start_date': rule.start_date.strftime('%Y-%m-%d'),
+        'end_date': rule.end_date.strftime('%Y-%m-%d'),
+        'purpose': rule.purpose,
+        'status': rule.status,
+        'materialized_until': rule.materialized_until.strftime('%Y-%m-%d') if rule.materialized_until else None,
+    }
+
+
+def _error(message, status=400):
+    return jsonify({'success': False, 'message': message}), status
+
+
+def create_api():
+    """POST /api/recurring_bookings"""
+    from app.models import RecurringBooking, Seat
+    from app.utils.seat_reservation import SlotAlignmentError, is_aligned, slot_minutes
+
+    data = request.get_json(silent=True) or {}
+    config = current_app.config
+    try:
+        start_date = datetime.strptime(str(data.get('start_date', '')), '%Y-%m-%d').date()
+        end_date = datetime.strptime(str(data.get('end_date', '')), '%Y-%m-%d').date()
+        start_clock = datetime.strptime(str(data.get('start_time', '')), '%H:%M').strftime('%H:%M')
+        end_clock = datetime.strptime(str(data.get('end_time', '')), '%H:%M').strftime('%H:%M')
+        weekdays = [int(day) for day in data.get('weekdays') or []]
+    except (TypeError, ValueError):
+        return _error('请提供正确的日期、时间和星期（weekdays 为 1-7，周一为 1）')
+    if not weekdays or any(day < 1 or day > 7 for day in weekdays):
+        return _error('请选择每周预约的日期（weekdays 为 1-7，周一为 1）')
+    if end_clock <= start_clock:
+        return _error('结束时间必须晚于开始时间')
+    minutes = slot_minutes()
+    if not all(is_aligned(datetime.strptime(clock, '%H:%M'), minutes) for clock in (start_clock, end_clock)):
+        return _error(str(SlotAlignmentError(minutes)))
+    duration = datetime.strptime(end_clock, '%H:%M') - datetime.strptime(start_clock, '%H:%M')
+    if duration > timedelta(hours=config.get('MAX_BOOKING_HOURS', 4)):
+        return _error(f"单次预约不能超过 {config.get('MAX_BOOKING_HOURS', 4)} 小时")
+    today = datetime.now().date()
+    if start_date < today or end_date < start_date:
+        return _error('日期范围不正确')
+    max_weeks = config.get('RECURRING_BOOKING_MAX_WEEKS', 20)
+    if end_date - start_date > timedelta(weeks=max_weeks):
+        return _error(f'周期预约最长 {max_weeks} 周')
+
+    student = current_user._get_current_object()
+    if not student.can_book():
+        return _error('当前账户不能预约')
+    seat = db.session.get(Seat, data.get('seat_id')) if data.get('seat_id') else None
+    if seat is None:
+        return _error('座位不存在', 404)
+    room = seat.study_room
+    if seat.status == 'maintenance' or room.status != 'open':
+        return _error('座位当前不可预约')
+    if ((room.open_time and start_clock < room.open_time)
+            or (room.close_time and end_clock > room.close_time)):
+        return _error(f'预约时间需在开放时间 {room.open_time}-{room.close_time} 内')
+
+    rule = RecurringBooking(user_id=student.id, seat_id=seat.id, weekdays=RecurringBooking.weekday_mask(weekdays),
+                            start_clock=start_clock, end_clock=end_clock, start_date=start_date,
+                            end_date=end_date, purpose=data.get('purpose'), status='active')
+    dates = rule.dates_between(start_date, end_date)
+    if not dates:
+        return _error('日期范围内没有需要预约的日期')
+    conflicts = series_conflicts(rule, dates)
+    conflict_list = [{'date': day.strftime('%Y-%m-%d'), 'reason': reason} for day, reason in sorted(conflicts.items())]
+    rule_conflict = any(reason.startswith('与周期预约') for reason in conflicts.values())
+    if rule_conflict or len(conflicts) == len(dates) or (conflicts and not data.get('skip_conflicts')):
+        return jsonify({'success': False, 'message': f'{len(conflicts)} 个日期存在冲突',
+                        'conflicts': conflict_list}), 409
+
+    db.session.add(rule)
+    db.session.commit()
+    horizon = today + timedelta(days=config.get('RECURRING_BOOKING_HORIZON_DAYS', 1))
+    created = materialize(rule, horizon)
+    return jsonify({
+        'success': True,
+        'message': f'周期预约已创建，共 {len(dates) - len(conflicts)} 次',
+        'rule': _rule_dict(rule),
+        'created': created,
+        'conflicts': conflict_list,
+    })
+
+
+def list_api():
+    """GET /api/recurring_bookings"""
+    from app.models import RecurringBooking
+
+    rules = RecurringBooking.query.filter_by(user_id=current_user.id).order_by(RecurringBooking.id.desc()).all()
+    return jsonify({'success': True, 'rules': [_rule_dict(rule) for rule in rules]})
+
+
+def cancel_api(rule_id):
+    """POST /api/recurring_bookings/<id>/cancel"""
+    from app.models import RecurringBooking
+
+    rule = db.session.get(RecurringBooking, rule_id)
+    if rule is None or rule.user_id != current_user.id:
+        return _error('周期预约不存在', 404)
+    if rule.status == 'cancelled':
+        return _error('周期预约已取消')
+    cancelled = cancel_rule(rule)
+    return jsonify({'success': True, 'message': f'周期预约已取消，同时取消了 {cancelled} 个未开始的预约'})
+
+
+def init_app(app):
+    """注册周期预约接口和生成命令"""
+    from app.utils.access import student_required
+
+    app.add_url_rule('/api/recurring_bookings', 'recurring_booking_create',
+                     student_required(create_api), methods=['POST'])
+    app.add_url_rule('/api/recurring_bookings', 'recurring_booking_list', student_required(list_api))
+    app.add_url_rule('/api/recurring_bookings/<int:rule_id>/cancel', 'recurring_booking_cancel',
+                     student_required(cancel_api), methods=['POST'])
+
+    @app.cli.command('materialize-recurring')
+    def materialize_recurring_command():
+        """为周期预约生成滚动窗口内的预约"""
+        result = materialize_due()
+        print(f"处理规则 {result['rules']} 条，生成预约 {result['bookings']} 条")
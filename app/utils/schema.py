@@ -0,0 +1,231 @@
+"""
+数据库结构升级
+db.create_all() 只会创建缺失的表，不会为已有的表补建新增的索引；
+upgrade_schema() 在建表之后再为已有表补建模型中声明的列和索引
+
+结构版本:
+schema_version 表记录最近一次初始化/升级时模型结构的指纹。建表、补索引和基础数据检查
+只在部署时执行一次（flask init-db / flask migrate-db），工作进程启动时不再执行；
+开发服务器启动时只读取一次版本记录，不一致时才初始化。
+
+已有表缺少的列: 可为空或带默认值的列用 ALTER TABLE ... ADD COLUMN 补建，
+其余列无法自动补建，只记录警告，不阻止启动。
+"""
+
+import hashlib
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from flask import current_app
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    delete,
+    exc,
+    insert,
+    inspect,
+    select,
+    text,
+)
+
+from app import db
+
+# 不放入 db.metadata，避免影响 create_all 和结构指纹
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('id', Integer, primary_key=True),
+    Column('version', String(64), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def missing_indexes():
+    """模型中声明但数据库中不存在的索引"""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        missing.extend(index for index in table.indexes if index.name not in existing)
+    return missing
+
+
+def missing_columns():
+    """模型中声明但已有表中不存在的列"""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        missing.extend(column for column in table.columns if column.name not in existing)
+    return missing
+
+
+def _column_default(column):
+    """补建列时使用的默认值 SQL，没有可用的固定默认值时返回 None"""
+    dialect = db.engine.dialect
+    server_default = getattr(column.server_default, 'arg', None)
+    if server_default is not None:
+        if isinstance(server_default, str):
+            return String().literal_processor(dialect)(server_default)
+        return str(server_default)
+    if column.default is not None and column.default.is_scalar:
+        process = column.type.literal_processor(dialect)
+        return process(column.default.arg) if process else None
+    return None
+
+
+def add_column_sql(column):
+    """已有表补建列的 ALTER TABLE 语句，列不能为空且没有固定默认值时返回 None"""
+    default = _column_default(column)
+    if not column.nullable and default is None:
+        return None
+    preparer = db.engine.dialect.identifier_preparer
+    sql = (f'ALTER TABLE {preparer.format_table(column.table)} '
+           f'ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=db.engine.dialect)}')
+    if default is not None:
+        sql += f' DEFAULT {default}'
+    if not column.nullable:
+        sql += ' NOT NULL'
+    return sql
+
+
+def add_missing_columns():
+    """为已有表补建可以直接添加的列，返回 (补建的列, 无法补建的列)"""
+    added, skipped = [], []
+    for column in missing_columns():
+        name = f'{column.table.name}.{column.name}'
+        sql = add_column_sql(column)
+        if sql is None:
+            skipped.append(name)
+            continue
+        with db.engine.begin() as connection:
+            connection.execute(text(sql))
+        added.append(name)
+    return added, skipped
+
+
+def schema_fingerprint():
+    """根据模型中的表、列和索引计算结构指纹"""
+    import app.models  # noqa: F401
+
+    parts = []
+    for table in db.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f'{column.name}:{column.type}:{column.nullable}' for column in table.columns)
+        parts.extend(sorted(f"{index.name}:{','.join(column.name for column in index.columns)}"
+                            for index in table.indexes))
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def current_version():
+    """数据库中记录的结构版本，未初始化时返回 None"""
+    try:
+        with db.engine.connect() as connection:
+            return connection.execute(select(schema_version.c.version)).scalar()
+    except exc.DBAPIError:
+        return None
+
+
+def schema_is_current():
+    return current_version() == schema_fingerprint()
+
+
+def stamp_schema(version=None):
+    """记录当前结构版本"""
+    with db.engine.begin() as connection:
+        schema_version.create(connection, checkfirst=True)
+        connection.execute(delete(schema_version))
+        connection.execute(insert(schema_version).values(
+            id=1, version=version or schema_fingerprint(), applied_at=datetime.now()))
+
+
+def upgrade_schema():
+    """创建缺失的表，为已有表补建列和索引，返回补建的列和索引名称"""
+    # 先导入模型，保证所有表都已注册到 metadata
+    import app.models  # noqa: F401
+
+    db.create_all()
+    created, skipped = add_missing_columns()
+    if skipped:
+        current_app.logger.warning(f"以下列不能为空且没有默认值，无法自动补建，请手动迁移: {', '.join(skipped)}")
+    for index in missing_indexes():
+        # 依赖未补建列的索引同样跳过
+        if any(f'{column.table.name}.{column.name}' in skipped for column in index.columns):
+            continue
+        index.create(bind=db.engine)
+        created.append(index.name)
+    return created
+
+
+def migrate_database(seed=False):
+    """建表、补建列和索引（seed 时补齐基础数据）并记录结构版本，返回补建的列和索引名称"""
+    created = upgrade_schema()
+    if seed:
+        from app.utils.init_complete_data import init_complete_data
+
+        init_complete_data()
+    # 仍有缺列时不记录版本，下次启动时再次检查并提示
+    if not missing_columns():
+        stamp_schema()
+    return created
+
+
+def init_database():
+    """首次部署: 升级结构、补齐基础数据并记录结构版本"""
+    return migrate_database(seed=True)
+
+
+def ensure_schema():
+    """开发服务器启动时使用: 结构版本一致时只执行一次查询，否则初始化，返回是否执行了初始化"""
+    if schema_is_current():
+        return False
+    init_database()
+    return True
+
+
+def init_app(app):
+    """注册结构初始化与升级命令"""
+
+    def report(created):
+        if created:
+            print(f"已补建列和索引: {', '.join(created)}")
+        print(f"数据库结构版本: {current_version()}")
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """首次部署: 建表、补建索引、写入基础数据并记录结构版本"""
+        report(init_database())
+
+    @app.cli.command('migrate-db')
+    def migrate_db_command():
+        """模型变更后: 建表、补建索引并记录结构版本"""
+        if schema_is_current():
+            print(f"数据库结构已是最新 ({current_version()})")
+            return
+        report(migrate_database())
+
+    @app.cli.command('upgrade-schema')
+    def upgrade_schema_command():
+        """创建缺失的表并补建索引（同 migrate-db）"""
+        report(migrate_database())
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        created = migrate_database()
+        print(f"已补建列和索引: {', '.join(created)}" if created else "数据库结构已是最新")
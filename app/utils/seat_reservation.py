@@ -0,0 +1,341 @@
+"""
+座位时间片占用
+预约写入时在同一事务内插入 (座位, 时间片) 唯一记录，冲突由数据库唯一约束直接拒绝，
+不再依赖"先查询再插入"，两个学生同时抢同一座位时只有一个能成功。
+另提供短时保留(hold)：学生确认预约前先占住座位，超时自动失效。
+
+唯一约束只能按整片判断冲突，因此新预约和改期的开始、结束时间必须落在
+SEAT_SLOT_MINUTES 的整数倍上（如 08:00、08:15），否则抛出 SlotAlignmentError，
+不会因为向外取整而拒绝实际并不重叠的预约。之前写入的未对齐预约仍按向外取整占用。
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, event, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import db
+from app.utils.availability import BLOCKING_STATUSES
+
+# 预约编号冲突时的重试次数
+NUMBER_RETRIES = 3
+
+
+class SeatConflictError(Exception):
+    """座位在该时段已被预约或保留"""
+
+    def __init__(self, seat_id, start_time, end_time):
+        super().__init__(f'座位 {seat_id} 在 {start_time:%Y-%m-%d %H:%M}-{end_time:%H:%M} 已被占用')
+        self.seat_id = seat_id
+        self.start_time = start_time
+        self.end_time = end_time
+
+
+class SlotAlignmentError(ValueError):
+    """预约时间没有对齐到时间片"""
+
+    def __init__(self, minutes):
+        super().__init__(f'预约时间需按 {minutes} 分钟对齐（如 08:00、08:{minutes:02d}）')
+        self.minutes = minutes
+
+
+def _config(key, default):
+    if has_app_context():
+        return current_app.config.get(key, default)
+    return default
+
+
+def slot_minutes():
+    """时间片长度(分钟)"""
+    return _config('SEAT_SLOT_MINUTES', 15)
+
+
+def is_aligned(value, minutes=None):
+    """时间点是否落在时间片边界上"""
+    minutes = minutes or slot_minutes()
+    return not (value.second or value.microsecond or value.minute % minutes)
+
+
+def check_alignment(start_time, end_time, minutes=None):
+    """开始、结束时间未对齐到时间片时抛出 SlotAlignmentError"""
+    minutes = minutes or slot_minutes()
+    if not (is_aligned(start_time, minutes) and is_aligned(end_time, minutes)):
+        raise SlotAlignmentError(minutes)
+
+
+def slot_ceil(value, minutes=None):
+    """向上取整到时间片边界"""
+    minutes = minutes or slot_minutes()
+    floor = value.replace(second=0, microsecond=0) - timedelta(minutes=value.minute % minutes)
+    return floor if floor == value else floor + timedelta(minutes=minutes)
+
+
+def slot_starts(start_time, end_time, minutes=None):
+    """[start_time, end_time) 覆盖的所有时间片开始时间（向外取整）"""
+    minutes = minutes or slot_minutes()
+    step = timedelta(minutes=minutes)
+    cursor = start_time.replace(second=0, microsecond=0)
+    cursor -= timedelta(minutes=cursor.minute % minutes)
+    slots = []
+    while cursor < end_time:
+        slots.append(cursor)
+        cursor += step
+    return slots
+
+
+def _table():
+    from app.models import SeatReservation
+
+    return SeatReservation.__table__
+
+
+def _purge_expired_holds(connection, seat_id, slots, now):
+    table = _table()
+    connection.execute(delete(table).where(
+        table.c.seat_id == seat_id,
+        table.c.slot_start.in_(slots),
+        table.c.booking_id.is_(None),
+        table.c.expires_at < now,
+    ))
+
+
+def claim_slots(connection, booking_id, user_id, seat_id, start_time, end_time, now=None):
+    """为预约占用时间片；已被他人占用时抛出 SeatConflictError
+
+    当前用户自己保留(hold)的时间片直接转为该预约所有。
+    """
+    table = _table()
+    now = now or datetime.now()
+    slots = slot_starts(start_time, end_time)
+    if not slots:
+        return
+
+    _purge_expired_holds(connection, seat_id, slots, now)
+
+    # 接管本人的临时保留
+    connection.execute(update(table).where(
+        table.c.seat_id == seat_id,
+        table.c.slot_start.in_(slots),
+        table.c.booking_id.is_(None),
+        table.c.held_by == user_id,
+    ).values(booking_id=booking_id, held_by=None, hold_token=None, expires_at=None))
+    owned = set(connection.execute(select(table.c.slot_start).where(
+        table.c.seat_id == seat_id,
+        table.c.slot_start.in_(slots),
+        table.c.booking_id == booking_id,
+    )).scalars())
+
+    rows = [{'seat_id': seat_id, 'slot_start': slot, 'booking_id': booking_id, 'created_at': now}
+            for slot in slots if slot not in owned]
+    if not rows:
+        return
+    try:
+        # 用保存点隔离冲突，失败时不影响外层事务的其他语句
+        with connection.begin_nested():
+            connection.execute(table.insert(), rows)
+    except IntegrityError as e:
+        raise SeatConflictError(seat_id, start_time, end_time) from e
+
+
+def release_slots(connection, booking_ids):
+    """释放预约占用的时间片"""
+    if not booking_ids:
+        return
+    table = _table()
+    connection.execute(delete(table).where(table.c.booking_id.in_(list(booking_ids))))
+
+
+def hold_seat(user_id, seat_id, start_time, end_time, seconds=None):
+    """临时保留座位，返回保留凭证；座位已被占用时返回 None
+
+    保留在独立的事务中写入并立即提交，不影响调用方会话中尚未提交的修改
+    """
+    check_alignment(start_time, end_time)
+    now = datetime.now()
+    seconds = seconds or _config('SEAT_HOLD_SECONDS', 120)
+    slots = slot_starts(start_time, end_time)
+    token = str(uuid.uuid4())
+
+    try:
+        with db.engine.begin() as connection:
+            insert_hold(connection, token, user_id, seat_id, slots, now + timedelta(seconds=seconds), now)
+    except IntegrityError:
+        return None
+    return token
+
+
+def insert_hold(connection, token, user_id, seat_id, slots, expires_at, now):
+    """在调用方的连接中写入保留记录，时间片已被占用时抛出 IntegrityError"""
+    table = _table()
+    _purge_expired_holds(connection, seat_id, slots, now)
+    # 同一用户对同一时段的旧保留先释放，避免与自己冲突
+    connection.execute(delete(table).where(
+        table.c.seat_id == seat_id,
+        table.c.slot_start.in_(slots),
+        table.c.booking_id.is_(None),
+        table.c.held_by == user_id,
+    ))
+    connection.execute(table.insert(), [
+        {'seat_id': seat_id, 'slot_start': slot, 'held_by': user_id, 'hold_token': token,
+         'expires_at': expires_at, 'created_at': now}
+        for slot in slots
+    ])
+
+
+def hold_window(token, now=None):
+    """保留凭证覆盖的 (座位, 开始, 结束)，已失效时返回 None"""
+    table = _table()
+    seat_id, first, last, count = db.session.execute(select(
+        db.func.min(table.c.seat_id), db.func.min(table.c.slot_start),
+        db.func.max(table.c.slot_start), db.func.count(),
+    ).where(
+        table.c.hold_token == token,
+        table.c.booking_id.is_(None),
+        table.c.expires_at >= (now or datetime.now()),
+    )).one()
+    if not count:
+        return None
+    return seat_id, first, last + timedelta(minutes=slot_minutes())
+
+
+def hold_is_valid(token, user_id, seat_id, start_time, end_time):
+    """保留凭证是否仍完整覆盖该时段且未过期"""
+    table = _table()
+    slots = slot_starts(start_time, end_time)
+    held = db.session.execute(select(db.func.count()).select_from(table).where(
+        table.c.hold_token == token,
+        table.c.held_by == user_id,
+        table.c.seat_id == seat_id,
+        table.c.slot_start.in_(slots),
+        table.c.expires_at >= datetime.now(),
+    )).scalar()
+    return held == len(slots)
+
+
+def confirm_hold(token, user_id, seat_id, start_time, end_time, **fields):
+    """用保留凭证确认预约，成功返回预约，保留已失效或座位被占用时返回 None"""
+    check_alignment(start_time, end_time)
+    if not hold_is_valid(token, user_id, seat_id, start_time, end_time):
+        return None
+    return _commit_booking(user_id=user_id, seat_id=seat_id, start_time=start_time,
+                           end_time=end_time, booking_date=start_time.date(), **fields)
+
+
+def release_hold(token):
+    """主动放弃保留"""
+    table = _table()
+    with db.engine.begin() as connection:
+        connection.execute(delete(table).where(
+            table.c.hold_token == token, table.c.booking_id.is_(None)))
+
+
+def reserve_seat(user_id, seat_id, start_time, end_time, **fields):
+    """原子预约：成功返回预约，座位已被占用时返回 None；时间未对齐时抛出 SlotAlignmentError"""
+    check_alignment(start_time, end_time)
+    return _commit_booking(user_id=user_id, seat_id=seat_id, start_time=start_time,
+                           end_time=end_time, booking_date=start_time.date(), **fields)
+
+
+def _commit_booking(**values):
+    """写入一条预约：座位已被占用时返回 None，预约编号撞上唯一约束时换一个编号重试"""
+    from app.models import Booking
+    from app.utils.booking_number import is_duplicate_number
+
+    for attempt in range(NUMBER_RETRIES):
+        booking = Booking(**values)
+        db.session.add(booking)
+        try:
+            db.session.commit()
+            return booking
+        except SeatConflictError:
+            db.session.rollback()
+            return None
+        except IntegrityError as e:
+            db.session.rollback()
+            if not is_duplicate_number(e) or attempt == NUMBER_RETRIES - 1:
+                raise
+    return None
+
+
+def backfill_reservations(now=None):
+    """为尚未结束的有效预约补建时间片记录，返回补建的预约数量"""
+    from app.models import Booking, SeatReservation
+
+    now = now or datetime.now()
+    bookings = db.session.query(
+        Booking.id, Booking.user_id, Booking.seat_id, Booking.start_time, Booking.end_time
+    ).outerjoin(
+        SeatReservation, SeatReservation.booking_id == Booking.id
+    ).filter(
+        Booking.status.in_(BLOCKING_STATUSES),
+        Booking.end_time > now,
+        SeatReservation.id.is_(None)
+    ).all()
+
+    connection = db.session.connection()
+    count = 0
+    for booking_id, user_id, seat_id, start_time, end_time in bookings:
+        try:
+            claim_slots(connection, booking_id, user_id, seat_id, start_time, end_time, now)
+            count += 1
+        except SeatConflictError:
+            # 历史数据中已存在的重叠预约：保留先占到的记录
+            current_app.logger.warning(f'预约 {booking_id} 与已有预约时段重叠，未补建时间片')
+    db.session.commit()
+    return count
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_reservations(session, flush_context):
+    """预约写入、改期、取消时同步时间片占用，冲突时整个事务失败"""
+    from app.models import Booking
+
+    claims, releases = [], set()
+    for obj in session.new:
+        if isinstance(obj, Booking) and (obj.status or 'active') in BLOCKING_STATUSES:
+            check_alignment(obj.start_time, obj.end_time)
+            claims.append(obj)
+    for obj in session.dirty:
+        if not isinstance(obj, Booking):
+            continue
+        state = inspect(obj)
+        window_changed = any(state.attrs[field].history.has_changes()
+                             for field in ('seat_id', 'start_time', 'end_time'))
+        if not window_changed and not state.attrs.status.history.has_changes():
+            continue
+        if any(state.attrs[field].history.has_changes() for field in ('start_time', 'end_time')):
+            # 改期同样要求对齐；只改状态的旧预约沿用向外取整
+            check_alignment(obj.start_time, obj.end_time)
+        status_history = state.attrs.status.history
+        old_status = status_history.deleted[0] if status_history.deleted else obj.status
+        was_blocking = old_status in BLOCKING_STATUSES
+        is_blocking = obj.status in BLOCKING_STATUSES
+        # 时段不变且仍占用座位（如 active -> completed）时保留原有时间片，不重新占用
+        if was_blocking and (window_changed or not is_blocking):
+            releases.add(obj.id)
+        if is_blocking and (window_changed or not was_blocking):
+            claims.append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            releases.add(obj.id)
+
+    if not claims and not releases:
+        return
+    connection = session.connection()
+    release_slots(connection, releases)
+    now = datetime.now()
+    for booking in claims:
+        claim_slots(connection, booking.id, booking.user_id, booking.seat_id,
+                    booking.start_time, booking.end_time, now)
+
+
+def init_app(app):
+    """注册时间片补建命令"""
+
+    @app.cli.command('backfill-reservations')
+    def backfill_reservations_command():
+        """为已有的有效预约补建座位时间片"""
+        print(f"已为 {backfill_reservations()} 条预约补建时间片")
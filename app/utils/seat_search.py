@@ -0,0 +1,320 @@
+"""
+跨自习室座位搜索
+把全部座位的属性（电源、靠窗、电脑、座位类型）和所在自习室的属性（安静、WiFi、空调、类型、楼栋）
+预先整理成位图：每个属性一个整数，第 i 位表示第 i 个座位是否具备该属性。
+一次搜索只需把必选条件的位图按位与，再去掉时间段内已被预约的座位（来自座位可用性索引），
+最后按偏好条件命中数和与目标楼栋的距离排序。几千个座位的搜索只需几毫秒。
+
+座位和自习室变更提交后本进程立即重建索引，其他工作进程的变更由 SEAT_SEARCH_INDEX_TTL 限定可见延迟。
+
+接口:
+    GET /api/seats/search?date=2025-01-06&start_time=14:00&end_time=18:00
+        &require=power,window&prefer=quiet,computer&near=图书馆&limit=20
+"""
+
+import math
+import threading
+import time as _time
+from datetime import datetime
+from itertools import islice
+
+from flask import current_app, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+
+# 可用于 require / prefer 的条件，与位图名称相同
+CRITERIA = ('power', 'window', 'computer', 'quiet', 'wifi', 'air_conditioning')
+INDEXED_MODELS = ('Seat', 'StudyRoom')
+
+
+def _mask(positions, size):
+    """由座位序号列表生成位图"""
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _positions(mask):
+    """按从低到高的顺序逐个取出位图中为 1 的座位序号"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _preference_levels(masks, candidates):
+    """按位并行累加每个座位命中的偏好数，返回 {命中数: 位图}"""
+    digits = []  # 命中数的二进制各位，每一位是一个位图
+    for mask in masks:
+        carry = mask & candidates
+        for i, digit in enumerate(digits):
+            digits[i], carry = digit ^ carry, digit & carry
+            if not carry:
+                break
+        if carry:
+            digits.append(carry)
+    levels = {}
+    for count in range(len(masks), -1, -1):
+        if count >> len(digits):
+            continue
+        level = candidates
+        for i, digit in enumerate(digits):
+            level &= digit if count >> i & 1 else ~digit
+        if level:
+            levels[count] = level
+    return levels
+
+
+def _minutes(value):
+    """'08:00' → 480，无法解析时返回 None"""
+    try:
+        parsed = datetime.strptime((value or '').strip(), '%H:%M')
+    except ValueError:
+        return None
+    return parsed.hour * 60 + parsed.minute
+
+
+class _Snapshot:
+    """某一时刻的座位位图，建好后只读"""
+
+    def __init__(self, rows):
+        self.seats = []
+        self.positions = {}
+        self.rooms = {}
+        self.room_masks = {}
+        self.masks = {}
+        groups = {}
+
+        def add(name, position):
+            groups.setdefault(name, []).append(position)
+
+        for row in rows:
+            position = len(self.seats)
+            self.seats.append(row)
+            self.positions[row.seat_id] = position
+            if row.room_id not in self.rooms:
+                self.rooms[row.room_id] = {
+                    'name': row.room_name, 'building': row.building, 'floor': row.floor,
+                    'open': _minutes(row.open_time), 'close': _minutes(row.close_time),
+                }
+            add(('room', row.room_id), position)
+            if row.seat_status != 'maintenance' and row.room_status == 'open':
+                add('bookable', position)
+            if row.power_socket:
+                add('power', position)
+            if row.window_seat:
+                add('window', position)
+            if row.computer_available or row.seat_type == 'computer':
+                add('computer', position)
+            if row.is_quiet or row.room_type == 'quiet':
+                add('quiet', position)
+            if row.has_wifi:
+                add('wifi', position)
+            if row.has_air_conditioning:
+                add('air_conditioning', position)
+            add(('type', row.seat_type), position)
+            add(('room_type', row.room_type), position)
+            add(('building', row.building), position)
+
+        size = len(self.seats)
+        for name, positions in groups.items():
+            if isinstance(name, tuple) and name[0] == 'room':
+                self.room_masks[name[1]] = _mask(positions, size)
+            else:
+                self.masks[name] = _mask(positions, size)
+
+    def mask(self, name):
+        return self.masks.get(name, 0)
+
+
+class SeatSearchIndex:
+    """座位属性位图索引，首次搜索时构建"""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._snapshot = None
+        self._built_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _build(self):
+        """一次查询加载全部座位及其所在自习室"""
+        from app.models import Seat, StudyRoom
+
+        rows = db.session.query(
+            Seat.id.label('seat_id'), Seat.room_id, Seat.seat_number, Seat.type.label('seat_type'),
+            Seat.status.label('seat_status'), Seat.power_socket, Seat.window_seat, Seat.computer_available,
+            StudyRoom.name.label('room_name'), StudyRoom.building, StudyRoom.floor, StudyRoom.room_type,
+            StudyRoom.status.label('room_status'), StudyRoom.is_quiet, StudyRoom.has_wifi,
+            StudyRoom.has_air_conditioning, StudyRoom.open_time, StudyRoom.close_time,
+        ).join(StudyRoom, Seat.room_id == StudyRoom.id).order_by(Seat.room_id, Seat.id).all()
+        return _Snapshot(rows)
+
+    def snapshot(self):
+        ttl = current_app.config.get('SEAT_SEARCH_INDEX_TTL', self.ttl)
+        with self._lock:
+            if self._snapshot is not None and _time.monotonic() - self._built_at < ttl:
+                return self._snapshot
+            generation = self._generation
+        snapshot = self._build()
+        with self._lock:
+            # 构建期间有座位或自习室变更提交时不缓存，下次重新构建
+            if generation == self._generation:
+                self._snapshot = snapshot
+                self._built_at = _time.monotonic()
+        return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+    def search(self, start_time, end_time, require=(), prefer=(), seat_type=None, room_type=None,
+               building=None, near=None, limit=20):
+        """搜索 [start_time, end_time) 内空闲且满足全部必选条件的座位，按偏好排序
+
+        返回 (满足条件的座位总数, 排序后的前 limit 个结果)
+        """
+        from app.utils.availability import seat_availability
+
+        snapshot = self.snapshot()
+        candidates = snapshot.mask('bookable')
+        for name in require:
+            candidates &= snapshot.mask(name)
+        for key, value in (('type', seat_type), ('room_type', room_type), ('building', building)):
+            if value:
+                candidates &= snapshot.mask((key, value))
+
+        # 只对仍有候选座位的自习室检查开放时间和预约情况
+        start_minutes = start_time.hour * 60 + start_time.minute
+        end_minutes = end_time.hour * 60 + end_time.minute if end_time.date() == start_time.date() else 24 * 60
+        for room_id, room_mask in snapshot.room_masks.items():
+            if not candidates & room_mask:
+                continue
+            room = snapshot.rooms[room_id]
+            if ((room['open'] is not None and start_minutes < room['open'])
+                    or (room['close'] is not None and end_minutes > room['close'])):
+                candidates &= ~room_mask
+                continue
+            occupied = seat_availability.occupied_seat_ids(room_id, start_time, end_time)
+            if occupied:
+                candidates &= ~_mask([snapshot.positions[seat_id] for seat_id in occupied
+                                      if seat_id in snapshot.positions], len(snapshot.seats))
+
+        # 先按命中的偏好数分层，同一层内按距离和自习室顺序取座位，取满 limit 个即停止
+        preference_masks = [(name, snapshot.mask(name)) for name in prefer]
+        levels = _preference_levels([mask for _, mask in preference_masks], candidates)
+        rooms = sorted((room_id for room_id, room_mask in snapshot.room_masks.items() if candidates & room_mask),
+                       key=lambda room_id: (_distance(snapshot.rooms[room_id]['building'], near), room_id))
+        ordered = (position for count in sorted(levels, reverse=True) for room_id in rooms
+                   for position in _positions(levels[count] & snapshot.room_masks[room_id]))
+        results = [self._result(snapshot, position, preference_masks) for position in islice(ordered, limit)]
+        return candidates.bit_count(), results
+
+    @staticmethod
+    def _result(snapshot, position, preference_masks):
+        seat = snapshot.seats[position]
+        room = snapshot.rooms[seat.room_id]
+        return {
+            'seat_id': seat.seat_id,
+            'seat_number': seat.seat_number,
+            'seat_type': seat.seat_type,
+            'room_id': seat.room_id,
+            'room_name': room['name'],
+            'building': room['building'],
+            'floor': room['floor'],
+            'power_socket': bool(seat.power_socket),
+            'window_seat': bool(seat.window_seat),
+            'computer_available': bool(seat.computer_available),
+            'matched': [name for name, mask in preference_masks if mask >> position & 1],
+        }
+
+
+def _distance(building, near):
+    """与目标楼栋的距离；同一楼栋为 0，配置了坐标时按直线距离，否则排在最后"""
+    if not near:
+        return 0
+    if building == near:
+        return 0
+    coordinates = current_app.config.get('BUILDING_COORDINATES') or {}
+    if building in coordinates and near in coordinates:
+        return math.dist(coordinates[building], coordinates[near])
+    return math.inf
+
+
+seat_search_index = SeatSearchIndex()
+
+
+@event.listens_for(Session, 'after_flush', propagate=True)
+def _collect_seat_changes(session, flush_context):
+    """座位或自习室有变更时，提交后重建索引"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if type(obj).__name__ in INDEXED_MODELS:
+            session.info['seat_search_stale'] = True
+            return
+
+
+@event.listens_for(Session, 'do_orm_execute', propagate=True)
+def _collect_bulk_seat_changes(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_.__name__ in INDEXED_MODELS:
+        orm_execute_state.session.info['seat_search_stale'] = True
+
+
+@event.listens_for(Session, 'after_commit', propagate=True)
+def _rebuild_after_commit(session):
+    if session.info.pop('seat_search_stale', False):
+        seat_search_index.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback', propagate=True)
+def _drop_seat_changes(session):
+    session.info.pop('seat_search_stale', None)
+
+
+def _split(value):
+    return [item for item in (value or '').split(',') if item]
+
+
+def search_api():
+    """GET /api/seats/search"""
+    args = request.args
+    try:
+        day = datetime.strptime(args.get('date', ''), '%Y-%m-%d').date()
+        start_time = datetime.combine(day, datetime.strptime(args.get('start_time', ''), '%H:%M').time())
+        end_time = datetime.combine(day, datetime.strptime(args.get('end_time', ''), '%H:%M').time())
+    except ValueError:
+        return jsonify({'success': False, 'message': '请提供正确的日期和时间（date=YYYY-MM-DD, start_time/end_time=HH:MM）'}), 400
+    if end_time <= start_time:
+        return jsonify({'success': False, 'message': '结束时间必须晚于开始时间'}), 400
+
+    require, prefer = _split(args.get('require')), _split(args.get('prefer'))
+    unknown = [name for name in require + prefer if name not in CRITERIA]
+    if unknown:
+        return jsonify({'success': False, 'message': f"不支持的条件: {', '.join(unknown)}"}), 400
+
+    began = _time.perf_counter()
+    total, seats = seat_search_index.search(
+        start_time, end_time, require=require, prefer=prefer,
+        seat_type=args.get('type'), room_type=args.get('room_type'),
+        building=args.get('building'), near=args.get('near'),
+        limit=min(max(args.get('limit', 20, type=int), 1), 100),
+    )
+    return jsonify({
+        'success': True,
+        'total': total,
+        'seats': seats,
+        'elapsed_ms': round((_time.perf_counter() - began) * 1000, 2),
+    })
+
+
+def init_app(app):
+    """注册座位搜索接口"""
+    from app.utils.access import student_required
+
+    app.add_url_rule('/api/seats/search', 'seat_search', student_required(search_api))
@@ -0,0 +1,211 @@
+"""
+请求级 SQL 性能分析
+在 create_app 创建的数据库引擎上挂载事件，按请求统计 SQL 条数和数据库耗时，
+识别 N+1 查询（同一请求内同一形状的语句重复执行），记录慢查询的参数和调用位置。
+
+结果通过 Server-Timing 响应头返回（浏览器开发者工具的 Timing 面板可直接查看），
+并汇总到 /admin/api/sql_profile。默认关闭；按 SQL_PROFILER_SAMPLE_RATE 抽样，
+未被抽中的请求只多一次字典查找，可以在生产环境长期开启。
+"""
+
+import random
+import re
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+from flask import current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+
+from app import db
+
+_IN_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r'\s+')
+
+_lock = threading.Lock()
+_recent_requests = deque(maxlen=200)
+_slow_queries = deque(maxlen=200)
+_endpoint_stats = {}
+
+UNMATCHED_ENDPOINT = '<unmatched>'
+
+
+def statement_shape(statement):
+    """语句形状：去掉字面量并合并 IN 列表，参数不同的同一查询得到相同结果"""
+    shape = _IN_LIST.sub('(?)', statement)
+    shape = _LITERAL.sub('?', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+def _origin():
+    """慢查询在应用代码中的调用位置（跳过框架和本模块）"""
+    frames = []
+    for frame in traceback.extract_stack()[:-3]:
+        filename = frame.filename.replace('\\', '/')
+        if '/app/' not in filename or 'site-packages' in filename or filename.endswith('sql_profiler.py'):
+            continue
+        frames.append(f'{filename.rsplit("/app/", 1)[-1]}:{frame.lineno} {frame.name}')
+    return frames[-5:]
+
+
+class RequestProfile:
+    """单个请求内的 SQL 统计"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+        self.slow = []
+
+    def record(self, statement, parameters, elapsed, slow_threshold):
+        self.query_count += 1
+        self.db_time += elapsed
+        self.shapes[statement_shape(statement)] += 1
+        if elapsed * 1000 >= slow_threshold:
+            self.slow.append({
+                'statement': statement,
+                'parameters': repr(parameters)[:500],
+                'duration_ms': round(elapsed * 1000, 2),
+                'origin': _origin(),
+            })
+
+    def n_plus_one(self, threshold):
+        return [{'statement': shape, 'count': count}
+                for shape, count in self.shapes.most_common()
+                if count >= threshold and shape.upper().startswith('SELECT')]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # 开始时间记在本次执行的上下文上，语句失败时随上下文一起丢弃，不会在连接上累积
+    if context is not None and has_request_context() and g.get('sql_profile') is not None:
+        context.sql_profile_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    profile = g.get('sql_profile')
+    started = getattr(context, 'sql_profile_start', None)
+    if profile is None or started is None:
+        return
+    elapsed = time.perf_counter() - started
+    profile.record(statement, parameters, elapsed, current_app.config.get('SQL_SLOW_QUERY_MS', 100))
+
+
+def _start_profile():
+    rate = current_app.config.get('SQL_PROFILER_SAMPLE_RATE', 1.0)
+    if rate >= 1 or random.random() < rate:
+        g.sql_profile = RequestProfile()
+
+
+def _finish_profile(response):
+    profile = g.pop('sql_profile', None)
+    if profile is None:
+        return response
+
+    config = current_app.config
+    total_ms = (time.perf_counter() - profile.started) * 1000
+    db_ms = profile.db_time * 1000
+    n_plus_one = profile.n_plus_one(config.get('SQL_N_PLUS_ONE_THRESHOLD', 5))
+
+    response.headers.add('Server-Timing', f'db;dur={db_ms:.1f};desc="{profile.query_count} queries"')
+    response.headers.add('Server-Timing', f'app;dur={total_ms - db_ms:.1f}')
+    response.headers['X-SQL-Queries'] = str(profile.query_count)
+
+    # 未匹配路由的请求(404 等)合并统计，避免每个不同路径都新增一项
+    endpoint = request.endpoint or UNMATCHED_ENDPOINT
+    for item in profile.slow:
+        current_app.logger.warning(
+            f"慢查询 {item['duration_ms']}ms [{endpoint}] {item['statement']} "
+            f"参数={item['parameters']} 位置={' <- '.join(reversed(item['origin']))}")
+    for item in n_plus_one:
+        current_app.logger.warning(f"疑似 N+1 查询 [{endpoint}] 重复 {item['count']} 次: {item['statement']}")
+
+    entry = {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'method': request.method,
+        'path': request.path,
+        'endpoint': endpoint,
+        'status': response.status_code,
+        'queries': profile.query_count,
+        'db_ms': round(db_ms, 2),
+        'total_ms': round(total_ms, 2),
+        'n_plus_one': n_plus_one,
+    }
+    with _lock:
+        _recent_requests.append(entry)
+        _slow_queries.extend({**item, 'endpoint': endpoint, 'time': entry['time']} for item in profile.slow)
+        stats = _endpoint_stats.setdefault(endpoint, {
+            'requests': 0, 'queries': 0, 'max_queries': 0, 'db_ms': 0.0, 'total_ms': 0.0,
+            'n_plus_one': 0})
+        stats['requests'] += 1
+        stats['queries'] += profile.query_count
+        stats['max_queries'] = max(stats['max_queries'], profile.query_count)
+        stats['db_ms'] += db_ms
+        stats['total_ms'] += total_ms
+        stats['n_plus_one'] += bool(n_plus_one)
+    return response
+
+
+def get_profile_report():
+    """最近请求、慢查询及各端点的平均值"""
+    with _lock:
+        endpoints = {
+            endpoint: {
+                'requests': stats['requests'],
+                'avg_queries': round(stats['queries'] / stats['requests'], 1),
+                'max_queries': stats['max_queries'],
+                'avg_db_ms': round(stats['db_ms'] / stats['requests'], 2),
+                'avg_total_ms': round(stats['total_ms'] / stats['requests'], 2),
+                'n_plus_one_requests': stats['n_plus_one'],
+            }
+            for endpoint, stats in _endpoint_stats.items()
+        }
+        return {
+            'endpoints': dict(sorted(endpoints.items(), key=lambda item: -item[1]['avg_db_ms'])),
+            'recent_requests': list(_recent_requests)[::-1],
+            'slow_queries': list(_slow_queries)[::-1],
+        }
+
+
+def reset_profile_report():
+    with _lock:
+        _recent_requests.clear()
+        _slow_queries.clear()
+        _endpoint_stats.clear()
+
+
+def profile_api():
+    """GET /admin/api/sql_profile，?reset=1 清空已收集的数据"""
+    report = get_profile_report()
+    if request.args.get('reset', type=int):
+        reset_profile_report()
+    config = current_app.config
+    return jsonify({
+        'success': True,
+        'data': {
+            'sample_rate': config.get('SQL_PROFILER_SAMPLE_RATE', 1.0),
+            'slow_query_ms': config.get('SQL_SLOW_QUERY_MS', 100),
+            'n_plus_one_threshold': config.get('SQL_N_PLUS_ONE_THRESHOLD', 5),
+            **report,
+        }
+    })
+
+
+def init_app(app):
+    """按配置在数据库引擎上挂载统计事件，并注册查询接口"""
+    if not app.config.get('SQL_PROFILER_ENABLED'):
+        return
+
+    from app.utils.access import admin_required
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.add_url_rule('/admin/api/sql_profile', 'sql_profile', admin_required(profile_api))
@@ -0,0 +1,110 @@
+"""
+启动优化
+- 模板字节码缓存: 编译后的 Jinja 模板写入 instance/jinja_cache，重启后的工作进程直接加载，
+  不必在首个请求时重新解析和编译模板
+- 启动耗时基准: 在全新的解释器中计时导入 + create_app() 以及首个请求，
+  并统计启动期间执行的 SQL 数（正常启动应为 0，结构检查和基础数据只在 flask init-db 时执行）
+
+用法:
+    python app/utils/startup.py --runs 5 --budget-ms 1500
+    python app/utils/startup.py --imports    # 列出导入最慢的模块
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(PROJECT_ROOT)
+
+# 在子进程中执行，输出一行 JSON
+PROBE = '''
+import json, time
+began = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+queries = []
+event.listen(Engine, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+from app import create_app
+app = create_app()
+created = time.perf_counter()
+boot_queries = len(queries)
+response = app.test_client().get({path!r})
+finished = time.perf_counter()
+print(json.dumps({{
+    'create_app': (created - began) * 1000,
+    'first_request': (finished - created) * 1000,
+    'boot_queries': boot_queries,
+    'status': response.status_code,
+}}))
+'''
+
+
+def init_app(app):
+    """开启模板字节码缓存"""
+    if not app.config.get('JINJA_BYTECODE_CACHE', True):
+        return
+    from jinja2 import FileSystemBytecodeCache
+
+    directory = app.config.get('JINJA_BYTECODE_CACHE_PATH') or os.path.join(app.instance_path, 'jinja_cache')
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+
+def probe(path):
+    """在全新的解释器中启动一次应用"""
+    result = subprocess.run([sys.executable, '-c', PROBE.format(path=path)], cwd=PROJECT_ROOT,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit):
+    """用 -X importtime 统计导入 app 时累计耗时最多的模块"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'from app import create_app; create_app()'],
+                            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)', line)
+        if match:
+            rows.append((int(match.group(1)), match.group(3)))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='应用启动耗时基准')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/', help='首个请求的路径')
+    parser.add_argument('--budget-ms', type=float, help='导入 + create_app 中位数超过该值时返回非零状态')
+    parser.add_argument('--imports', type=int, nargs='?', const=20, help='列出导入最慢的 N 个模块')
+    args = parser.parse_args()
+
+    if args.imports:
+        for micros, module in slowest_imports(args.imports):
+            print(f"{micros / 1000:8.1f} ms  {module}")
+        return 0
+
+    samples = [probe(args.path) for _ in range(args.runs)]
+    boot = [sample['create_app'] for sample in samples]
+    first = [sample['first_request'] for sample in samples]
+    boot_queries = max(sample['boot_queries'] for sample in samples)
+    print(f"启动 {args.runs} 次  首个请求 {args.path} -> {samples[-1]['status']}")
+    print(f"导入 + create_app: 中位数 {statistics.median(boot):.0f} ms  最大 {max(boot):.0f} ms")
+    print(f"首个请求:          中位数 {statistics.median(first):.0f} ms  最大 {max(first):.0f} ms")
+    print(f"启动期间 SQL:      {boot_queries} 条")
+
+    failed = False
+    if boot_queries:
+        print("启动期间不应执行 SQL，结构检查和基础数据请改用 flask init-db / flask migrate-db")
+        failed = True
+    if args.budget_ms is not None and statistics.median(boot) > args.budget_ms:
+        print(f"启动耗时超出预算 {args.budget_ms:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
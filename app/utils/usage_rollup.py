@@ -0,0 +1,343 @@
+"""
+自习室使用统计汇总
+预约状态变化时在同一事务内增量更新按 (自习室, 日期, 小时) 汇总的统计，
+管理后台直接读取汇总表，无需扫描 bookings
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import jsonify, request
+from sqlalchemy import event, func, inspect, or_, select, update
+from sqlalchemy.orm import Session
+
+from app import db
+
+METRICS = ('bookings', 'cancellations', 'check_ins', 'no_shows', 'booked_minutes', 'used_minutes')
+
+# 参与统计的预约字段
+TRACKED_FIELDS = ('seat_id', 'status', 'start_time', 'end_time', 'check_in_time', 'check_out_time')
+
+
+def _hour_buckets(start_time, end_time):
+    """将 [start_time, end_time) 按整点切分，返回 [((日期, 小时), 分钟数)]"""
+    buckets = []
+    cursor = start_time
+    while cursor < end_time:
+        next_hour = cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        segment_end = min(next_hour, end_time)
+        minutes = round((segment_end - cursor).total_seconds() / 60)
+        if minutes:
+            buckets.append(((cursor.date(), cursor.hour), minutes))
+        cursor = segment_end
+    return buckets
+
+
+def booking_contribution(room_id, snapshot):
+    """一条预约对汇总表的贡献，返回 {(room_id, 日期, 小时): {指标: 值}}"""
+    result = defaultdict(lambda: defaultdict(int))
+    if snapshot is None or room_id is None or snapshot['start_time'] is None:
+        return result
+
+    start_time, end_time = snapshot['start_time'], snapshot['end_time']
+    status = snapshot['status'] or 'active'
+    key = (room_id, start_time.date(), start_time.hour)
+
+    result[key]['bookings'] += 1
+    if status == 'cancelled':
+        result[key]['cancellations'] += 1
+    if status == 'no_show':
+        result[key]['no_shows'] += 1
+    if snapshot['check_in_time']:
+        result[key]['check_ins'] += 1
+
+    # 与座位可用性一致：取消和未到场的预约不计入占用
+    if status in ('active', 'completed') and end_time:
+        for (day, hour), minutes in _hour_buckets(start_time, end_time):
+            result[(room_id, day, hour)]['booked_minutes'] += minutes
+
+    if status == 'completed' and snapshot['check_in_time']:
+        used_end = snapshot['check_out_time'] or end_time
+        for (day, hour), minutes in _hour_buckets(snapshot['check_in_time'], used_end):
+            result[(room_id, day, hour)]['used_minutes'] += minutes
+    return result
+
+
+def _merge(target, contribution, sign):
+    for key, metrics in contribution.items():
+        for name, value in metrics.items():
+            target[key][name] += sign * value
+
+
+def _snapshots(obj):
+    """从属性历史中取出预约修改前后的状态"""
+    state = inspect(obj)
+    old, new = {}, {}
+    for field in TRACKED_FIELDS:
+        history = state.attrs[field].history
+        new[field] = getattr(obj, field)
+        old[field] = history.deleted[0] if history.deleted else (
+            history.unchanged[0] if history.unchanged else new[field])
+    return old, new
+
+
+def _room_ids(connection, seat_ids):
+    from app.models import Seat
+
+    if not seat_ids:
+        return {}
+    rows = connection.execute(select(Seat.id, Seat.room_id).where(Seat.id.in_(seat_ids)))
+    return dict(rows.all())
+
+
+def apply_deltas(connection, deltas):
+    """把增量写入汇总表（同一事务内的 upsert）"""
+    from app.models import RoomUsageStat
+
+    rows = []
+    for (room_id, day, hour), metrics in deltas.items():
+        if any(metrics.values()):
+            row = {'room_id': room_id, 'stat_date': day, 'hour': hour}
+            row.update({name: metrics.get(name, 0) for name in METRICS})
+            rows.append(row)
+    if not rows:
+        return
+
+    table = RoomUsageStat.__table__
+    now = datetime.utcnow()
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).values(updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['room_id', 'stat_date', 'hour'],
+            set_={**{name: table.c[name] + stmt.excluded[name] for name in METRICS},
+                  'updated_at': now},
+        )
+        connection.execute(stmt, rows)
+        return
+
+    # 其他数据库：先更新，不存在再插入
+    for row in rows:
+        result = connection.execute(
+            update(table).where(
+                table.c.room_id == row['room_id'],
+                table.c.stat_date == row['stat_date'],
+                table.c.hour == row['hour'],
+            ).values({name: table.c[name] + row[name] for name in METRICS}, updated_at=now)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(updated_at=now, **row))
+
+
+@event.listens_for(Session, 'after_flush')
+def _rollup_booking_changes(session, flush_context):
+    """预约新增、修改、删除时，在同一事务内更新汇总统计"""
+    from app.models import Booking
+
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            changes.append((None, _snapshots(obj)[1]))
+    for obj in session.dirty:
+        if isinstance(obj, Booking) and session.is_modified(obj, include_collections=False):
+            old, new = _snapshots(obj)
+            if old != new:
+                changes.append((old, new))
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            changes.append((_snapshots(obj)[0], None))
+    if not changes:
+        return
+
+    connection = session.connection()
+    seat_ids = {snap['seat_id'] for pair in changes for snap in pair if snap}
+    rooms = _room_ids(connection, seat_ids)
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    for old, new in changes:
+        if old:
+            _merge(deltas, booking_contribution(rooms.get(old['seat_id']), old), -1)
+        if new:
+            _merge(deltas, booking_contribution(rooms.get(new['seat_id']), new), 1)
+    apply_deltas(connection, deltas)
+
+
+# 让统计字段在赋值时加载旧值，保证历史记录完整
+def _register_active_history():
+    from app.models import Booking
+
+    for field in TRACKED_FIELDS:
+        event.listen(getattr(Booking, field), 'set', lambda *args: None, active_history=True)
+
+
+def record_bulk_transitions(booking_ids, from_status='active', from_fields=None):
+    """集合式 UPDATE 不触发 ORM 事件，由调用方在提交前同步汇总
+
+    booking_ids 为刚从 from_status 流转（且未签退前）的预约；
+    from_fields 为其他列更新前的值，如批量签到时传入 {'check_in_time': None}
+    """
+    from app.models import Booking, Seat
+
+    if not booking_ids:
+        return
+    rows = db.session.query(
+        Seat.room_id, Booking.status, Booking.start_time, Booking.end_time,
+        Booking.check_in_time, Booking.check_out_time
+    ).join(Seat, Booking.seat_id == Seat.id).filter(Booking.id.in_(booking_ids)).all()
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    for room_id, status, start_time, end_time, check_in_time, check_out_time in rows:
+        new = {'status': status, 'start_time': start_time, 'end_time': end_time,
+               'check_in_time': check_in_time, 'check_out_time': check_out_time}
+        old = dict(new, status=from_status, check_out_time=None, **(from_fields or {}))
+        _merge(deltas, booking_contribution(room_id, old), -1)
+        _merge(deltas, booking_contribution(room_id, new), 1)
+    apply_deltas(db.session.connection(), deltas)
+
+
+def backfill_usage_stats(start_date=None, end_date=None, batch_size=1000):
+    """根据历史预约重建汇总表，返回处理的预约数量
+
+    指定日期范围时只重建范围内的汇总行：跨午夜的预约按时段而不是预约日期选取，
+    只写入落在范围内的日期，范围外的汇总行保持不变
+    """
+    from app.models import Booking, RoomUsageStat, Seat
+
+    delete_query = RoomUsageStat.query
+    booking_query = db.session.query(
+        Seat.room_id, Booking.status, Booking.start_time, Booking.end_time,
+        Booking.check_in_time, Booking.check_out_time
+    ).join(Seat, Booking.seat_id == Seat.id)
+    if start_date:
+        range_start = datetime.combine(start_date, datetime.min.time())
+        delete_query = delete_query.filter(RoomUsageStat.stat_date >= start_date)
+        # 预约时段或实际使用时段（可能早签到、晚签退）与范围重叠
+        booking_query = booking_query.filter(or_(
+            Booking.end_time > range_start,
+            func.coalesce(Booking.check_out_time, Booking.end_time) > range_start,
+        ))
+    if end_date:
+        range_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+        delete_query = delete_query.filter(RoomUsageStat.stat_date <= end_date)
+        booking_query = booking_query.filter(or_(
+            Booking.start_time < range_end,
+            Booking.check_in_time < range_end,
+        ))
+
+    try:
+        delete_query.delete(synchronize_session=False)
+        deltas = defaultdict(lambda: defaultdict(int))
+        count = 0
+        for room_id, status, start_time, end_time, check_in_time, check_out_time in \
+                booking_query.order_by(Booking.id).yield_per(batch_size):
+            snapshot = {'status': status, 'start_time': start_time, 'end_time': end_time,
+                        'check_in_time': check_in_time, 'check_out_time': check_out_time}
+            _merge(deltas, booking_contribution(room_id, snapshot), 1)
+            count += 1
+        deltas = {key: metrics for key, metrics in deltas.items()
+                  if (not start_date or key[1] >= start_date) and (not end_date or key[1] <= end_date)}
+        apply_deltas(db.session.connection(), deltas)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return count
+
+
+def get_dashboard_stats(now=None):
+    """管理后台统计卡片数据，全部来自汇总表和小表计数"""
+    from app.models import RoomUsageStat, Seat, Student, StudyRoom
+
+    now = now or datetime.now()
+    today = now.date()
+
+    rows = db.session.query(
+        func.coalesce(func.sum(RoomUsageStat.bookings), 0),
+        func.coalesce(func.sum(RoomUsageStat.check_ins), 0),
+        func.coalesce(func.sum(RoomUsageStat.no_shows), 0),
+        func.coalesce(func.sum(RoomUsageStat.cancellations), 0),
+    ).filter(RoomUsageStat.stat_date == today).one()
+    booked_minutes = db.session.query(
+        func.coalesce(func.sum(RoomUsageStat.booked_minutes), 0)
+    ).filter(RoomUsageStat.stat_date == today, RoomUsageStat.hour == now.hour).scalar()
+
+    return {
+        'total_students': Student.query.count(),
+        'total_rooms': StudyRoom.query.count(),
+        'total_seats': Seat.query.count(),
+        'today_bookings': rows[0],
+        'today_check_ins': rows[1],
+        'today_no_shows': rows[2],
+        'today_cancellations': rows[3],
+        # 当前小时内平均被预约占用的座位数
+        'occupied_seats': round(booked_minutes / 60, 1),
+    }
+
+
+def get_room_stats(start_date, end_date):
+    """按自习室、日期汇总的统计"""
+    from app.models import RoomUsageStat
+
+    rows = db.session.query(
+        RoomUsageStat.room_id,
+        RoomUsageStat.stat_date,
+        *[func.sum(getattr(RoomUsageStat, name)) for name in METRICS]
+    ).filter(
+        RoomUsageStat.stat_date >= start_date,
+        RoomUsageStat.stat_date <= end_date
+    ).group_by(RoomUsageStat.room_id, RoomUsageStat.stat_date).order_by(
+        RoomUsageStat.stat_date, RoomUsageStat.room_id
+    ).all()
+
+    return [
+        {'room_id': row[0], 'date': row[1].strftime('%Y-%m-%d'),
+         **{name: int(value or 0) for name, value in zip(METRICS, row[2:], strict=True)},
+         'used_hours': round((row[-1] or 0) / 60, 1)}
+        for row in rows
+    ]
+
+
+def stats_api():
+    """GET /admin/api/stats?days=7"""
+    days = min(max(request.args.get('days', 1, type=int), 1), 366)
+    today = datetime.now().date()
+    return jsonify({
+        'success': True,
+        'data': {
+            **get_dashboard_stats(),
+            'rooms': get_room_stats(today - timedelta(days=days - 1), today),
+        }
+    })
+
+
+def init_app(app):
+    """注册统计接口与回填命令"""
+    from app.utils.access import admin_required
+
+    app.add_url_rule('/admin/api/stats', 'usage_stats', admin_required(stats_api))
+
+    @app.cli.command('backfill-usage')
+    def backfill_usage_command():
+        """根据历史预约重建使用统计"""
+        count = backfill_usage_stats()
+        print(f"已根据 {count} 条预约重建使用统计")
+
+
+_register_active_history()
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        print(f"已根据 {backfill_usage_stats()} 条预约重建使用统计")
@@ -0,0 +1,398 @@
+"""
+候补预约
+学生登记等待某间自习室（或某个座位）在某个时段空出座位。预约被取消、删除、改期，
+或过期清理标记为未到场时，在释放座位的同一事务中为第一位符合条件的候补学生临时保留座位，
+并通过实时事件通知本人，学生不必反复刷新座位图。
+
+- 候补按 (自习室, 日期) 分桶建索引，释放时只查询同一分桶中与空出时段重叠的等待记录，按登记先后处理
+- 保留前检查 Student.can_book()、本人在该时段没有其他预约、座位在候补时段内没有预约和他人的临时保留
+- 保留与 seat_reservation.hold_seat 相同，WAITLIST_HOLD_SECONDS 内由学生确认后才创建预约；
+  学生没有确认就不会产生预约，也就不会被记为未到场。超时或放弃的保留由过期清理转给下一位候补
+- ORM 中的取消在提交前（before_commit）处理；集合式的未到场清理由调用方通过 queue_bulk_releases 登记
+
+接口:
+    POST /api/waitlist    {"room_id": 1, "date": "2025-01-06", "start_time": "14:00", "end_time": "18:00"}
+                          或 {"seat_id": 12, ...}
+    GET  /api/waitlist
+    POST /api/waitlist/<id>/confirm   确认保留的座位，转为预约
+    POST /api/waitlist/<id>/cancel    取消候补或放弃保留的座位
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context, jsonify, request
+from flask_login import current_user
+from sqlalchemy import event, inspect, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import db
+from app.utils.availability import BLOCKING_STATUSES
+
+
+def _pending_releases(session):
+    return session.info.setdefault('waitlist_releases', [])
+
+
+def _old_value(state, key):
+    history = state.attrs[key].history
+    return history.deleted[0] if history.deleted else getattr(state.obj(), key)
+
+
+@event.listens_for(Session, 'after_flush', propagate=True)
+def _collect_releases(session, flush_context):
+    """记录本次事务释放的座位时段 (座位, 开始, 结束)"""
+    from app.models import Booking
+
+    for obj in session.dirty:
+        if not isinstance(obj, Booking):
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[key].history.has_changes()
+                   for key in ('status', 'seat_id', 'start_time', 'end_time')):
+            continue
+        if _old_value(state, 'status') not in BLOCKING_STATUSES:
+            continue
+        old_window = tuple(_old_value(state, key) for key in ('seat_id', 'start_time', 'end_time'))
+        if obj.status not in BLOCKING_STATUSES or old_window != (obj.seat_id, obj.start_time, obj.end_time):
+            _pending_releases(session).append(old_window)
+    for obj in session.deleted:
+        if isinstance(obj, Booking) and obj.status in BLOCKING_STATUSES:
+            _pending_releases(session).append((obj.seat_id, obj.start_time, obj.end_time))
+
+
+def queue_bulk_releases(booking_ids):
+    """集合式更新释放的座位不触发 flush 事件，由调用方在提交前登记"""
+    from app.models import Booking
+
+    if not booking_ids:
+        return
+    table = Booking.__table__
+    rows = db.session.connection().execute(select(
+        table.c.seat_id, table.c.start_time, table.c.end_time
+    ).where(table.c.id.in_(list(booking_ids)))).all()
+    _pending_releases(db.session).extend(tuple(row) for row in rows)
+
+
+@event.listens_for(Session, 'before_commit', propagate=True)
+def _promote_before_commit(session):
+    """提交前为释放的座位匹配候补，保留与释放在同一事务中提交"""
+    if session.info.get('waitlist_promoting') or not has_app_context():
+        return
+    session.info['waitlist_promoting'] = True
+    try:
+        # 先写入尚未 flush 的取消，收集完整的释放记录
+        session.flush()
+        releases = session.info.pop('waitlist_releases', None)
+        if releases:
+            now = datetime.now()
+            for release in releases:
+                promote(session, release, now)
+            session.flush()
+    finally:
+        session.info.pop('waitlist_promoting', None)
+
+
+@event.listens_for(Session, 'after_rollback', propagate=True)
+def _drop_releases(session):
+    session.info.pop('waitlist_releases', None)
+
+
+def _seat_is_free(session, seat_id, start_time, end_time, now):
+    """座位在时段内没有有效预约，也没有他人未过期的临时保留"""
+    from app.models import Booking, SeatReservation
+    from app.utils.seat_reservation import slot_starts
+
+    booked = session.query(Booking.id).filter(
+        Booking.seat_id == seat_id,
+        Booking.status.in_(BLOCKING_STATUSES),
+        Booking.start_time < end_time,
+        Booking.end_time > start_time,
+    ).first()
+    if booked is not None:
+        return False
+    claimed = session.query(SeatReservation.id).filter(
+        SeatReservation.seat_id == seat_id,
+        SeatReservation.slot_start.in_(slot_starts(start_time, end_time)),
+        or_(SeatReservation.booking_id.isnot(None), SeatReservation.expires_at >= now),
+    ).first()
+    return claimed is None
+
+
+def _has_booking(session, user_id, start_time, end_time):
+    """学生在时段内已有有效预约"""
+    from app.models import Booking
+
+    return session.query(Booking.id).filter(
+        Booking.user_id == user_id,
+        Booking.status.in_(BLOCKING_STATUSES),
+        Booking.start_time < end_time,
+        Booking.end_time > start_time,
+    ).first() is not None
+
+
+def promote(session, release, now=None):
+    """为一段释放的座位时段保留给第一位符合条件的候补，返回候补记录，没有时返回 None"""
+    from app.models import Seat, Student, WaitlistEntry
+    from app.utils.seat_reservation import insert_hold, slot_ceil, slot_starts
+
+    seat_id, start_time, end_time = release
+    now = now or datetime.now()
+    # 保留的时间片从下一个整片开始，确认时满足对齐要求
+    free_from = slot_ceil(max(start_time, now))
+    if end_time <= free_from:
+        return None
+    seat = session.query(Seat.room_id, Seat.status).filter(Seat.id == seat_id).first()
+    if seat is None or seat.status == 'maintenance':
+        return None
+
+    config = current_app.config
+    entries = WaitlistEntry.query.filter(
+        WaitlistEntry.room_id == seat.room_id,
+        WaitlistEntry.booking_date == start_time.date(),
+        WaitlistEntry.status == 'waiting',
+        or_(WaitlistEntry.seat_id.is_(None), WaitlistEntry.seat_id == seat_id),
+        WaitlistEntry.start_time < end_time,
+        WaitlistEntry.end_time > free_from,
+    ).order_by(WaitlistEntry.created_at, WaitlistEntry.id).limit(
+        config.get('WAITLIST_MATCH_LIMIT', 20)).all()
+    if not entries:
+        return None
+    students = {student.id: student for student in Student.query.filter(
+        Student.id.in_({entry.user_id for entry in entries}))}
+
+    expires_at = now + timedelta(seconds=config.get('WAITLIST_HOLD_SECONDS', 600))
+    connection = session.connection()
+    for entry in entries:
+        window_start = max(entry.start_time, free_from)
+        window_end = entry.end_time
+        student = students.get(entry.user_id)
+        if window_end <= window_start or student is None or not student.can_book():
+            continue
+        if (_has_booking(session, entry.user_id, window_start, window_end)
+                or not _seat_is_free(session, seat_id, window_start, window_end, now)):
+            continue
+
+        token = str(uuid.uuid4())
+        try:
+            # 用保存点隔离冲突，保留失败时继续尝试下一位
+            with connection.begin_nested():
+                insert_hold(connection, token, entry.user_id, seat_id,
+                            slot_starts(window_start, window_end), expires_at, now)
+        except IntegrityError:
+            continue
+        entry.status = 'offered'
+        entry.hold_seat_id = seat_id
+        entry.hold_token = token
+        entry.hold_expires_at = expires_at
+        session.info.setdefault('live_events', []).append((
+            [f'student:{entry.user_id}'], 'waitlist_offered', {
+                'waitlist_id': entry.id,
+                'room_id': seat.room_id,
+                'seat_id': seat_id,
+                'start_time': window_start.strftime('%Y-%m-%d %H:%M'),
+                'end_time': window_end.strftime('%Y-%m-%d %H:%M'),
+                'expires_at': expires_at.strftime('%Y-%m-%d %H:%M:%S'),
+            }))
+        return entry
+    return None
+
+
+def lapse_expired_offers(now=None):
+    """超时未确认的保留作废，座位转给下一位候补，返回作废的数量"""
+    from app.models import WaitlistEntry
+
+    now = now or datetime.now()
+    entries = WaitlistEntry.query.filter(
+        WaitlistEntry.status == 'offered',
+        WaitlistEntry.hold_expires_at < now,
+    ).limit(current_app.config.get('WAITLIST_MATCH_LIMIT', 20)).all()
+    for entry in entries:
+        entry.status = 'lapsed'
+        _pending_releases(db.session).append((entry.hold_seat_id, entry.start_time, entry.end_time))
+    if entries:
+        db.session.commit()
+    return len(entries)
+
+
+def _entry_dict(entry, now):
+    status = entry.status
+    if status == 'waiting' and entry.end_time <= now:
+        status = 'expired'
+    elif status == 'offered' and entry.hold_expires_at <= now:
+        status = 'lapsed'
+    return {
+        'id': entry.id,
+        'room_id': entry.room_id,
+        'seat_id': entry.seat_id,
+        'date': entry.booking_date.strftime('%Y-%m-%d'),
+        'start_time': entry.start_time.strftime('%H:%M'),
+        'end_time': entry.end_time.strftime('%H:%M'),
+        'status': status,
+        'hold_seat_id': entry.hold_seat_id if status == 'offered' else None,
+        'hold_expires_at': entry.hold_expires_at.strftime('%Y-%m-%d %H:%M:%S') if status == 'offered' else None,
+        'booking_id': entry.booking_id,
+    }
+
+
+def _error(message, status=400):
+    return jsonify({'success': False, 'message': message}), status
+
+
+def join_api():
+    """POST /api/waitlist"""
+    from app.models import Seat, StudyRoom, WaitlistEntry
+    from app.utils.availability import seat_availability
+    from app.utils.seat_reservation import SlotAlignmentError, check_alignment
+
+    data = request.get_json(silent=True) or {}
+    config = current_app.config
+    try:
+        day = datetime.strptime(str(data.get('date', '')), '%Y-%m-%d').date()
+        start_time = datetime.combine(day, datetime.strptime(str(data.get('start_time', '')), '%H:%M').time())
+        end_time = datetime.combine(day, datetime.strptime(str(data.get('end_time', '')), '%H:%M').time())
+    except ValueError:
+        return _error('请提供正确的日期和时间（date=YYYY-MM-DD, start_time/end_time=HH:MM）')
+    now = datetime.now()
+    if end_time <= start_time or end_time <= now:
+        return _error('候补时段不正确')
+    try:
+        check_alignment(start_time, end_time)
+    except SlotAlignmentError as e:
+        return _error(str(e))
+    if end_time - start_time > timedelta(hours=config.get('MAX_BOOKING_HOURS', 4)):
+        return _error(f"单次预约不能超过 {config.get('MAX_BOOKING_HOURS', 4)} 小时")
+    if day > now.date() + timedelta(days=config.get('MAX_ADVANCE_DAYS', 7)):
+        return _error(f"最多提前 {config.get('MAX_ADVANCE_DAYS', 7)} 天候补")
+
+    seat = None
+    if data.get('seat_id'):
+        seat = db.session.get(Seat, data.get('seat_id'))
+        if seat is None or seat.status == 'maintenance':
+            return _error('座位不存在或正在维修', 404)
+        room = seat.study_room
+    else:
+        room = db.session.get(StudyRoom, data.get('room_id')) if data.get('room_id') else None
+    if room is None:
+        return _error('自习室不存在', 404)
+    if room.status != 'open':
+        return _error('自习室当前不开放')
+    if ((room.open_time and start_time.strftime('%H:%M') < room.open_time)
+            or (room.close_time and end_time.strftime('%H:%M') > room.close_time)):
+        return _error(f'候补时间需在开放时间 {room.open_time}-{room.close_time} 内')
+
+    student = current_user._get_current_object()
+    if not student.can_book():
+        return _error('当前账户不能预约')
+    waiting = WaitlistEntry.query.filter(WaitlistEntry.user_id == student.id, WaitlistEntry.status == 'waiting',
+                                         WaitlistEntry.end_time > now).all()
+    if len(waiting) >= config.get('WAITLIST_MAX_ENTRIES', 5):
+        return _error(f"最多同时候补 {config.get('WAITLIST_MAX_ENTRIES', 5)} 个时段")
+    if any(entry.room_id == room.id and entry.seat_id == (seat.id if seat else None)
+           and entry.start_time < end_time and entry.end_time > start_time for entry in waiting):
+        return _error('该时段已在候补中', 409)
+
+    # 仍有空闲座位时直接预约即可
+    if seat is not None:
+        if seat_availability.is_seat_free(room.id, seat.id, start_time, end_time):
+            return _error('该座位在此时段空闲，请直接预约', 409)
+    else:
+        maintenance = {seat_id for seat_id, in db.session.query(Seat.id).filter(
+            Seat.room_id == room.id, Seat.status == 'maintenance')}
+        free = seat_availability.free_seat_ids(room.id, start_time, end_time) - maintenance
+        if free:
+            return _error(f'该时段还有 {len(free)} 个空闲座位，请直接预约', 409)
+
+    entry = WaitlistEntry(user_id=student.id, room_id=room.id, seat_id=seat.id if seat else None,
+                          booking_date=day, start_time=start_time, end_time=end_time,
+                          purpose=data.get('purpose'), status='waiting')
+    db.session.add(entry)
+    db.session.commit()
+    position = WaitlistEntry.query.filter(
+        WaitlistEntry.room_id == room.id,
+        WaitlistEntry.booking_date == day,
+        WaitlistEntry.status == 'waiting',
+        WaitlistEntry.start_time < end_time,
+        WaitlistEntry.end_time > start_time,
+        WaitlistEntry.id <= entry.id,
+    ).count()
+    return jsonify({'success': True, 'message': f'已加入候补，当前排第 {position} 位',
+                    'entry': _entry_dict(entry, now), 'position': position})
+
+
+def list_api():
+    """GET /api/waitlist"""
+    from app.models import WaitlistEntry
+
+    now = datetime.now()
+    entries = WaitlistEntry.query.filter(
+        WaitlistEntry.user_id == current_user.id,
+        WaitlistEntry.booking_date >= now.date() - timedelta(days=1),
+    ).order_by(WaitlistEntry.start_time).all()
+    return jsonify({'success': True, 'entries': [_entry_dict(entry, now) for entry in entries]})
+
+
+def confirm_api(entry_id):
+    """POST /api/waitlist/<id>/confirm"""
+    from app.models import WaitlistEntry
+    from app.utils.counters import student_total_bookings
+    from app.utils.seat_reservation import confirm_hold, hold_window
+
+    entry = db.session.get(WaitlistEntry, entry_id)
+    if entry is None or entry.user_id != current_user.id:
+        return _error('候补记录不存在', 404)
+    if entry.status != 'offered':
+        return _error('没有为该候补保留的座位')
+    window = hold_window(entry.hold_token)
+    if window is None:
+        return _error('座位保留已超时', 409)
+    seat_id, start_time, end_time = window
+    student = current_user._get_current_object()
+    if not student.can_book():
+        return _error('当前账户不能预约')
+    if _has_booking(db.session, student.id, start_time, end_time):
+        return _error('您在该时段已有其他预约', 409)
+
+    booking = confirm_hold(entry.hold_token, student.id, seat_id, start_time, end_time,
+                           purpose=entry.purpose, notes=f'候补转正 #{entry.id}')
+    if booking is None:
+        return _error('座位保留已失效', 409)
+    entry.status = 'promoted'
+    entry.booking = booking
+    entry.promoted_at = datetime.now()
+    db.session.commit()
+    student_total_bookings.incr(student.id)
+    return jsonify({'success': True, 'message': '预约成功',
+                    'booking_id': booking.id, 'booking_number': booking.booking_number})
+
+
+def cancel_api(entry_id):
+    """POST /api/waitlist/<id>/cancel"""
+    from app.models import WaitlistEntry
+    from app.utils.seat_reservation import release_hold
+
+    entry = db.session.get(WaitlistEntry, entry_id)
+    if entry is None or entry.user_id != current_user.id:
+        return _error('候补记录不存在', 404)
+    if entry.status not in ('waiting', 'offered'):
+        return _error('该候补已结束')
+    if entry.status == 'offered':
+        # 放弃保留的座位，转给下一位候补
+        release_hold(entry.hold_token)
+        _pending_releases(db.session).append((entry.hold_seat_id, entry.start_time, entry.end_time))
+    entry.status = 'cancelled'
+    db.session.commit()
+    return jsonify({'success': True, 'message': '已取消候补'})
+
+
+def init_app(app):
+    """注册候补接口"""
+    from app.utils.access import student_required
+
+    app.add_url_rule('/api/waitlist', 'waitlist_join', student_required(join_api), methods=['POST'])
+    app.add_url_rule('/api/waitlist', 'waitlist_list', student_required(list_api))
+    app.add_url_rule('/api/waitlist/<int:entry_id>/confirm', 'waitlist_confirm',
+                     student_required(confirm_api), methods=['POST'])
+    app.add_url_rule('/api/waitlist/<int:entry_id>/cancel', 'waitlist_cancel',
+                     student_required(cancel_api), methods=['POST'])
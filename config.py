@@ -1,5 +1,6 @@
 import os
 from datetime import timedelta, timezone, datetime
+from typing import ClassVar
 
 
 class Config:
@@ -12,6 +13,96 @@ class Config:
     MAX_ADVANCE_DAYS = 7   # 最多提前预约天数
     AUTO_CANCEL_MINUTES = 15  # 超时未签到自动取消时间(分钟)
 
+    # 座位可用性索引缓存时间(秒)，限定其他工作进程写入的可见延迟
+    SEAT_AVAILABILITY_TTL = 5
+
+    # 过期预约后台清理
+    EXPIRY_SWEEPER_ENABLED = os.environ.get('EXPIRY_SWEEPER_ENABLED', 'true').lower() in ['true', 'on', '1']
+    EXPIRY_SWEEP_INTERVAL = 60  # 清理间隔(秒)
+    EXPIRY_SWEEP_BATCH_SIZE = 500  # 每批更新的预约数
+
+    # 座位占用时间片
+    SEAT_SLOT_MINUTES = 15  # 时间片长度(分钟)
+    SEAT_HOLD_SECONDS = 120  # 确认预约前临时保留座位的时间(秒)
+
+    # 请求级 SQL 性能分析
+    SQL_PROFILER_ENABLED = os.environ.get('SQL_PROFILER_ENABLED', 'false').lower() in ['true', 'on', '1']
+    SQL_PROFILER_SAMPLE_RATE = float(os.environ.get('SQL_PROFILER_SAMPLE_RATE', '1.0'))  # 抽样比例
+    SQL_SLOW_QUERY_MS = 100  # 慢查询阈值(毫秒)
+    SQL_N_PLUS_ONE_THRESHOLD = 5  # 同一语句在一个请求内重复多少次视为 N+1
+
+    # 页面与片段缓存: lru(进程内) / sqlite(多进程共享) / none(关闭)
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'lru')
+    PAGE_CACHE_PATH = os.environ.get('PAGE_CACHE_PATH')  # sqlite 后端文件，默认放在 instance 目录
+    PAGE_CACHE_MAX_ENTRIES = 512
+    PAGE_CACHE_TIMEOUT = 0  # 兜底过期时间(秒)，0 表示只按数据变更失效
+
+    # 延迟写入计数器(公告浏览次数等): memory(进程内) / sqlite(本机共享文件，崩溃不丢失)
+    COUNTER_STORE = os.environ.get('COUNTER_STORE', 'memory')
+    COUNTER_STORE_PATH = os.environ.get('COUNTER_STORE_PATH')  # sqlite 存储文件，默认放在 instance 目录
+    COUNTER_FLUSH_INTERVAL = 10  # 写回间隔(秒)
+
+    # 密码哈希: 算法与强度变更后，旧哈希在下次登录成功时自动升级
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_WORKERS = None  # 哈希进程池大小，None 为 CPU 核数，0 为在请求线程内计算
+    PASSWORD_HASH_MAX_PENDING = None  # 同时等待哈希的请求上限，默认为进程数的 4 倍
+    PASSWORD_HASH_WAIT_TIMEOUT = 2.0  # 排队超过该时间(秒)返回 503
+
+    # 实时事件推送(SSE): local(进程内) / sqlite(本机多进程共享)
+    LIVE_EVENTS_BACKEND = os.environ.get('LIVE_EVENTS_BACKEND', 'local')
+    LIVE_EVENTS_PATH = os.environ.get('LIVE_EVENTS_PATH')  # sqlite 事件文件，默认放在 instance 目录
+    LIVE_EVENTS_POLL_INTERVAL = 0.5  # 多进程时读取新事件的间隔(秒)
+    LIVE_EVENTS_HEARTBEAT = 15  # 心跳间隔(秒)
+    LIVE_EVENTS_QUEUE_SIZE = 256  # 单个连接积压的事件上限，超出后断开由客户端重连补发
+
+    # 头像: 上传后缩放为固定尺寸的 WebP，按内容哈希保存
+    AVATAR_STORAGE_PATH = os.environ.get('AVATAR_STORAGE_PATH')  # 缩略图目录，默认放在 instance 目录
+    AVATAR_SIZES = (64, 128, 320)  # 缩略图边长(像素)
+    AVATAR_QUALITY = 80  # WebP 质量
+    AVATAR_MAX_UPLOAD_BYTES = 8 * 1024 * 1024  # 单个头像上传上限
+    AVATAR_MAX_PIXELS = 40_000_000  # 解码前检查的分辨率上限，防止解压炸弹
+    AVATAR_WORKERS = 2  # 缩放进程数，0 为在请求线程内处理
+
+    # 静态资源指纹: 使用 flask build-assets 生成的带哈希文件，长期缓存并返回预压缩版本
+    STATIC_ASSETS_FINGERPRINT = os.environ.get('STATIC_ASSETS_FINGERPRINT', 'false').lower() in ['true', 'on', '1']
+
+    # 模板字节码缓存，工作进程重启后不必重新编译模板
+    JINJA_BYTECODE_CACHE = True
+    JINJA_BYTECODE_CACHE_PATH = os.environ.get('JINJA_BYTECODE_CACHE_PATH')  # 默认放在 instance 目录
+
+    # 登录身份缓存，其他工作进程中的修改(如禁用账户)最多延迟 TTL 秒生效
+    IDENTITY_CACHE_SIZE = 2048
+    IDENTITY_CACHE_TTL = 30
+
+    # 跨自习室座位搜索
+    SEAT_SEARCH_INDEX_TTL = 300  # 座位属性索引重建间隔(秒)，限定其他工作进程修改座位的可见延迟
+    BUILDING_COORDINATES: ClassVar[dict] = {}  # 楼栋平面坐标，如 {'图书馆': (0, 0), '教学楼A栋': (120, 80)}，用于按距离排序
+
+    # 小组预约(相邻座位)
+    GROUP_BOOKING_MAX_SIZE = 8  # 每组最多人数
+    GROUP_BOOKING_RETRIES = 3  # 选中的座位被抢先占用时重新选座的次数
+
+    # 周期预约: 具体预约只提前生成 HORIZON_DAYS 天，由后台清理任务逐日补齐
+    RECURRING_BOOKING_HORIZON_DAYS = 1
+    RECURRING_BOOKING_MAX_WEEKS = 20  # 单条规则最长周数
+
+    # 候补: 座位释放时在同一事务中为候补学生保留，学生确认后转为预约
+    WAITLIST_MAX_ENTRIES = 5  # 每名学生同时候补的时段数
+    WAITLIST_MATCH_LIMIT = 20  # 每次释放最多检查的候补记录数
+    WAITLIST_HOLD_SECONDS = 600  # 空出的座位为候补学生保留的时长(秒)，超时未确认时转给下一位
+
+    # 签到凭证: 终端只校验签名，签到时间批量写回
+    CHECKIN_TOKEN_SECRET = os.environ.get('CHECKIN_TOKEN_SECRET')  # 终端离线校验用的密钥，默认由 SECRET_KEY 派生
+    CHECKIN_KIOSK_KEYS = tuple(key for key in os.environ.get('CHECKIN_KIOSK_KEYS', '').split(',') if key)  # 签到终端密钥，为空时拒绝签到
+    CHECKIN_EARLY_MINUTES = 15  # 开始前多少分钟可以签到
+    CHECKIN_FLUSH_INTERVAL = 1.0  # 签到写回间隔(秒)
+    CHECKIN_FLUSH_BATCH_SIZE = 200  # 队列达到该数量时提前写回
+
+    # 管理后台列表: 按 (created_at, id) 游标分页，总数限量计数并缓存
+    ITEMS_PER_PAGE = 20
+    ADMIN_COUNT_CAP = 10000  # 总数最多数到多少行，超过时显示为 "N+"
+    ADMIN_COUNT_CACHE_TTL = 60  # 同一筛选条件的总数缓存时间(秒)
+
     # 会话设置
     PERMANENT_SESSION_LIFETIME = timedelta(hours=2)
 
@@ -23,6 +114,8 @@ class DevelopmentConfig(Config):
 
 class ProductionConfig(Config):
     DEBUG = False
+    SQL_PROFILER_SAMPLE_RATE = float(os.environ.get('SQL_PROFILER_SAMPLE_RATE', '0.05'))
+    STATIC_ASSETS_FINGERPRINT = os.environ.get('STATIC_ASSETS_FINGERPRINT', 'true').lower() in ['true', 'on', '1']
 
 config = {
     'development': DevelopmentConfig,
@@ -1,22 +1,22 @@
 from app import create_app, db
-from app.models import (
-    Admin,
-    Announcement,
-    Booking,
-    Seat,
-    Student,
-    StudyRoom,
-    TimeSlot,
-    User,
-)
-from app.utils.init_complete_data import init_complete_data
 
-# 创建应用实例
+# 创建应用实例（工作进程启动时不检查数据库结构，部署时先执行 flask init-db / flask migrate-db）
 app = create_app()
 
 @app.shell_context_processor
 def make_shell_context():
     """为Flask shell提供上下文"""
+    from app.models import (
+        Admin,
+        Announcement,
+        Booking,
+        Seat,
+        Student,
+        StudyRoom,
+        TimeSlot,
+        User,
+    )
+
     return {
         'db': db,
         'Student': Student,
@@ -30,14 +30,12 @@ def make_shell_context():
     }
 
 if __name__ == "__main__":
-    with app.app_context():
-        # 创建数据库表
-        db.create_all()
-        print("数据库表已创建")
+    from app.utils.schema import ensure_schema
 
-        # 初始化完整数据（如果需要）
-        init_complete_data()
-        print("数据完整性检查完成")
+    with app.app_context():
+        # 结构版本一致时只读取一次版本记录，否则建表并初始化数据
+        if ensure_schema():
+            print("数据库已初始化")
 
     # 运行应用
     app.run(debug=True, host='0.0.0.0', port=5000)
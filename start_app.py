@@ -20,8 +20,7 @@ def main():
     try:
         # 1. 导入应用工厂和扩展
         from app import create_app, db
-        from app.models import Admin, Booking, Seat, Student, StudyRoom, User
-        from app.utils.init_complete_data import init_complete_data
+        from app.utils.schema import ensure_schema
 
         print("[OK] 成功导入应用模块")
 
@@ -32,15 +31,12 @@ def main():
         # 3. 在应用上下文中初始化数据库
         with app.app_context():
             try:
-                # 创建数据库表（如果不存在）
-                print("正在检查数据库结构...")
-                db.create_all()
-                print("[OK] 数据库表检查完成")
-
-                # 4. 初始化完整数据（如果需要）
-                print("正在检查数据完整性...")
-                init_complete_data()
-                print("[OK] 数据初始化检查完成")
+                # 4. 结构版本一致时跳过建表和数据检查，否则执行初始化
+                print("正在检查数据库结构版本...")
+                if ensure_schema():
+                    print("[OK] 数据库已初始化")
+                else:
+                    print("[OK] 数据库结构已是最新")
 
             except Exception as e:
                 print(f"[ERROR] 数据库初始化失败: {e}")
@@ -50,6 +46,8 @@ def main():
         @app.shell_context_processor
         def make_shell_context():
             """为Flask shell提供上下文"""
+            from app.models import Admin, Booking, Seat, Student, StudyRoom, User
+
             return {
                 'db': db,
                 'Student': Student,